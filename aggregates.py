@@ -0,0 +1,168 @@
+"""Zagregowane statystyki datasetu dla zakładki statystyk - liczone raz, rysowane z małych tabel."""
+import numpy as np
+import pandas as pd
+
+PRICE_COL = "median_house_value"
+AGE_COL = "housing_median_age"
+
+# Kolumny potrzebne w zakładce statystyk
+STATS_COLUMNS = [PRICE_COL, AGE_COL, "total_rooms", "households", "median_income"]
+
+
+def histogram_counts(values, bins=30):
+    """Liczności w `bins` równych przedziałach (jak px.histogram, ale bez wysyłania wierszy)."""
+    values = values.dropna().to_numpy(np.float64)
+    counts, edges = np.histogram(values, bins=bins)
+    return pd.DataFrame({
+        "bin_left": edges[:-1],
+        "bin_right": edges[1:],
+        "bin_center": (edges[:-1] + edges[1:]) / 2,
+        "count": counts,
+    })
+
+
+def box_quantiles(values, groups):
+    """Kwartyle i wąsy (1.5 IQR) wykresu pudełkowego dla każdej grupy."""
+    grouped = values.groupby(groups, observed=True)
+    quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    quantiles.columns = ["q1", "median", "q3"]
+    iqr = quantiles["q3"] - quantiles["q1"]
+    low_limit = (quantiles["q1"] - 1.5 * iqr).reindex(groups).to_numpy()
+    high_limit = (quantiles["q3"] + 1.5 * iqr).reindex(groups).to_numpy()
+    # Wąsy kończą się na skrajnych obserwacjach mieszczących się w granicach
+    inside = values.where((values >= low_limit) & (values <= high_limit))
+    quantiles["lowerfence"] = inside.groupby(groups, observed=True).min()
+    quantiles["upperfence"] = inside.groupby(groups, observed=True).max()
+    quantiles["count"] = grouped.size()
+    quantiles.index = quantiles.index.astype(str)
+    return quantiles.reset_index(names="group")
+
+
+def compute_aggregates(df, hist_bins=30, age_bins=5):
+    """Wszystkie agregaty zakładki statystyk w jednym przebiegu po ramce."""
+    num_df = df.select_dtypes(include=["number"])
+    result = {
+        "total_records": len(df),
+        "describe": df.describe().round(2),
+        "corr": num_df.corr().round(3),
+    }
+
+    if PRICE_COL in df.columns:
+        price = df[PRICE_COL]
+        result["avg_price"] = price.mean()
+        result["median_price"] = price.median()
+        result["price_hist"] = histogram_counts(price, bins=hist_bins)
+        if AGE_COL in df.columns:
+            age_groups = pd.cut(df[AGE_COL], bins=age_bins)
+            result["age_box"] = box_quantiles(price, age_groups)
+    if "total_rooms" in df.columns:
+        result["avg_rooms"] = df["total_rooms"].mean()
+        if "households" in df.columns:
+            result["avg_rooms_per_house"] = (df["total_rooms"] / df["households"]).mean()
+    if "median_income" in df.columns:
+        result["avg_income"] = df["median_income"].mean()
+    return result
+
+
+def grid_cell_size(lon_min, lon_max, lat_min, lat_max, grid_size):
+    """Bok kwadratowej komórki siatki `grid_size` x `grid_size` nad obszarem (min, max)."""
+    return max(lon_max - lon_min, lat_max - lat_min) / grid_size or 1e-9
+
+
+def grid_cells(lon, lat, lon_min, lat_min, cell, grid_size):
+    """Numer komórki siatki dla każdego punktu (tablice bez braków)."""
+    ix = np.clip(((lon - lon_min) / cell).astype(np.int64), 0, grid_size - 1)
+    iy = np.clip(((lat - lat_min) / cell).astype(np.int64), 0, grid_size - 1)
+    return ix * grid_size + iy
+
+
+def grid_frame(counts, lon_min, lat_min, cell, grid_size, sums=None, value_counts=None, value_name="mean_value"):
+    """Wiersz na niepustą komórkę z liczności (i sum wartości) wszystkich komórek siatki."""
+    occupied = np.flatnonzero(counts)
+    result = pd.DataFrame({
+        "longitude": lon_min + (occupied // grid_size + 0.5) * cell,
+        "latitude": lat_min + (occupied % grid_size + 0.5) * cell,
+        "count": counts[occupied],
+    })
+    if sums is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[value_name] = sums[occupied] / value_counts[occupied]
+    return result
+
+
+def grid_aggregate(lon, lat, values=None, grid_size=100, value_name="mean_value"):
+    """Agregacja punktów do kwadratowej siatki `grid_size` x `grid_size` nad obszarem danych.
+
+    Zwraca jeden wiersz na niepustą komórkę: środek komórki, liczbę punktów
+    i (gdy podano `values`) średnią wartość w komórce.
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    lon, lat = lon[valid], lat[valid]
+    if len(lon) == 0:
+        return pd.DataFrame({"longitude": [], "latitude": [], "count": []})
+
+    lon_min, lat_min = lon.min(), lat.min()
+    cell = grid_cell_size(lon_min, lon.max(), lat_min, lat.max(), grid_size)
+    codes = grid_cells(lon, lat, lon_min, lat_min, cell, grid_size)
+    counts = np.bincount(codes, minlength=grid_size * grid_size)
+
+    sums = value_counts = None
+    if values is not None:
+        values = np.asarray(values, dtype=np.float64)[valid]
+        has_value = np.isfinite(values)
+        sums = np.bincount(codes[has_value], weights=values[has_value], minlength=grid_size * grid_size)
+        value_counts = np.bincount(codes[has_value], minlength=grid_size * grid_size)
+    return grid_frame(counts, lon_min, lat_min, cell, grid_size, sums, value_counts, value_name)
+
+
+def downsample_scatter(x, y, max_points=5000, bins=50, outlier_quantile=0.001, seed=0):
+    """Numery wierszy próbki do wykresu punktowego, zachowującej gęstość punktów.
+
+    Próbka jest warstwowa po siatce `bins` x `bins`: każda komórka oddaje
+    tę samą część swoich punktów, więc gęste i rzadkie obszary zachowują
+    proporcje. Punkty spoza kwantyli `outlier_quantile` / `1 - outlier_quantile`
+    trafiają do próbki zawsze (do 10% budżetu).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x_low, x_high = np.quantile(x[valid], [outlier_quantile, 1 - outlier_quantile])
+    y_low, y_high = np.quantile(y[valid], [outlier_quantile, 1 - outlier_quantile])
+    is_outlier = valid & ((x < x_low) | (x > x_high) | (y < y_low) | (y > y_high))
+
+    outliers = np.flatnonzero(is_outlier)
+    max_outliers = max_points // 10
+    if len(outliers) > max_outliers:
+        outliers = rng.choice(outliers, size=max_outliers, replace=False)
+
+    inliers = np.flatnonzero(valid & ~is_outlier)
+    budget = max_points - len(outliers)
+    if len(inliers) <= budget:
+        return np.sort(np.concatenate([outliers, inliers]))
+
+    ix = np.clip(((x[inliers] - x_low) / ((x_high - x_low) or 1) * bins).astype(np.int64), 0, bins - 1)
+    iy = np.clip(((y[inliers] - y_low) / ((y_high - y_low) or 1) * bins).astype(np.int64), 0, bins - 1)
+    codes = ix * bins + iy
+
+    # Losowa kolejność w komórce, potem z każdej komórki pierwsze `quota` punktów
+    shuffled = rng.permutation(len(inliers))
+    order = shuffled[np.argsort(codes[shuffled], kind="stable")]
+    sorted_codes = codes[order]
+    counts = np.bincount(codes, minlength=bins * bins)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(len(order)) - starts[sorted_codes]
+    # Losowe zaokrąglenie systematyczne (jedno przesunięcie dla skumulowanych udziałów): każda komórka
+    # dostaje podłogę albo sufit swojego udziału, rzadkie komórki nie znikają całkiem, a suma to dokładnie budżet
+    # (skumulowane liczności mnożone przed dzieleniem - ostatnia granica to dokładnie budżet)
+    bounds = np.floor(np.cumsum(counts) * budget / len(inliers) + rng.random()).astype(np.int64)
+    quota = np.diff(bounds, prepend=0)
+    sampled = inliers[order[rank < quota[sorted_codes]]]
+
+    return np.sort(np.concatenate([outliers, sampled]))
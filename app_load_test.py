@@ -0,0 +1,357 @@
+"""Test obciążeniowy aplikacji: wiele równoległych sesji odtwarzających ślady interakcji użytkowników.
+
+Każda sesja to osobny `AppTest` z main.py w tym samym procesie - jak karty
+przeglądarki na jednej replice serwera: wspólne st.cache_resource (predyktor,
+datasety, indeksy, figury), osobny stan sesji. Sesja w pętli odtwarza swój
+ślad: zmiany zakładek i widgetów po kluczu (`data_source`, `filter_*`,
+`lon_*`, `ocean_*`, ...), każda zmiana to jedno uruchomienie skryptu, a między
+nimi czas namysłu `--think`. Dla każdej liczby sesji z `--sessions` raportuje
+uruchomienia/s, opóźnienia p50/p99, trafienia cache (z `instrumentation.REGISTRY`)
+i szczytowe RSS procesu, a na końcu pojemność repliki: najwięcej sesji
+z p99 <= `--slo` i bez błędów.
+
+Przed pomiarem jedna sesja przechodzi raz każdy ślad i czeka na model i zadania
+w tle, więc mierzony jest serwer rozgrzany. Błędem uruchomienia jest wyjątek,
+`st.error` albo ostrzeżenie o cenie zastępczej zamiast predykcji modelu;
+rozgrzewka z takim błędem przerywa test - pojemność zmierzona bez działającego
+modelu byłaby zawyżona. Ślady z `--traces` to JSON
+{nazwa: [krok, ...]}, krok to {"tab": "map"} albo {"key": ..., "value": ...}.
+Fragmenty (np. ręczne punkty) są tu zawsze uruchamiane razem z całym skryptem,
+a uploadu plików AppTest nie obsługuje - ślad z uploadem pokazuje pusty formularz.
+
+Użycie:
+    python app_load_test.py --sessions 1,2,4,8,16 --duration 60 --output app_load.json
+    python app_load_test.py --traces traces.json --think 0.5 --slo 2.0
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows - bez pomiaru pamięci
+    resource = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+TABS = {"home": "🏠 Strona Główna", "map": "🗺️ Mapa Wizualizacji", "stats": "📊 Statystyki i Analiza"}
+# Wersja Streamlit, której wewnętrzne klasy podmienia `share_runtime` - inna wersja przerywa test
+STREAMLIT_VERSION = "1.65.0"
+# Ostrzeżenia main.py oznaczające, że zamiast predykcji modelu pokazano cenę zastępczą
+FALLBACK_WARNINGS = ("błąd predykcji", "próbna predykcja się nie udała")
+
+# Typowe sesje: filtry mapy, przełączanie źródła danych i zakładek, ręczne punkty
+TRACES = {
+    "map_filters": [
+        {"tab": "map"},
+        {"key": "data_source", "value": "builtin"},
+        {"key": "filter_columns", "value": ["median_income", "ocean_proximity"]},
+        {"key": "filter_median_income", "value": [1.5, 15.0]},
+        {"key": "filter_median_income", "value": [2.5, 12.0]},
+        {"key": "filter_median_income", "value": [3.5, 8.0]},
+        {"key": "filter_ocean_proximity_multi", "value": ["NEAR BAY", "NEAR OCEAN"]},
+        {"key": "map_mode", "value": "points"},
+        {"key": "map_mode", "value": "auto"},
+        {"key": "filter_columns", "value": []},
+    ],
+    "source_switch": [
+        {"tab": "map"},
+        {"key": "data_source", "value": "upload"},
+        {"key": "data_source", "value": "manual"},
+        {"key": "data_source", "value": "builtin"},
+        {"tab": "stats"},
+        {"key": "scatter_limit", "value": 20000},
+        {"key": "scatter_limit", "value": 5000},
+        {"tab": "home"},
+    ],
+    "manual_points": [
+        {"tab": "map"},
+        {"key": "data_source", "value": "manual"},
+        {"key": "lon_0", "value": -122.3},
+        {"key": "lat_0", "value": 37.8},
+        {"key": "ocean_0", "value": "NEAR BAY"},
+        {"key": "num_points", "value": 2},
+        {"key": "lon_1", "value": -118.2},
+        {"key": "lat_1", "value": 34.1},
+        {"key": "ocean_1", "value": "<1H OCEAN"},
+        {"key": "num_points", "value": 1},
+        {"key": "data_source", "value": "builtin"},
+    ],
+}
+
+
+def current_rss_bytes():
+    """Bieżące RSS procesu (Linux), inaczej szczytowe z getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource is not None else 0
+
+
+def share_runtime():
+    """Jeden Runtime testowy dla wszystkich sesji.
+
+    AppTest ustawia globalny `Runtime._instance` na początku każdego uruchomienia
+    i zeruje go na końcu, więc równoległe sesje zabierałyby go sobie w trakcie
+    skryptu. Tu ustawiamy go raz, a AppTest dostaje podklasę, której przypisania
+    nie dotykają prawdziwego singletonu. Korzysta z wewnętrznych klas Streamlit
+    w wersji `STREAMLIT_VERSION`.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    components = BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    Runtime._instance = runtime
+    app_test.Runtime = type("SessionRuntime", (Runtime,), {})
+
+
+class Session:
+    """Jedna symulowana sesja przeglądarki: AppTest, bieżąca zakładka i pomiary uruchomień."""
+
+    def __init__(self, trace_name, trace, timeout, seed=0):
+        from streamlit.testing.v1 import AppTest
+
+        self.trace_name = trace_name
+        self.trace = trace
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.tab = TABS["home"]
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.errors = 0
+        self.last_error = None
+        self.skipped = 0
+
+    def rerun(self):
+        """Uruchomienie skryptu jak po akcji użytkownika; czas i błędy trafiają do pomiarów."""
+        # Zakładka nie przechodzi przez stan AppTest między uruchomieniami - ustawiana za każdym razem
+        self.app.session_state["active_tab"] = self.tab
+        start = time.perf_counter()
+        try:
+            self.app.run()
+            messages = [e.value for e in self.app.exception] + [e.value for e in self.app.error]
+            messages += [w.value for w in self.app.warning if any(m in w.value for m in FALLBACK_WARNINGS)]
+        except Exception as e:  # przekroczony czas uruchomienia
+            messages = [str(e)]
+        self.latencies.append(time.perf_counter() - start)
+        if messages:
+            self.errors += 1
+            self.last_error = str(messages[0])
+
+    def play(self, step, wait=0.0):
+        """Wykonuje krok śladu; widget, którego jeszcze nie ma, jest pomijany albo czekamy na niego do `wait` s."""
+        if "tab" in step:
+            self.tab = TABS.get(step["tab"], step["tab"])
+            self.rerun()
+            return
+        deadline = time.perf_counter() + wait
+        while True:
+            try:
+                widget = self.app.get_by_key(step["key"])
+                break
+            except KeyError:
+                if time.perf_counter() >= deadline:
+                    self.skipped += 1
+                    return
+            time.sleep(1.0)
+            self.rerun()
+        value = step["value"]
+        if isinstance(value, list) and widget.type in ("slider", "select_slider"):
+            value = tuple(value)  # suwak zakresu - w JSON lista
+        widget.set_value(value)
+        self.rerun()
+
+    def replay(self, stop_at, think):
+        """Odtwarza ślad w pętli do `stop_at`, z losowym czasem namysłu wokół `think` s."""
+        self.rerun()  # otwarcie strony
+        while time.perf_counter() < stop_at:
+            for step in self.trace:
+                if time.perf_counter() >= stop_at:
+                    return
+                time.sleep(think * self.rng.uniform(0.5, 1.5))
+                self.play(step)
+
+
+def warm_up(traces, timeout, wait):
+    """Jedno przejście każdego śladu przed pomiarem: model, kopie danych, indeksy i zadania w tle."""
+    session = Session("warmup", [], timeout)
+    session.rerun()
+    for trace in traces.values():
+        for step in trace:
+            session.play(step, wait=wait)
+    # Predykcje całego datasetu liczone w tle pokazują pasek postępu - czekamy, aż znikną
+    session.tab = TABS["map"]
+    session.play({"key": "data_source", "value": "builtin"}, wait=wait)
+    deadline = time.perf_counter() + wait
+    while session.app.get("progress") and time.perf_counter() < deadline:
+        time.sleep(1.0)
+        session.rerun()
+    if session.errors:
+        raise SystemExit(f"Rozgrzewka nieudana ({session.errors} uruchomień z błędem), ostatni: {session.last_error}")
+    return session
+
+
+def cache_delta(before, after):
+    """Wywołania i chybienia funkcji cache między dwoma odczytami `REGISTRY`."""
+    delta = {}
+    for name, stats in after.items():
+        calls = stats["calls"] - before.get(name, {}).get("calls", 0)
+        misses = stats["misses"] - before.get(name, {}).get("misses", 0)
+        if calls:
+            delta[name] = {"calls": calls, "misses": misses, "hit_rate": (calls - misses) / calls}
+    return delta
+
+
+def percentiles_ms(latencies):
+    latencies = np.asarray(latencies) * 1000
+    if not len(latencies):
+        return None, None
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def run_level(n_sessions, traces, duration, think, timeout):
+    """`n_sessions` sesji naraz przez `duration` s; sesje dostają ślady po kolei."""
+    names = list(traces)
+    sessions = [
+        Session(names[i % len(names)], traces[names[i % len(names)]], timeout, seed=i)
+        for i in range(n_sessions)
+    ]
+    caches_before = REGISTRY.snapshot()["caches"]
+    peak_rss = [current_rss_bytes()]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.2):
+            peak_rss[0] = max(peak_rss[0], current_rss_bytes())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    stop_at = started + duration
+    threads = [threading.Thread(target=s.replay, args=(stop_at, think)) for s in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+
+    caches = cache_delta(caches_before, REGISTRY.snapshot()["caches"])
+    calls = sum(c["calls"] for c in caches.values())
+    misses = sum(c["misses"] for c in caches.values())
+    latencies = [t for s in sessions for t in s.latencies]
+    p50, p99 = percentiles_ms(latencies)
+    per_trace = {}
+    for name in names:
+        trace_latencies = [t for s in sessions if s.trace_name == name for t in s.latencies]
+        if trace_latencies:
+            trace_p50, trace_p99 = percentiles_ms(trace_latencies)
+            per_trace[name] = {"reruns": len(trace_latencies), "p50_ms": trace_p50, "p99_ms": trace_p99}
+    return {
+        "sessions": n_sessions,
+        "reruns": len(latencies),
+        "errors": sum(s.errors for s in sessions),
+        "skipped_steps": sum(s.skipped for s in sessions),
+        "reruns_per_s": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "cache_hit_rate": (calls - misses) / calls if calls else None,
+        "caches": caches,
+        "peak_rss_mib": peak_rss[0] / 1024**2,
+        "traces": per_trace,
+    }
+
+
+def capacity(levels, slo_ms):
+    """Najwięcej sesji, przy których p99 mieści się w `slo_ms` i nie było błędów (0, gdy żadna)."""
+    ok = [l["sessions"] for l in levels if l["errors"] == 0 and l["p99_ms"] is not None and l["p99_ms"] <= slo_ms]
+    return max(ok, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8", help="liczby równoległych sesji oddzielone przecinkami")
+    parser.add_argument("--duration", type=float, default=60.0, help="czas pomiaru dla jednej liczby sesji [s]")
+    parser.add_argument("--think", type=float, default=1.0, help="średni czas między akcjami użytkownika [s]")
+    parser.add_argument("--traces", default=None, help="JSON ze śladami zamiast wbudowanych")
+    parser.add_argument("--timeout", type=float, default=120.0, help="limit czasu jednego uruchomienia skryptu [s]")
+    parser.add_argument("--warmup-wait", type=float, default=600.0, help="maks. czekanie na model i zadania w tle [s]")
+    parser.add_argument("--slo", type=float, default=2.0, help="docelowe p99 opóźnienia uruchomienia [s]")
+    parser.add_argument("--output", default=None, help="plik JSON z wynikami")
+    args = parser.parse_args()
+
+    traces = TRACES
+    if args.traces:
+        with open(args.traces) as f:
+            traces = json.load(f)
+    import streamlit
+    from streamlit import config, logger
+    from streamlit.testing.v1.util import patch_config_options
+
+    if streamlit.__version__ != STREAMLIT_VERSION:
+        raise SystemExit(
+            f"Test napisany dla Streamlit {STREAMLIT_VERSION} (podmienia jego wewnętrzne klasy), "
+            f"zainstalowany jest {streamlit.__version__} - sprawdź share_runtime i zaktualizuj STREAMLIT_VERSION"
+        )
+
+    # Ostrzeżenia Streamlit powtarzałyby się w każdym uruchomieniu każdej sesji
+    config.set_option("logger.level", "error")
+    logger.set_log_level("error")
+
+    share_runtime()
+    # Przełącznik trybu testowego ustawiony na cały czas testu - AppTest włącza go i wyłącza w każdym uruchomieniu
+    with patch_config_options({"global.appTest": True}):
+        start = time.perf_counter()
+        warm_up(traces, args.timeout, args.warmup_wait)
+        print(f"Rozgrzewka: {time.perf_counter() - start:.1f} s, RSS {current_rss_bytes() / 1024**2:.0f} MiB")
+
+        levels = []
+        for n_sessions in [int(n) for n in args.sessions.split(",")]:
+            level = run_level(n_sessions, traces, args.duration, args.think, args.timeout)
+            levels.append(level)
+            hit_rate = "-" if level["cache_hit_rate"] is None else f"{level['cache_hit_rate']:.1%}"
+            latency = "brak uruchomień" if level["p50_ms"] is None else f"p50 {level['p50_ms']:.0f} ms, p99 {level['p99_ms']:.0f} ms"
+            print(
+                f"{n_sessions:4d} sesji: {level['reruns']} uruchomień ({level['errors']} błędów, "
+                f"{level['skipped_steps']} pominiętych kroków), {level['reruns_per_s']:.2f} uruchomień/s, "
+                f"{latency}, cache {hit_rate} trafień, "
+                f"szczytowe RSS {level['peak_rss_mib']:.0f} MiB"
+            )
+            for name, stats in level["traces"].items():
+                print(f"        {name}: {stats['reruns']} uruchomień, p50 {stats['p50_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms")
+
+    result = {
+        "think_s": args.think,
+        "duration_s": args.duration,
+        "slo_s": args.slo,
+        "capacity_sessions": capacity(levels, args.slo * 1000),
+        "levels": levels,
+    }
+    print(f"Pojemność repliki: {result['capacity_sessions']} sesji (p99 <= {args.slo:g} s, bez błędów, namysł {args.think:g} s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
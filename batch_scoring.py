@@ -0,0 +1,184 @@
+"""Predykcje dla całych datasetów: kawałki liczone w puli procesów, wynik zapisywany obok cache datasetu."""
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from aggregates import PRICE_COL
+from data_store import replacing
+from instrumentation import span
+from prediction import FEATURE_COLUMNS, load_predictor
+
+PREDICTION_COL = "predicted_price"
+RESIDUAL_COL = "residual"  # cena rzeczywista - przewidywana
+
+_predictor = None  # predyktor procesu roboczego, wczytywany raz na proces
+
+
+def _init_worker(model_path, threads):
+    global _predictor
+    # Kilka procesów na raz - każdy z ograniczoną liczbą wątków, żeby się nie zagłuszały
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _predictor = load_predictor(model_path)
+
+
+def _score_chunk(chunk):
+    return _predictor.predict(chunk).to_numpy(dtype=np.float32)
+
+
+def can_score(df):
+    """Czy dataset ma wszystkie cechy modelu."""
+    return all(col in df.columns for col in FEATURE_COLUMNS)
+
+
+def score_dataset(model_path, df, workers=None, chunk_rows=100_000, progress=None, threads=None):
+    """Przewidywana cena (i reszta, jeśli jest cena rzeczywista) dla każdego wiersza `df`.
+
+    Kawałki po `chunk_rows` wierszy są liczone w `workers` procesach
+    (domyślnie tyle, ile rdzeni), każdy z `threads` wątkami (domyślnie
+    rdzenie / procesy). `progress(done, total)` jest wołane po każdym
+    kawałku. Zwraca ramkę z kolumnami predykcji i indeksem `df`.
+    """
+    features = df[FEATURE_COLUMNS]
+    starts = range(0, len(features), chunk_rows)
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(starts)))
+    prices = np.empty(len(features), dtype=np.float32)
+
+    ctx = multiprocessing.get_context("spawn")
+    initargs = (model_path, threads or max(1, cpus // workers))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=initargs) as pool:
+        futures = {pool.submit(_score_chunk, features.iloc[start:start + chunk_rows]): start for start in starts}
+        for done, future in enumerate(as_completed(futures), start=1):
+            start = futures[future]
+            chunk_prices = future.result()
+            prices[start:start + len(chunk_prices)] = chunk_prices
+            if progress is not None:
+                progress(done, len(starts))
+
+    result = pd.DataFrame({PREDICTION_COL: prices}, index=df.index)
+    if PRICE_COL in df.columns:
+        result[RESIDUAL_COL] = df[PRICE_COL].to_numpy(dtype=np.float32) - prices
+    return result
+
+
+def with_scores(df, scores_path):
+    """Kopia `df` z dołączonymi kolumnami z pliku predykcji."""
+    scores = feather.read_table(scores_path, memory_map=True).to_pandas()
+    scores.index = df.index
+    return pd.concat([df, scores], axis=1)
+
+
+class ScoringManager:
+    """Kolejka predykcji dla całych datasetów współdzielona przez wszystkie sesje.
+
+    Zadanie jest identyfikowane przez fingerprint datasetu i wersję modelu -
+    kolejne sesje z tym samym datasetem dostają to samo zadanie. Wynik trafia
+    do `cache_dir` i jest używany ponownie po restarcie serwera. W pamięci
+    zostaje najwyżej `max_jobs` zakończonych zadań, a na dysku `max_files`
+    ostatnio zapisanych wyników; nieudane zadanie można zlecić ponownie.
+    """
+
+    def __init__(self, cache_dir, workers=None, chunk_rows=100_000, threads=None, max_jobs=32, max_files=8):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.threads = threads
+        self.max_jobs = max_jobs
+        self.max_files = max_files
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._work, name="scoring-worker", daemon=True)
+        self._worker.start()
+
+    def job_key(self, dataset_key, version):
+        version_hash = hashlib.sha1(str(version).encode()).hexdigest()[:12]
+        return f"{dataset_key}-{version_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+
+    def _known(self, key):
+        """Zadanie spod klucza albo wynik z dysku z poprzedniego uruchomienia serwera (wywoływane pod blokadą)."""
+        job = self._jobs.get(key)
+        if job is None and os.path.exists(self._path(key)):
+            job = self._jobs[key] = {"state": "finished", "progress": 100, "message": "Zakończono!", "path": self._path(key)}
+            self._evict_jobs()
+        return job
+
+    def _evict_jobs(self):
+        """Usuwa najstarsze zakończone zadania ponad `max_jobs` - czekające i trwające zostają (wywoływane pod blokadą)."""
+        done = [key for key, job in self._jobs.items() if job["state"] in ("finished", "failed")]
+        for key in done[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[key]
+
+    def find(self, dataset_key, version):
+        """Klucz istniejącego zadania (także wyniku z dysku) dla datasetu i wersji modelu; None, gdy nie zlecono."""
+        key = self.job_key(dataset_key, version)
+        with self._lock:
+            return key if self._known(key) is not None else None
+
+    def submit(self, dataset_key, version, df, model_path):
+        """Zleca predykcje dla datasetu (jeśli jeszcze ich nie ma albo poprzednie zadanie się nie udało) i zwraca klucz zadania."""
+        key = self.job_key(dataset_key, version)
+        with self._lock:
+            job = self._known(key)
+            if job is not None and job["state"] != "failed":
+                return key
+            self._jobs.pop(key, None)
+            self._jobs[key] = {"state": "queued", "progress": 0, "message": "W kolejce...", "path": None}
+            self._evict_jobs()
+        self._queue.put((key, self._path(key), df, model_path))
+        return key
+
+    def job(self, key):
+        with self._lock:
+            return dict(self._jobs.get(key, {"state": "unknown", "progress": 0, "message": "", "path": None}))
+
+    def _update(self, key, **fields):
+        with self._lock:
+            if key in self._jobs:
+                self._jobs[key].update(fields)
+
+    def _prune_files(self):
+        """Zostawia na dysku `max_files` najnowszych wyników; zadania usuniętych plików są zapominane."""
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".arrow")]
+        paths.sort(key=lambda p: os.stat(p).st_mtime_ns, reverse=True)
+        for path in paths[self.max_files:]:
+            try:
+                os.remove(path)  # wczytane już ramki mają plik zmapowany - działają dalej
+            except OSError:
+                continue
+            with self._lock:
+                for key in [k for k, job in self._jobs.items() if job["path"] == path]:
+                    del self._jobs[key]
+
+    def _work(self):
+        while True:
+            key, path, df, model_path = self._queue.get()
+            try:
+                with span("batch_scoring"):
+                    self._run(key, path, df, model_path)
+            except Exception as e:
+                self._update(key, state="failed", message=str(e))
+
+    def _run(self, key, path, df, model_path):
+        self._update(key, state="running", progress=1, message=f"Uruchamianie predykcji dla {len(df):,} wierszy...")
+
+        def progress(done, total):
+            self._update(key, progress=int(95 * done / total), message=f"Predykcje: {done}/{total} kawałków")
+
+        scores = score_dataset(model_path, df, workers=self.workers, chunk_rows=self.chunk_rows, progress=progress, threads=self.threads)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with replacing(path) as tmp_path:
+            feather.write_feather(scores.reset_index(drop=True), tmp_path, compression="uncompressed")
+        self._update(key, state="finished", progress=100, message="Zakończono!", path=path)
+        self._prune_files()
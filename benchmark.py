@@ -0,0 +1,304 @@
+"""Pomiary wydajności gorących ścieżek aplikacji - bez przeglądarki i bez Streamlit.
+
+Dla każdego rozmiaru datasetu (oryginał albo większy, wygenerowany przez
+synthetic_data.py) mierzy wczytywanie, statystyki, filtry mapy, budowę
+i serializację figur, te same zapytania na kopii Parquet (zapytania z dysku)
+oraz - raz - wczytanie modelu i predykcję. Wyniki
+(mediana z `--repeat` powtórzeń) trafiają do JSON; z `--baseline` każdy
+przypadek wolniejszy od bazowego o więcej niż `--tolerance` jest zgłaszany
+jako regresja (kod wyjścia 1). Błąd jednego przypadku nie przerywa pomiarów:
+trafia do "errors" w JSON (przypadki od niego zależne są pomijane), a przy
+porównaniu przypadek z bazowego wyniku, który się nie udał, to też regresja.
+
+Użycie:
+    python benchmark.py --sizes 20640,100000,1000000 --output bench.json
+    python benchmark.py --baseline bench.json --output bench_new.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from aggregates import PRICE_COL, AGE_COL, box_quantiles, compute_aggregates, downsample_scatter, grid_aggregate, histogram_counts
+from data_store import compact_dtypes, convert_to_parquet, load_columnar
+from filters import FilterIndex
+from prediction import FEATURE_COLUMNS, load_predictor
+from query_engine import OnDiskDataset
+from refit_jobs import resolve_model_path
+from settings import MAP_GRID_SIZE, MAP_MAX_POINTS, MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH
+from synthetic_data import write_scaled_csv
+
+RAW_MAP_MAX_ROWS = 100_000  # powyżej figura z surowymi punktami jest pomijana (setki MB JSON)
+
+
+def measure(fn, repeat=3, setup=None):
+    """Czasy `repeat` wywołań `fn` w sekundach; `setup` przed każdym, poza pomiarem."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+class Cases:
+    """Wyniki przypadków: nazwa -> lista czasów, a błędy osobno - błąd jednego nie przerywa pozostałych."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+        self.errors = {}
+
+    def measure(self, name, fn, setup=None):
+        try:
+            self.results[name] = measure(fn, self.repeat, setup)
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+
+    def prepare(self, name, fn):
+        """Dane dla kolejnych przypadków; None (i błąd pod `name`), gdy przygotowanie się nie udało."""
+        try:
+            return fn()
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+            return None
+
+
+def dataset_cases(csv_path, work_dir, repeat):
+    """Przypadki zależne od rozmiaru datasetu: `Cases` z czasami i błędami."""
+    cache_dir = os.path.join(work_dir, "cache")
+    cases = Cases(repeat)
+    cases.measure("load_csv_pandas", lambda: pd.read_csv(csv_path))
+    cases.measure(
+        "load_columnar_cold", lambda: load_columnar(csv_path, cache_dir),
+        setup=lambda: shutil.rmtree(cache_dir, ignore_errors=True),
+    )
+    cases.measure("load_columnar_warm", lambda: load_columnar(csv_path, cache_dir))
+    df = cases.prepare("prepare_frame", lambda: load_columnar(csv_path, cache_dir))
+    filters = None
+    if df is not None:
+        filters = cases.prepare("prepare_filters", lambda: map_filters(df["latitude"]))
+        frame_cases(cases, df, filters)
+    on_disk_cases(cases, csv_path, work_dir, filters)
+    return cases
+
+
+def map_filters(latitude):
+    """Filtry mapy przypadków: środkowa połowa szerokości geograficznej + wartości ocean_proximity."""
+    lat_low, lat_high = latitude.quantile([0.25, 0.75])
+    return {"latitude": (float(lat_low), float(lat_high)), "ocean_proximity": ["INLAND", "NEAR BAY"]}
+
+
+def frame_cases(cases, df, filters):
+    """Zakładka statystyk, filtry i mapa na ramce w pamięci."""
+    cases.measure("stats_all_aggregates", lambda: compute_aggregates(df))
+    cases.measure("stats_describe", lambda: df.describe())
+    cases.measure("stats_corr", lambda: df.select_dtypes(include=["number"]).corr())
+    cases.measure("stats_price_histogram", lambda: histogram_counts(df[PRICE_COL]))
+    cases.measure("stats_age_groups_box", lambda: box_quantiles(df[PRICE_COL], pd.cut(df[AGE_COL], bins=5)))
+    cases.measure(
+        "stats_scatter_downsample", lambda: downsample_scatter(df["median_income"], df[PRICE_COL], max_points=MAP_MAX_POINTS)
+    )
+
+    if filters is None:
+        return
+    lat_low, lat_high = filters["latitude"]
+    cases.measure(
+        "filter_pandas_mask",
+        lambda: df[df["latitude"].between(lat_low, lat_high) & df["ocean_proximity"].isin(filters["ocean_proximity"])],
+    )
+    cases.measure("filter_index_build_and_query", lambda: FilterIndex(df).apply(filters))
+    index = cases.prepare("prepare_filter_index", lambda: FilterIndex(df))
+    if index is None:
+        return
+    step = [0]
+
+    def moved_slider():
+        # Każde wywołanie to nowy zakres - jak przesunięcie suwaka, bez trafienia w cache wyników
+        step[0] += 1
+        index.apply({**filters, "latitude": (float(lat_low) + step[0] * 1e-3, float(lat_high))})
+
+    cases.measure("filter_index_slider_move", moved_slider)
+    filtered = cases.prepare("prepare_filtered", lambda: index.apply(filters))
+    if filtered is None:
+        return
+
+    # Mapa: agregacja do siatki i figura z serializacją (to, co trafia do przeglądarki)
+    def aggregated_figure():
+        grid = grid_aggregate(filtered["longitude"], filtered["latitude"], values=filtered[PRICE_COL],
+                              grid_size=MAP_GRID_SIZE, value_name=f"mean_{PRICE_COL}")
+        fig = px.scatter_mapbox(grid, lat="latitude", lon="longitude", color=f"mean_{PRICE_COL}", size="count",
+                                size_max=15, zoom=10, mapbox_style="open-street-map")
+        return fig.to_json()
+
+    cases.measure(
+        "map_grid_aggregate",
+        lambda: grid_aggregate(filtered["longitude"], filtered["latitude"], values=filtered[PRICE_COL], grid_size=MAP_GRID_SIZE),
+    )
+    cases.measure("map_figure_aggregated", aggregated_figure)
+    if len(filtered) <= RAW_MAP_MAX_ROWS:
+        cases.measure(
+            "map_figure_raw_points",
+            lambda: px.scatter_mapbox(filtered, lat="latitude", lon="longitude", color=PRICE_COL,
+                                      zoom=10, mapbox_style="open-street-map").to_json(),
+        )
+
+
+def on_disk_cases(cases, csv_path, work_dir, filters=None):
+    """Zapytania z dysku: te same filtry (bez ramki - liczone z kopii Parquet), siatka i statystyki bez ramki w pamięci."""
+    parquet_dir = os.path.join(work_dir, "parquet")
+    cases.measure(
+        "on_disk_convert", lambda: convert_to_parquet(csv_path, parquet_dir),
+        setup=lambda: shutil.rmtree(parquet_dir, ignore_errors=True),
+    )
+    dataset = cases.prepare("prepare_on_disk", lambda: OnDiskDataset(convert_to_parquet(csv_path, parquet_dir)))
+    if dataset is None:
+        return
+    if filters is None:
+        filters = cases.prepare("prepare_on_disk_filters", lambda: map_filters(dataset.select(None, ["latitude"])["latitude"]))
+    if filters is None:
+        return
+    cases.measure("on_disk_count", lambda: OnDiskDataset(dataset.path).count(filters))
+    cases.measure("on_disk_grid", lambda: dataset.grid(filters, "longitude", "latitude", PRICE_COL, grid_size=MAP_GRID_SIZE))
+    cases.measure("on_disk_page_sorted", lambda: OnDiskDataset(dataset.path).page(filters, 0, 25, sort_col=PRICE_COL))
+    cases.measure("on_disk_aggregates", lambda: dataset.aggregates())
+
+
+def model_cases(model_path, data, repeat, single_rows=20, batch_rows=1000):
+    """Wczytanie modelu i predykcja; czasy predykcji w przeliczeniu na jeden wiersz."""
+    results = {}
+    predictor = None
+
+    def load():
+        nonlocal predictor
+        predictor = load_predictor(model_path)
+
+    results["model_load"] = measure(load, repeat)
+    features = data[FEATURE_COLUMNS]
+    predictor.predict(features.iloc[:1])  # pierwsze wywołanie inicjalizuje modele - poza pomiarem
+
+    def single():
+        for i in range(single_rows):
+            predictor.predict(features.iloc[[i]])
+
+    batch = features.iloc[:batch_rows]
+    results["predict_single_row"] = [t / single_rows for t in measure(single, repeat)]
+    results["predict_batch_per_row"] = [t / len(batch) for t in measure(lambda: predictor.predict(batch), repeat)]
+    return results
+
+
+def summarize(times):
+    return {"median_s": statistics.median(times), "min_s": min(times), "runs": len(times)}
+
+
+def compare(results, baseline, tolerance, errors=None, sizes=()):
+    """Przypadki wolniejsze od bazowych o więcej niż `tolerance` (względnie).
+
+    Regresją jest też bazowy przypadek dla zmierzonego rozmiaru (`sizes`),
+    który teraz się nie udał albo został pominięty po błędzie przygotowania
+    (zmiana i stosunek to wtedy None).
+    """
+    errors = errors or {}
+    regressions = [
+        (name, base["median_s"], None, None) for name, base in baseline.items()
+        if name not in results and (name in errors or name.rpartition("@")[2] in {str(size) for size in sizes})
+    ]
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base["median_s"] <= 0:
+            continue
+        ratio = result["median_s"] / base["median_s"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, base["median_s"], result["median_s"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="housing.csv", help="dataset wzorcowy")
+    parser.add_argument("--sizes", default="20640,100000", help="rozmiary datasetów oddzielone przecinkami")
+    parser.add_argument("--model", default=None, help="katalog predyktora (domyślnie ten sam model co aplikacja)")
+    parser.add_argument("--skip-model", action="store_true", help="bez pomiarów modelu")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--work-dir", default=".cache/bench", help="katalog na wygenerowane datasety")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="wcześniejszy wynik do porównania")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="dopuszczalne spowolnienie względem bazowego")
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.data)
+    results, errors = {}, {}
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for size in sizes:
+        work_dir = os.path.join(args.work_dir, str(size))
+        os.makedirs(work_dir, exist_ok=True)
+        csv_path = os.path.join(work_dir, "housing.csv")
+        if size == len(base):
+            shutil.copyfile(args.data, csv_path)
+        elif not os.path.exists(csv_path):
+            print(f"Generowanie {size:,} wierszy...")
+            write_scaled_csv(base, size, csv_path)
+        print(f"Pomiary dla {size:,} wierszy...")
+        cases = dataset_cases(csv_path, work_dir, args.repeat)
+        for name, times in cases.results.items():
+            results[f"{name}@{size}"] = summarize(times)
+        for name, error in cases.errors.items():
+            errors[f"{name}@{size}"] = error
+
+    if not args.skip_model:
+        model_path = args.model or resolve_model_path(MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH)
+        try:
+            for name, times in model_cases(model_path, compact_dtypes(base), args.repeat).items():
+                results[name] = summarize(times)
+        except Exception as e:
+            errors["model"] = f"{type(e).__name__}: {e}"
+            print(f"Pominięto pomiary modelu: {e}")
+
+    for name, result in results.items():
+        print(f"{name:45s} {result['median_s'] * 1000:10.2f} ms")
+    for name, error in errors.items():
+        print(f"{name:45s} BŁĄD: {error}")
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "errors": errors,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Zapisano {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, errors, sizes)
+        for name, before, after, ratio in regressions:
+            if after is None:
+                print(f"REGRESJA {name}: {before * 1000:.2f} ms -> {'błąd: ' + errors[name] if name in errors else 'pominięty'}")
+            else:
+                print(f"REGRESJA {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms (x{ratio:.2f})")
+        if regressions:
+            raise SystemExit(1)
+        print(f"Brak regresji względem {args.baseline} (tolerancja {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
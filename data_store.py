@@ -0,0 +1,238 @@
+"""Wczytywanie datasetów: jednorazowa konwersja CSV do kolumnowego formatu Arrow (albo Parquet dla zapytań z dysku)."""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+MAX_CATEGORIES = 50  # kolumny tekstowe z mniejszą liczbą wartości -> category
+FLOAT32_RTOL = 1e-6  # dopuszczalny błąd względny przy zamianie float64 -> float32
+PARQUET_BLOCK_BYTES = 1024**2  # kawałek CSV czytany przy konwersji do Parquet (czytnik trzyma w pamięci kilkadziesiąt kawałków naprzód)
+PARQUET_ROW_GROUP_ROWS = 128 * 1024  # wiersze w grupie Parquet - jednostka pomijania po min/max i paczka skanera
+
+
+def file_fingerprint(path):
+    """Tani odcisk pliku (rozmiar + mtime) - zmienia się przy każdej modyfikacji."""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def content_hash(file_obj):
+    """sha256 zawartości otwartego pliku binarnego; pozycja wraca na początek."""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(1 << 20), b""):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+@contextmanager
+def replacing(path):
+    """Ścieżka unikalnego pliku tymczasowego obok `path`; po udanym zapisie zastępuje `path` przez os.replace.
+
+    Kilka procesów (np. replik ze wspólnym katalogiem cache) może zapisywać
+    ten sam plik naraz - każdy pisze do własnego pliku, a podmiana jest atomowa.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def save_upload(file_obj, path):
+    """Zapisuje otwarty plik binarny na dysk kawałkami (przez plik tymczasowy); pozycja wraca na początek."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_obj.seek(0)
+    with replacing(path) as tmp_path, open(tmp_path, "wb") as f:
+        shutil.copyfileobj(file_obj, f, 1 << 20)
+    file_obj.seek(0)
+
+
+def prune_files(directory, keep):
+    """Zostawia w `directory` pliki `keep` najnowszych kluczy (część nazwy przed pierwszą kropką).
+
+    Kopie jednego pliku (np. `<hash>.csv`, `<hash>.parquet`,
+    `<hash>.parquet.meta.json`) są usuwane razem; o kolejności decyduje
+    najnowszy mtime w grupie. Pliki tymczasowe (zaczynające się od kropki)
+    zostają - mogą być w trakcie zapisu.
+    """
+    groups, newest = {}, {}
+    for name in os.listdir(directory):
+        if name.startswith("."):
+            continue
+        key, path = name.split(".")[0], os.path.join(directory, name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        groups.setdefault(key, []).append(path)
+        newest[key] = max(newest.get(key, 0), mtime)
+    for key in sorted(groups, key=newest.get, reverse=True)[keep:]:
+        for path in groups[key]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return content_hash(f)
+
+
+def compact_dtypes(df):
+    """float64 -> float32 tam, gdzie to prawie bezstratne; tekst o małej liczbie wartości -> category."""
+    df = df.copy(deep=False)
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            as_float32 = values.astype(np.float32)
+            if np.allclose(as_float32.to_numpy(np.float64), values.to_numpy(np.float64), rtol=FLOAT32_RTOL, equal_nan=True):
+                df[col] = as_float32
+        elif pd.api.types.is_integer_dtype(values):
+            df[col] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            if values.nunique(dropna=True) <= MAX_CATEGORIES:
+                df[col] = values.astype("category")
+    return df
+
+
+def _convert(csv_path, arrow_path):
+    df = compact_dtypes(pd.read_csv(csv_path))
+    with replacing(arrow_path) as tmp_path:
+        # Bez kompresji - tylko wtedy plik da się zmapować do pamięci bez kopiowania
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+
+
+def _cached_copy(csv_path, copy_path, meta_path, convert):
+    """Przebudowuje `copy_path` przez `convert(csv_path, copy_path)`, tylko gdy zmieniła się zawartość CSV.
+
+    Zmiana rozmiaru/mtime CSV powoduje sprawdzenie sha256 - kopia jest
+    przebudowywana dopiero, gdy zmieniła się zawartość.
+    """
+    fingerprint = file_fingerprint(csv_path)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+
+    if meta.get("fingerprint") != fingerprint or not os.path.exists(copy_path):
+        digest = _file_hash(csv_path)
+        if meta.get("sha256") != digest or not os.path.exists(copy_path):
+            convert(csv_path, copy_path)
+        with replacing(meta_path) as tmp_path, open(tmp_path, "w") as f:
+            json.dump({"fingerprint": fingerprint, "sha256": digest}, f)
+
+
+def load_columnar(csv_path, cache_dir):
+    """Wczytuje CSV przez kolumnową kopię w `cache_dir`, przebudowywaną tylko po zmianie pliku.
+
+    Zwracana ramka korzysta bezpośrednio z pliku zmapowanego do pamięci - nie modyfikować.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    arrow_path = os.path.join(cache_dir, f"{name}.arrow")
+    _cached_copy(csv_path, arrow_path, os.path.join(cache_dir, f"{name}.meta.json"), _convert)
+
+    table = feather.read_table(arrow_path, memory_map=True)
+    # Kolumna na blok: kolumny liczbowe bez braków zostają widokami zmapowanego pliku
+    # (tylko do odczytu, bez kopii, współdzielone przez proces) zamiast jednego skopiowanego bloku
+    return table.to_pandas(split_blocks=True)
+
+
+def _convert_parquet(csv_path, parquet_path):
+    # Typy z pierwszego kawałka; liczby całkowite jako float64, bo dalsze kawałki mogą mieć ułamki lub braki
+    with pacsv.open_csv(csv_path, read_options=pacsv.ReadOptions(block_size=PARQUET_BLOCK_BYTES)) as reader:
+        schema = reader.schema
+    column_types = {
+        field.name: pa.float64() if pa.types.is_integer(field.type) else pa.string()
+        for field in schema
+        if pa.types.is_integer(field.type) or pa.types.is_null(field.type)
+    }
+    with replacing(parquet_path) as tmp_path, pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=PARQUET_BLOCK_BYTES),
+        # Puste pola tekstowe jako braki, jak w pandas.read_csv
+        convert_options=pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    ) as reader, pq.ParquetWriter(tmp_path, reader.schema) as writer:
+        pending, rows = [], 0
+        for batch in reader:
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= PARQUET_ROW_GROUP_ROWS:
+                # Tylko pełne grupy; reszta czeka na kolejne kawałki
+                table = pa.Table.from_batches(pending)
+                full = rows - rows % PARQUET_ROW_GROUP_ROWS
+                writer.write_table(table.slice(0, full), row_group_size=PARQUET_ROW_GROUP_ROWS)
+                pending, rows = table.slice(full).to_batches(), rows - full
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=PARQUET_ROW_GROUP_ROWS)
+
+
+def convert_to_parquet(csv_path, cache_dir):
+    """Ścieżka kopii Parquet pliku CSV w `cache_dir`, przebudowywanej tylko po zmianie pliku.
+
+    CSV jest czytany strumieniowo kawałkami, więc plik może być większy niż
+    pamięć. Grupy wierszy mają statystyki min/max, po których skaner pomija
+    grupy niepasujące do filtrów.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    parquet_path = os.path.join(cache_dir, f"{name}.parquet")
+    _cached_copy(csv_path, parquet_path, os.path.join(cache_dir, f"{name}.parquet.meta.json"), _convert_parquet)
+    return parquet_path
+
+
+def ingest_csv(file_obj, chunk_rows=100_000, max_rows=None, max_bytes=None):
+    """Wczytuje CSV kawałkami, zmniejszając typy po drodze.
+
+    Czytanie kończy się po `max_rows` wierszach albo gdy ramka zajmuje
+    `max_bytes` bajtów w pamięci. Zwraca (ramka, czy_obcięto) - obcięto tylko
+    wtedy, gdy w pliku zostały niewczytane wiersze.
+    """
+    file_obj.seek(0)
+    # Własny wrapper tekstowy - pandas zamknąłby przekazany plik binarny po odczycie
+    text = io.TextIOWrapper(file_obj, encoding="utf-8", newline="")
+    chunks, rows, size = [], 0, 0
+    truncated = False
+    try:
+        with pd.read_csv(text, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                if max_rows is not None and rows + len(chunk) > max_rows:
+                    chunk = chunk.iloc[:max_rows - rows]
+                    truncated = True
+                chunk = compact_dtypes(chunk)
+                chunks.append(chunk)
+                rows += len(chunk)
+                size += chunk.memory_usage(deep=True).sum()
+                if truncated:
+                    break
+                if (max_rows is not None and rows >= max_rows) or (max_bytes is not None and size >= max_bytes):
+                    # Limit osiągnięty - obcięte tylko, jeśli jest jeszcze kolejny kawałek
+                    truncated = next(reader, None) is not None
+                    break
+    finally:
+        text.detach()
+        file_obj.seek(0)
+
+    if not chunks:
+        raise ValueError("Plik CSV nie zawiera danych")
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    # Kategorie z różnych kawałków łączą się w object - drugie przejście je przywraca
+    return compact_dtypes(df), truncated
@@ -0,0 +1,194 @@
+"""Filtrowanie datasetu przez indeksy kolumn i bitmapy wierszy - bez kopiowania ramki."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """Indeksy filtrów jednego datasetu, współdzielone przez wszystkie sesje.
+
+    Kolumny liczbowe: posortowane wartości + permutacja wierszy, więc zakres
+    suwaka to dwa `searchsorted`. Kolumny kategoryczne: bitmapa wierszy dla
+    każdej wartości. Bitmapy są spakowane (1 bit na wiersz) i łączone
+    operacjami bitowymi. Maski pojedynczych filtrów są zapamiętywane, więc
+    zmiana jednego suwaka przelicza tylko jego maskę.
+    """
+
+    def __init__(self, df, max_cached_masks=64, max_cached_results=16):
+        self.df = df
+        self.n_rows = len(df)
+        self._numeric = {}
+        self._categorical = {}
+        self._masks = OrderedDict()
+        self._results = OrderedDict()
+        self._orders = {}
+        self._sorted = OrderedDict()
+        self._max_cached_masks = max_cached_masks
+        self._max_cached_results = max_cached_results
+        self._lock = threading.Lock()
+
+    # --- indeksy budowane leniwie, raz na kolumnę ---
+    def _numeric_index(self, col):
+        index = self._numeric.get(col)
+        if index is None:
+            values = self.df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            order = np.argsort(values, kind="stable")  # NaN lądują na końcu
+            index = (values[order], order, int(np.count_nonzero(~np.isnan(values))))
+            self._numeric[col] = index
+        return index
+
+    def _categorical_index(self, col):
+        index = self._categorical.get(col)
+        if index is None:
+            codes, uniques = pd.factorize(self.df[col], use_na_sentinel=True)
+            bitmaps = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(uniques)
+            }
+            index = (list(uniques), bitmaps)
+            self._categorical[col] = index
+        return index
+
+    def _sort_order(self, col):
+        """Permutacja wierszy rosnąco po kolumnie (braki na końcu) i liczba wierszy bez braków."""
+        order = self._orders.get(col)
+        if order is None:
+            if pd.api.types.is_numeric_dtype(self.df[col]):
+                _, permutation, n_valid = self._numeric_index(col)
+            else:
+                codes, _ = pd.factorize(self.df[col], sort=True, use_na_sentinel=True)
+                n_valid = int(np.count_nonzero(codes >= 0))
+                codes = np.where(codes < 0, np.iinfo(codes.dtype).max, codes)
+                permutation = np.argsort(codes, kind="stable")
+            order = self._orders[col] = (permutation, n_valid)
+        return order
+
+    def value_range(self, col):
+        """(min, max) kolumny liczbowej z indeksu - bez przechodzenia po ramce."""
+        with self._lock:
+            sorted_values, _, n_valid = self._numeric_index(col)
+        if n_valid == 0:
+            return float("nan"), float("nan")
+        return float(sorted_values[0]), float(sorted_values[n_valid - 1])
+
+    def categories(self, col):
+        """Unikalne wartości kolumny (bez braków) w kolejności wystąpienia."""
+        with self._lock:
+            return self._categorical_index(col)[0]
+
+    # --- maski pojedynczych filtrów ---
+    def _range_bitmap(self, col, low, high):
+        sorted_values, order, n_valid = self._numeric_index(col)
+        start = np.searchsorted(sorted_values[:n_valid], low, side="left")
+        stop = np.searchsorted(sorted_values[:n_valid], high, side="right")
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    def _values_bitmap(self, col, selected):
+        _, bitmaps = self._categorical_index(col)
+        result = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for value in selected:
+            bitmap = bitmaps.get(value)
+            if bitmap is not None:
+                np.bitwise_or(result, bitmap, out=result)
+        return result
+
+    def _filter_bitmap(self, col, filter_val):
+        key = (col, filter_val)
+        bitmap = self._masks.get(key)
+        if bitmap is None:
+            kind, *args = filter_val
+            if kind == "range":
+                bitmap = self._range_bitmap(col, *args)
+            else:
+                bitmap = self._values_bitmap(col, *args)
+            self._masks[key] = bitmap
+            while len(self._masks) > self._max_cached_masks:
+                self._masks.popitem(last=False)
+        else:
+            self._masks.move_to_end(key)
+        return bitmap
+
+    @staticmethod
+    def key(active_filters):
+        """Kanoniczny, hashowalny klucz filtrów: zakres -> ("range", low, high), wartości -> ("values", frozenset)."""
+        return tuple(sorted(
+            (col, ("range", *val) if isinstance(val, tuple) else ("values", frozenset(val)))
+            for col, val in active_filters.items()
+        ))
+
+    def row_ids(self, active_filters):
+        """Numery wierszy spełniających wszystkie filtry (None = brak filtrów)."""
+        if not active_filters:
+            return None
+        filters = self.key(active_filters)
+        with self._lock:
+            rows = self._results.get(filters)
+            if rows is not None:
+                self._results.move_to_end(filters)
+                return rows
+
+            combined = None
+            for col, filter_val in filters:
+                bitmap = self._filter_bitmap(col, filter_val)
+                combined = bitmap.copy() if combined is None else np.bitwise_and(combined, bitmap, out=combined)
+            rows = np.flatnonzero(np.unpackbits(combined, count=self.n_rows))
+
+            self._results[filters] = rows
+            while len(self._results) > self._max_cached_results:
+                self._results.popitem(last=False)
+            return rows
+
+    def count(self, active_filters):
+        """Liczba wierszy spełniających wszystkie filtry."""
+        rows = self.row_ids(active_filters)
+        return self.n_rows if rows is None else len(rows)
+
+    def page(self, active_filters, start, stop, sort_col=None, descending=False):
+        """Numery wierszy od `start` do `stop` po filtrach i sortowaniu oraz liczba wszystkich pasujących.
+
+        Kolejność posortowanych wyników jest zapamiętywana, więc przejście
+        na kolejną stronę to tylko wycinek tablicy.
+        """
+        rows = self.row_ids(active_filters)
+        if sort_col is None:
+            if rows is None:
+                return np.arange(start, min(stop, self.n_rows)), self.n_rows
+            return rows[start:stop], len(rows)
+
+        key = (self.key(active_filters or {}), sort_col, descending)
+        with self._lock:
+            ordered = self._sorted.get(key)
+            if ordered is None:
+                order, n_valid = self._sort_order(sort_col)
+                if descending:
+                    order = np.concatenate([order[:n_valid][::-1], order[n_valid:]])
+                if rows is not None:
+                    selected = np.zeros(self.n_rows, dtype=bool)
+                    selected[rows] = True
+                    order = order[selected[order]]
+                ordered = self._sorted[key] = order
+                while len(self._sorted) > self._max_cached_results:
+                    self._sorted.popitem(last=False)
+            else:
+                self._sorted.move_to_end(key)
+        return ordered[start:stop], len(ordered)
+
+    def apply(self, active_filters, columns=None):
+        """Przefiltrowana ramka, tylko z kolumnami `columns` (None = wszystkie).
+
+        Bez filtrów zwraca oryginał (albo jego kolumny) bez kopii - wynik
+        tylko do odczytu. Z filtrami kopiowane są tylko wybrane kolumny
+        i wiersze.
+        """
+        rows = self.row_ids(active_filters)
+        df = self.df
+        if columns is not None:
+            # Ramka ze słownika serii z copy=False to widok kolumn; df[lista] skopiowałby je
+            df = pd.DataFrame({col: df[col] for col in dict.fromkeys(columns)}, copy=False)
+        if rows is None:
+            return df
+        return df.take(rows)
@@ -0,0 +1,232 @@
+"""Lokalny serwer HTTP/JSON z predykcjami ceny tym samym modelem co aplikacja.
+
+Pojedyncze zapytania z wielu połączeń są łączone w małe paczki (micro-batching)
+w krótkim oknie czasowym - model dostaje jedno wywołanie `predict` na paczkę.
+
+Endpointy:
+    GET  /health   - serwer działa; liczniki paczek i punktów micro-batchingu
+    GET  /ready    - model wczytany (503 w trakcie wczytywania)
+    POST /predict  - {"longitude": ..., ..., "ocean_proximity": "INLAND"}
+                     albo {"instances": [{...}, ...]}
+
+Użycie:
+    python inference_server.py --port 8600
+"""
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from model_warmup import ModelWarmup
+from prediction import EXAMPLE_FEATURES, FEATURE_COLUMNS, OCEAN_PROXIMITY_VALUES, load_predictor, predict_prices
+from refit_jobs import resolve_model_path
+from settings import MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH
+
+MAX_INSTANCES = 1000  # limit punktów w jednym zapytaniu
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def parse_features(record):
+    """Sprawdza jeden punkt wejściowy i zwraca słownik 9 cech; ValueError przy błędnych danych."""
+    if not isinstance(record, dict):
+        raise ValueError("punkt musi być obiektem JSON")
+    missing = [col for col in FEATURE_COLUMNS if col not in record]
+    if missing:
+        raise ValueError(f"brak pól: {', '.join(missing)}")
+    unknown = [key for key in record if key not in FEATURE_COLUMNS]
+    if unknown:
+        raise ValueError(f"nieznane pola: {', '.join(unknown)}")
+
+    features = {}
+    for col in FEATURE_COLUMNS:
+        value = record[col]
+        if col == "ocean_proximity":
+            if value not in OCEAN_PROXIMITY_VALUES:
+                raise ValueError(f"ocean_proximity musi być jedną z: {', '.join(OCEAN_PROXIMITY_VALUES)}")
+        else:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"{col} musi być skończoną liczbą")
+            value = float(value)
+        features[col] = value
+    return features
+
+
+class MicroBatcher:
+    """Łączy pojedyncze punkty w paczki: do `max_batch` punktów albo `max_wait_ms` od pierwszego w paczce.
+
+    Punkty już czekające w kolejce (np. wszystkie z jednego zapytania
+    `instances`) trafiają do paczki od razu. Na kolejne paczka czeka tylko
+    wtedy, gdy trwają inne zapytania (oznaczane przez `request()`) -
+    pojedynczy klient nie płaci za okno.
+    `max_batch=1` wyłącza łączenie - każdy punkt to osobne wywołanie modelu.
+    """
+
+    def __init__(self, predict_fn, max_batch=64, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.rows = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._work, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    @contextmanager
+    def request(self):
+        """Oznacza trwające zapytanie HTTP na czas jego obsługi."""
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def submit(self, features):
+        """Dodaje punkt do kolejki; wynik (cena, błąd) przychodzi przez Future."""
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Nie ma na co czekać, gdy wszystkie trwające zapytania są już w paczce
+            while len(batch) < min(self.max_batch, self._active):
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        try:
+            prices, errors = self.predict_fn(pd.DataFrame([features for features, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), price, error in zip(batch, prices, errors):
+            future.set_result((price, error))
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # wielu klientów łączy się naraz - domyślne 5 zrywa połączenia
+
+    def __init__(self, address, model_path, max_batch=64, max_wait_ms=5.0):
+        super().__init__(address, _Handler)
+        self.model_path = model_path
+        self.warmup = ModelWarmup(load_predictor, model_path, pd.DataFrame([EXAMPLE_FEATURES]))
+        self.batcher = MicroBatcher(self._predict, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def _predict(self, features):
+        # Punkty trafiają tu dopiero, gdy rozgrzewanie się skończyło
+        return predict_prices(self.warmup.predictor, features)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive - klient nie otwiera połączenia dla każdego zapytania
+    disable_nagle_algorithm = True  # nagłówki i treść odpowiedzi idą osobno - bez tego ~40 ms opóźnienia ACK
+
+    def log_message(self, format, *args):
+        pass  # bez logu każdego zapytania - przy obciążeniu spowalnia serwer
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        warmup = self.server.warmup
+        if self.path == "/health":
+            batcher = self.server.batcher
+            self._send(200, {"status": "ok", "batches": batcher.batches, "rows": batcher.rows})
+        elif self.path == "/ready":
+            status = 200 if warmup.state == "ready" else 503
+            self._send(status, {"state": warmup.state, "model": self.server.model_path, "error": warmup.error, "warning": warmup.warning})
+        else:
+            self._send(404, {"error": "nieznany endpoint"})
+
+    def do_POST(self):
+        with self.server.batcher.request():
+            self._predict()
+
+    def _predict(self):
+        if self.path != "/predict":
+            self._send(404, {"error": "nieznany endpoint"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"error": f"zapytanie większe niż {MAX_BODY_BYTES} bajtów"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            single = not (isinstance(payload, dict) and "instances" in payload)
+            instances = [payload] if single else payload["instances"]
+            if not isinstance(instances, list) or not 0 < len(instances) <= MAX_INSTANCES:
+                raise ValueError(f"instances musi być listą 1-{MAX_INSTANCES} punktów")
+            rows = [parse_features(record) for record in instances]
+        except ValueError as e:  # także błędny JSON
+            self._send(400, {"error": str(e)})
+            return
+
+        if self.server.warmup.state != "ready":
+            self._send(503, {"error": f"model niedostępny ({self.server.warmup.state})"})
+            return
+
+        futures = [self.server.batcher.submit(row) for row in rows]
+        try:
+            results = [future.result() for future in futures]
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+            return
+        predictions = [{"predicted_price": price, "error": error} for price, error in results]
+        self._send(200, predictions[0] if single else {"predictions": predictions})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--model", default=None, help="katalog predyktora (domyślnie ten sam model co aplikacja)")
+    parser.add_argument("--max-batch", type=int, default=64, help="maks. liczba punktów w paczce; 1 = bez łączenia")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="jak długo czekać na kolejne punkty paczki [ms]")
+    args = parser.parse_args()
+
+    model_path = args.model or resolve_model_path(MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH)
+    server = InferenceServer((args.host, args.port), model_path, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"Serwer predykcji na http://{args.host}:{args.port} (model: {model_path}, paczki do {args.max_batch})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
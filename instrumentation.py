@@ -0,0 +1,203 @@
+"""Lekkie pomiary sekcji aplikacji: czas, CPU, wzrost szczytowego RSS procesu, trafienia cache - wspólne dla wszystkich sesji.
+
+Sekcje mierzy `span(nazwa)`; wyniki trafiają do globalnego `REGISTRY`
+(histogramy czasów w stylu Prometheus) oraz do listy sekcji bieżącego
+uruchomienia skryptu (`run_spans()`), pokazywanej w panelu diagnostycznym.
+Pamięć to wzrost szczytowego RSS całego procesu w czasie sekcji: po
+rozgrzaniu zwykle 0, a przy równoległych sesjach wzrost trafia do sekcji,
+która akurat trwała - to sygnał "tu proces urósł", nie zużycie sekcji.
+`REGISTRY` jest dostępny przez lokalny endpoint HTTP (`start_metrics_server`).
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows - bez pomiaru pamięci
+    resource = None
+
+# Granice przedziałów histogramu czasów sekcji [s]
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _peak_rss_bytes():
+    """Szczytowe RSS procesu (ru_maxrss jest w KiB na Linuksie)."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Metrics:
+    """Zbiorcze statystyki sekcji i cache, bezpieczne dla wielu wątków."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._sections = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def observe(self, section, wall, cpu=0.0, peak_rss_increase=0):
+        with self._lock:
+            stats = self._sections.get(section)
+            if stats is None:
+                stats = self._sections[section] = {
+                    "count": 0,
+                    "wall_sum": 0.0,
+                    "cpu_sum": 0.0,
+                    "wall_max": 0.0,
+                    "peak_rss_increase_max": 0,
+                    "buckets": [0] * len(self.buckets),
+                }
+            stats["count"] += 1
+            stats["wall_sum"] += wall
+            stats["cpu_sum"] += cpu
+            stats["wall_max"] = max(stats["wall_max"], wall)
+            stats["peak_rss_increase_max"] = max(stats["peak_rss_increase_max"], peak_rss_increase)
+            for i, bound in enumerate(self.buckets):
+                if wall <= bound:
+                    stats["buckets"][i] += 1
+
+    def cache_call(self, name, miss):
+        with self._lock:
+            stats = self._caches.setdefault(name, {"calls": 0, "misses": 0})
+            stats["calls"] += 1
+            stats["misses"] += miss
+
+    def snapshot(self):
+        """Kopia wszystkich statystyk (do JSON)."""
+        with self._lock:
+            sections = {
+                name: {**stats, "buckets": dict(zip(map(str, self.buckets), stats["buckets"]))}
+                for name, stats in self._sections.items()
+            }
+            caches = {
+                name: {**stats, "hits": stats["calls"] - stats["misses"]}
+                for name, stats in self._caches.items()
+            }
+        return {"sections": sections, "caches": caches}
+
+    def prometheus(self):
+        """Statystyki w formacie tekstowym Prometheus."""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP app_section_seconds Wall time of app sections.",
+            "# TYPE app_section_seconds histogram",
+        ]
+        for name, stats in sorted(snapshot["sections"].items()):
+            for bound, count in stats["buckets"].items():
+                lines.append(f'app_section_seconds_bucket{{section="{name}",le="{bound}"}} {count}')
+            lines.append(f'app_section_seconds_bucket{{section="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'app_section_seconds_sum{{section="{name}"}} {stats["wall_sum"]}')
+            lines.append(f'app_section_seconds_count{{section="{name}"}} {stats["count"]}')
+        lines += ["# HELP app_section_cpu_seconds_total CPU time of app sections (calling thread).",
+                  "# TYPE app_section_cpu_seconds_total counter"]
+        for name, stats in sorted(snapshot["sections"].items()):
+            lines.append(f'app_section_cpu_seconds_total{{section="{name}"}} {stats["cpu_sum"]}')
+        lines += ["# HELP app_section_peak_rss_increase_bytes Largest increase of process peak RSS during a section.",
+                  "# TYPE app_section_peak_rss_increase_bytes gauge"]
+        for name, stats in sorted(snapshot["sections"].items()):
+            lines.append(f'app_section_peak_rss_increase_bytes{{section="{name}"}} {stats["peak_rss_increase_max"]}')
+        lines += ["# HELP app_cache_calls_total Calls of cached functions.",
+                  "# TYPE app_cache_calls_total counter"]
+        for name, stats in sorted(snapshot["caches"].items()):
+            lines.append(f'app_cache_calls_total{{function="{name}"}} {stats["calls"]}')
+        lines += ["# HELP app_cache_misses_total Calls of cached functions that computed the value.",
+                  "# TYPE app_cache_misses_total counter"]
+        for name, stats in sorted(snapshot["caches"].items()):
+            lines.append(f'app_cache_misses_total{{function="{name}"}} {stats["misses"]}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Metrics()
+_run = threading.local()  # sekcje bieżącego uruchomienia skryptu (każde uruchomienie ma własny wątek)
+
+
+def begin_run():
+    """Czyści listę sekcji bieżącego uruchomienia."""
+    _run.spans = []
+
+
+def run_spans():
+    """Sekcje zmierzone w bieżącym uruchomieniu: (nazwa, czas, CPU, wzrost szczytowego RSS procesu)."""
+    return list(getattr(_run, "spans", []))
+
+
+@contextmanager
+def span(section):
+    """Mierzy blok kodu: czas, czas CPU wątku i wzrost szczytowego RSS procesu."""
+    peak_before = _peak_rss_bytes()
+    cpu_start = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+        peak_rss_increase = _peak_rss_bytes() - peak_before
+        REGISTRY.observe(section, wall, cpu, peak_rss_increase)
+        if hasattr(_run, "spans"):
+            _run.spans.append((section, wall, cpu, peak_rss_increase))
+
+
+def counted_cache(cache_decorator, **cache_kwargs):
+    """Jak `cache_decorator(**cache_kwargs)` (st.cache_data / st.cache_resource) plus liczniki trafień w `REGISTRY`.
+
+    Ciało funkcji wykonuje się tylko przy chybieniu - tam liczone są chybienia,
+    a na zewnątrz wszystkie wywołania.
+    """
+    def decorate(func):
+        name = func.__name__
+        missed = threading.local()
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            missed.value = True
+            return func(*args, **kwargs)
+
+        cached = cache_decorator(**cache_kwargs)(compute)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            missed.value = False
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                REGISTRY.cache_call(name, missed.value)
+
+        call.clear = cached.clear
+        return call
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = REGISTRY.prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(REGISTRY.snapshot(), indent=2).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(host="127.0.0.1", port=9464):
+    """Endpoint /metrics (Prometheus) i /metrics.json w wątku w tle; None, gdy port jest zajęty."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,132 @@
+"""Test obciążeniowy serwera predykcji: przepustowość i opóźnienia p50/p99 pojedynczych zapytań.
+
+Uruchamia `--concurrency` klientów, z których każdy wysyła kolejne zapytania
+z jednym punktem (losowe wiersze z housing.csv). Odpowiedź 200 z polem
+`error` (cena zastępcza zamiast predykcji) liczy się jako błąd. Średnia
+wielkość paczki pochodzi z liczników `/health` serwera. Porównanie z łączeniem
+w paczki i bez:
+
+    python inference_server.py --port 8600 &
+    python inference_server.py --port 8601 --max-batch 1 &
+    python load_test.py --url http://127.0.0.1:8600 --url http://127.0.0.1:8601
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from prediction import FEATURE_COLUMNS
+
+
+def batch_counters(url):
+    """Liczniki micro-batchingu serwera (paczki, punkty) z `/health`."""
+    target = urlparse(url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+    try:
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+    return health.get("batches", 0), health.get("rows", 0)
+
+
+def wait_ready(url, timeout=300):
+    """Czeka, aż serwer zgłosi wczytany model."""
+    target = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+            conn.request("GET", "/ready")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"{url}: model nie jest gotowy po {timeout} s")
+
+
+def run_load(url, records, concurrency=16, duration=20.0):
+    """Wysyła zapytania przez `duration` sekund; zwraca statystyki opóźnień i przepustowości."""
+    target = urlparse(url)
+    latencies = [[] for _ in range(concurrency)]
+    failures = [0] * concurrency
+    batches_before, rows_before = batch_counters(url)
+    stop_at = time.perf_counter() + duration
+
+    def client(worker):
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+        i = worker
+        while time.perf_counter() < stop_at:
+            body = json.dumps(records[i % len(records)])
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException):
+                # Zerwane połączenie albo timeout - zapytanie liczone jako błąd, klient łączy się od nowa
+                failures[worker] += 1
+                conn.close()
+                time.sleep(0.1)  # niedziałający serwer odrzuca połączenia od razu - bez pętli na pełnych obrotach
+                continue
+            if response.status == 200 and json.loads(payload).get("error") is None:
+                latencies[worker].append(time.perf_counter() - start)
+            else:
+                failures[worker] += 1  # także cena zastępcza po błędzie predykcji
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    batches_after, rows_after = batch_counters(url)
+    batches = batches_after - batches_before
+
+    all_latencies = np.concatenate([np.asarray(l, dtype=float) for l in latencies]) * 1000
+    return {
+        "url": url,
+        "requests": int(len(all_latencies)),
+        "failures": int(sum(failures)),
+        "throughput_rps": len(all_latencies) / elapsed,
+        "p50_ms": float(np.percentile(all_latencies, 50)) if len(all_latencies) else None,
+        "p99_ms": float(np.percentile(all_latencies, 99)) if len(all_latencies) else None,
+        "avg_batch": (rows_after - rows_before) / batches if batches else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", required=True, help="adres serwera (można podać kilka)")
+    parser.add_argument("--data", default="housing.csv", help="CSV z punktami do wysyłania")
+    parser.add_argument("--concurrency", type=int, default=16, help="liczba równoległych klientów")
+    parser.add_argument("--duration", type=float, default=20.0, help="czas testu na serwer [s]")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)[FEATURE_COLUMNS].dropna().sample(frac=1, random_state=0)
+    records = [
+        {col: (value if col == "ocean_proximity" else float(value)) for col, value in row.items()}
+        for row in data.head(5000).to_dict("records")
+    ]
+    for url in args.url:
+        wait_ready(url)
+        result = run_load(url, records, concurrency=args.concurrency, duration=args.duration)
+        latency = "brak udanych zapytań" if result["p50_ms"] is None else f"p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms"
+        batch = "-" if result["avg_batch"] is None else f"{result['avg_batch']:.1f}"
+        print(
+            f"{result['url']}: {result['requests']} zapytań ({result['failures']} błędów), "
+            f"{result['throughput_rps']:.1f} zapytań/s, {latency}, średnia paczka {batch} punktów"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,593 +1,1160 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from autogluon.tabular import TabularPredictor
+import plotly.graph_objects as go
 import os
+import time
+from prediction import EXAMPLE_FEATURES, OCEAN_PROXIMITY_VALUES, PredictionCache, load_predictor, model_version, predict_prices
+from refit_jobs import RefitManager, resolve_model_path
+from data_store import content_hash, convert_to_parquet, file_fingerprint, ingest_csv, load_columnar, prune_files, save_upload
+from aggregates import STATS_COLUMNS, compute_aggregates, downsample_scatter, grid_aggregate
+from filters import FilterIndex
+from model_warmup import ModelWarmup
+from batch_scoring import PREDICTION_COL, RESIDUAL_COL, ScoringManager, can_score, with_scores
+from instrumentation import REGISTRY, begin_run, counted_cache, run_spans, span, start_metrics_server
+from session_memory import SessionStore
+from streaming_stats import stream_csv_stats
+from spatial_index import SpatialIndex
+from query_engine import OnDiskDataset
+from settings import MAP_GRID_SIZE, MAP_MAX_POINTS, MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH  # wspólne z benchmark.py i inference_server.py
 
 # --- CONFIG ---
-MODEL_PATH = "model"  # путь к предобученной модели
+DATA_PATH = "housing.csv"
+DATA_CACHE_DIR = ".cache"  # kolumnowa kopia housing.csv (Arrow)
+UPLOAD_CHUNK_ROWS = 200_000  # wielkość kawałka przy wczytywaniu uploadu
+UPLOAD_MAX_ROWS = 5_000_000  # limit wierszy wczytywanych z uploadu
+UPLOAD_MAX_BYTES = 2 * 1024**3  # limit pamięci ramki z uploadu
+UPLOAD_CACHE_ENTRIES = 4  # ile wczytanych uploadów trzymać w pamięci
+UPLOAD_SPOOL_DIR = ".cache/uploads"  # kopie dużych uploadów na dysku - do zapytań z dysku (i chwilowo do statystyk strumieniowych)
+UPLOAD_SPOOL_FILES = 8  # ile ostatnio używanych uploadów na dysku (CSV + kopia Parquet) trzymać w UPLOAD_SPOOL_DIR; więcej niż wpisów cache open_on_disk
+ON_DISK_MIN_BYTES = 256 * 1024**2  # CSV większe od tego są odpytywane z dysku (kopia Parquet) zamiast wczytywane do pamięci; None = zawsze w pamięci
+ON_DISK_MAX_POINTS = 200_000  # limit surowych punktów mapy i wykresów wczytywanych z datasetu na dysku
+ON_DISK_SORT_MAX_ROWS = 100_000  # tabela datasetu na dysku posortowana tylko do tego wiersza (głębsze strony trzymałyby w pamięci wszystkie wcześniejsze)
+STATS_STREAMING_MIN_BYTES = 64 * 1024**2  # uploady w pamięci większe od tego mają statystyki liczone strumieniowo z pliku (bez kopii kolumn liczbowych ramki); None = tylko obcięte
+STATS_CHUNK_BYTES = 16 * 1024**2  # wielkość kawałka pliku przy statystykach strumieniowych
+STATS_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))  # procesy statystyk strumieniowych - jeden rdzeń zostaje dla sesji
+SCATTER_POINT_OPTIONS = [1000, 2000, 5000, 10000, 20000, "wszystkie"]  # limity punktów na wykresach statystyk
+PREDICTION_CACHE_SIZE = 10000  # maks. liczba zapamiętanych predykcji (LRU)
+PREDICTION_CACHE_PATH = ".cache/predictions.pkl"  # None = cache tylko w pamięci
+SCORES_CACHE_DIR = ".cache/scores"  # predykcje dla całych datasetów (po fingerprincie i wersji modelu)
+SCORING_CHUNK_ROWS = 100_000  # wielkość kawałka przy predykcji całego datasetu
+SCORING_WORKERS = max(1, (os.cpu_count() or 1) - 1)  # procesy predykcji całego datasetu (po jednym wątku) - jeden rdzeń zostaje dla sesji
+SCORES_CACHE_FILES = 8  # ile plików predykcji całych datasetów trzymać w SCORES_CACHE_DIR
+METRICS_PORT = 9464  # lokalny endpoint /metrics (Prometheus) i /metrics.json; None = wyłączony
+TABLE_PAGE_SIZES = [25, 50, 100, 500]  # wiersze na stronę tabel z danymi (do przeglądarki trafia tylko strona)
+COMPARABLES_K = 5  # domyślna liczba porównywalnych bloków z housing.csv przy punktach ręcznych
+COMPARABLES_RADIUS_KM = 10.0  # domyślny promień szukania porównywalnych bloków; 0 = bez limitu
+COMPARABLE_COLUMNS = ["longitude", "latitude", "median_house_value", "median_income", "housing_median_age", "ocean_proximity"]
+FIGURE_CACHE_ENTRIES = 128  # maks. liczba zapamiętanych figur Plotly (wspólnych dla sesji, LRU)
+SESSION_MEMORY_BUDGET = 256 * 1024**2  # limit danych pochodnych jednej sesji (przefiltrowane ramki, siatki mapy)
 
 st.set_page_config(
     page_title="California Housing Explorer",
     page_icon="🏠",
     layout="wide"
 )
+begin_run()
 
 # --- CACHE MODEL ---
-@st.cache_resource
-def load_pretrained_model():
+@counted_cache(st.cache_resource, max_entries=2, show_spinner=False)
+def load_pretrained_model(model_path=MODEL_PATH):
     """Загрузка предобученной модели AutoGluon"""
-    if os.path.exists(MODEL_PATH):
-        return TabularPredictor.load(MODEL_PATH)
+    if os.path.exists(model_path):
+        # AutoGluon importowany dopiero tutaj - strona główna i statystyki go nie potrzebują
+        return load_predictor(model_path)
     return None
 
+def active_model_path():
+    """Ścieżka aktualnie używanej wersji modelu"""
+    return resolve_model_path(MODEL_PATH, MODEL_VERSIONS_DIR, SLIM_MODEL_PATH)
+
+@counted_cache(st.cache_resource, max_entries=2)
+def get_model_warmup(model_path):
+    """Wczytanie i rozgrzanie modelu w tle - raz na wersję modelu (nowa wersja po doszkoleniu ma własny stan)"""
+    sample = pd.DataFrame([EXAMPLE_FEATURES])
+    return ModelWarmup(load_pretrained_model, model_path, sample)
+
+@st.fragment(run_every=1)
+def show_model_warmup():
+    """Stan rozgrzewania modelu odświeżany co 1 s; po zakończeniu przeładowuje stronę"""
+    warmup = get_model_warmup(active_model_path())
+    if warmup.warming:
+        st.info(f"⏳ Model AutoGluon się rozgrzewa ({warmup.elapsed():.0f} s)... Predykcje będą dostępne za chwilę.")
+    else:
+        st.rerun()
+
+@counted_cache(st.cache_resource)
+def get_refit_manager():
+    """Kolejka doszkalania modelu wspólna dla wszystkich sesji"""
+    return RefitManager(
+        MODEL_PATH, MODEL_VERSIONS_DIR, loader=load_pretrained_model,
+        selection_path=os.path.join(SLIM_MODEL_PATH, "selection.json"),
+    )
+
+@st.fragment(run_every=2)
+def show_refit_progress(job_id):
+    """Postęp doszkalania odświeżany co 2 s bez blokowania reszty strony"""
+    job = get_refit_manager().job(job_id)
+    if job["state"] in ("queued", "running"):
+        st.progress(job["progress"], text=job["message"])
+    elif job["state"] == "finished":
+        st.success(f"✅ Model został doszkolony na nowych danych! Aktywna wersja: {job['version']}")
+    elif job["state"] == "failed":
+        st.error(f"Błąd podczas refit: {job['message']}")
+
+@counted_cache(st.cache_resource)
+def get_scoring_manager():
+    """Kolejka predykcji dla całych datasetów wspólna dla wszystkich sesji"""
+    return ScoringManager(SCORES_CACHE_DIR, workers=SCORING_WORKERS, chunk_rows=SCORING_CHUNK_ROWS, threads=1, max_files=SCORES_CACHE_FILES)
+
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES + 1)
+def load_scored_dataset(job_key, _df, _scores_path):
+    """Dataset z kolumnami predykcji - łączony raz na dataset i wersję modelu, nie modyfikować"""
+    return with_scores(_df, _scores_path)
+
+@st.fragment(run_every=2)
+def show_scoring_progress(job_key):
+    """Postęp predykcji dla datasetu; po zakończeniu przeładowuje stronę z nowymi kolumnami"""
+    job = get_scoring_manager().job(job_key)
+    if job["state"] in ("queued", "running"):
+        st.progress(job["progress"], text=f"🧮 {job['message']}")
+    else:
+        st.rerun()
+
+@counted_cache(st.cache_resource)
+def get_metrics_server():
+    """Endpoint z metrykami wszystkich sesji - jeden na proces serwera"""
+    return start_metrics_server(port=METRICS_PORT) if METRICS_PORT else None
+
+def show_debug_panel():
+    """Czasy sekcji bieżącego uruchomienia i trafienia cache (wszystkie sesje) w panelu bocznym"""
+    with st.sidebar.expander("🐞 Panel diagnostyczny", expanded=True):
+        spans = pd.DataFrame(run_spans(), columns=["sekcja", "czas [ms]", "CPU [ms]", "wzrost szczytowego RSS procesu [MiB]"])
+        spans["czas [ms]"] *= 1000
+        spans["CPU [ms]"] *= 1000
+        spans["wzrost szczytowego RSS procesu [MiB]"] /= 1024**2
+        st.write(f"**To uruchomienie:** {spans['czas [ms]'].sum():.0f} ms w mierzonych sekcjach")
+        st.dataframe(spans.round(1), hide_index=True, use_container_width=True)
+        st.caption("Pamięć: o ile w czasie sekcji wzrósł szczyt RSS całego procesu (wszystkie sesje) - po rozgrzaniu zwykle 0.")
+
+        caches = pd.DataFrame.from_dict(REGISTRY.snapshot()["caches"], orient="index")
+        if not caches.empty:
+            st.write("**Cache (wszystkie sesje)**")
+            st.dataframe(caches[["calls", "hits", "misses"]], use_container_width=True)
+        store = session_store()
+        st.write(
+            f"**Pamięć tej sesji:** {store.size_bytes / 1024**2:.1f} / {store.budget_bytes / 1024**2:.0f} MiB, "
+            f"{len(store)} wpisów, {store.hits} trafień / {store.misses} chybień, usunięto {store.evictions}"
+        )
+        if metrics_server is not None:
+            st.caption(f"Metryki: http://127.0.0.1:{METRICS_PORT}/metrics (Prometheus), /metrics.json")
+
+def session_store():
+    """Dane pochodne bieżącej sesji z limitem SESSION_MEMORY_BUDGET"""
+    if "session_store" not in st.session_state:
+        st.session_state["session_store"] = SessionStore(SESSION_MEMORY_BUDGET)
+    return st.session_state["session_store"]
+
+@counted_cache(st.cache_resource)
+def get_prediction_cache():
+    """Cache predykcji wspólny dla wszystkich sesji"""
+    return PredictionCache(max_size=PREDICTION_CACHE_SIZE, path=PREDICTION_CACHE_PATH)
+
 # --- CACHE DATA ---
-@st.cache_data
+def on_disk(size_bytes):
+    """Czy plik CSV tej wielkości odpytywać z dysku zamiast wczytywać do pamięci"""
+    return ON_DISK_MIN_BYTES is not None and size_bytes > ON_DISK_MIN_BYTES
+
 def load_data():
     try:
-        df = pd.read_csv("housing.csv")
-        return df
+        if on_disk(os.path.getsize(DATA_PATH)):
+            return open_on_disk(file_fingerprint(DATA_PATH), DATA_PATH, DATA_CACHE_DIR)
+        return load_housing(file_fingerprint(DATA_PATH))
     except:
         return None
 
-@st.cache_data
-def calculate_stats(df):
-    """Obliczenia statystyk na całym datasecie"""
-    return {
-        'total_records': len(df),
-        'avg_price': df['median_house_value'].mean(),
-        'median_price': df['median_house_value'].median(),
-        'avg_rooms': df['total_rooms'].mean(),
-        'avg_income': df['median_income'].mean()
-    }
+@counted_cache(st.cache_resource, max_entries=2)
+def load_housing(fingerprint):
+    """Wczytanie housing.csv z kopii Arrow (fingerprint unieważnia cache po zmianie pliku) - jedna ramka dla wszystkich sesji, nie modyfikować"""
+    return load_columnar(DATA_PATH, DATA_CACHE_DIR)
 
-# --- TABS ---
-tab1, tab2, tab3 = st.tabs(["🏠 Strona Główna", "🗺️ Mapa Wizualizacji", "📊 Statystyki i Analiza"])
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES, show_spinner="Wczytywanie pliku CSV...")
+def load_upload(file_hash, _uploaded_file):
+    """Wczytanie uploadu raz na zawartość pliku - ramka współdzielona między sesjami, nie modyfikować"""
+    return ingest_csv(
+        _uploaded_file,
+        chunk_rows=UPLOAD_CHUNK_ROWS,
+        max_rows=UPLOAD_MAX_ROWS,
+        max_bytes=UPLOAD_MAX_BYTES,
+    )
 
-# ============================================================================
-# TAB 1: STRONA GŁÓWNA (main.py)
-# ============================================================================
-with tab1:
-    st.title("🏠 California Housing Price Prediction Project")
-    st.markdown("""
-    Witamy w aplikacji do eksploracji i analizy **cen nieruchomości w Kalifornii**.
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES + 1, show_spinner="Przygotowanie kopii Parquet do zapytań z dysku...")
+def open_on_disk(fingerprint, csv_path, cache_dir):
+    """Dataset odpytywany z dysku przez kopię Parquet - do pamięci trafiają tylko wyniki zapytań; wspólny dla sesji"""
+    return OnDiskDataset(convert_to_parquet(csv_path, cache_dir))
 
-    Ta aplikacja pozwala na:
-    - 🔎 interaktywną **wizualizację danych na mapie**,  
-    - 📊 szczegółową **analizę statystyczną**,  
-    - 🤖 trenowanie i testowanie **modelu predykcyjnego cen nieruchomości**,  
-    - 📁 wgrywanie własnych zbiorów danych do analizy.
+def spool_upload(file_hash, uploaded_file):
+    """Kopia uploadu na dysku (raz na zawartość pliku); najdawniej używane kopie są usuwane"""
+    path = os.path.join(UPLOAD_SPOOL_DIR, f"{file_hash}.csv")
+    if os.path.exists(path):
+        os.utime(path)  # używana - nie usuwać przy przycinaniu katalogu
+    else:
+        save_upload(uploaded_file, path)
+        prune_files(UPLOAD_SPOOL_DIR, UPLOAD_SPOOL_FILES)
+    return path
 
-    Przejdź do wybranej sekcji używając zakładek powyżej.
-    """)
+def upload_hash(uploaded_file):
+    """Hash zawartości uploadu, liczony tylko raz dla danego pliku"""
+    cached = st.session_state.get("upload_hash")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = (uploaded_file.file_id, content_hash(uploaded_file))
+        st.session_state["upload_hash"] = cached
+    return cached[1]
 
-    st.divider()
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES + 1)
+def get_filter_index(fingerprint, _df):
+    """Indeksy filtrów mapy - budowane raz na dataset, wspólne dla wszystkich sesji"""
+    return FilterIndex(_df)
 
-    # --- SEKCJA 1: Szybki opis datasetu z Kaggle ---
-    st.header("📁 O projekcie i danych")
-    st.write("""
-    Projekt wykorzystuje popularny zbiór danych 
-    **California Housing Prices** pochodzący z serwisu Kaggle.
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES + 1, show_spinner=False)
+def get_spatial_index(fingerprint, _df):
+    """KD-drzewo współrzędnych datasetu - budowane raz na dataset, wspólne dla wszystkich sesji"""
+    return SpatialIndex(_df["longitude"], _df["latitude"])
 
-    Zawiera on informacje o:
-    - 🌆 lokalizacji (geograficznej)  
-    - 👨‍👩‍👧‍👦 populacji  
-    - 🏡 liczbie pokoi i gospodarstw  
-    - 💰 medianowych dochodach  
-    - 🏠 medianowych cenach nieruchomości  
+@counted_cache(st.cache_data, max_entries=8)
+def calculate_stats(fingerprint, _df):
+    """Obliczenia statystyk na całym datasecie - raz na fingerprint datasetu"""
+    if isinstance(_df, OnDiskDataset):
+        return _df.aggregates()
+    return compute_aggregates(_df)
 
-    Celem projektu jest **eksploracja danych** oraz **budowa modelu predykcji cen domów**.
-    """)
+@counted_cache(st.cache_resource, max_entries=UPLOAD_CACHE_ENTRIES, show_spinner="Liczenie statystyk całego pliku...")
+def calculate_streaming_stats(file_hash, _uploaded_file):
+    """Statystyki całego wgranego pliku w jednym przebiegu kawałkami, bez wczytywania go do pamięci - raz na zawartość pliku"""
+    # Kopia tylko na czas liczenia; nazwa z kropką - przycinanie UPLOAD_SPOOL_DIR jej nie liczy i nie usuwa
+    path = os.path.join(UPLOAD_SPOOL_DIR, f".{file_hash}.stats.csv")
+    save_upload(_uploaded_file, path)
+    try:
+        return stream_csv_stats(path, workers=STATS_WORKERS, chunk_bytes=STATS_CHUNK_BYTES)
+    finally:
+        os.remove(path)
 
-    st.divider()
+@counted_cache(st.cache_resource, max_entries=64)
+def scatter_sample(fingerprint, columns, max_points, _df):
+    """Próbka wierszy do wykresu punktowego - raz na dataset i zestaw kolumn, wspólna dla sesji, nie modyfikować"""
+    if isinstance(_df, OnDiskDataset):
+        return _df.sample(columns, max_points)
+    x, y = columns[:2]
+    rows = downsample_scatter(_df[x], _df[y], max_points=max_points)
+    return _df[list(columns)].iloc[rows]
 
-    # --- SEKCJA 2: Trzy duże boxy z opisami ---
-    st.subheader("🔍 Główne sekcje aplikacji")
-    col1, col2, col3 = st.columns(3)
+@counted_cache(st.cache_resource, max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def cached_figure(key, _build):
+    """Figura Plotly (albo krotka z figurą) z `_build()` - raz na klucz: odcisk datasetu + wszystkie parametry wykresu; wspólna dla sesji, nie modyfikować"""
+    return _build()
 
-    with col1:
-        st.info("### 🗺️ Mapa wizualizacji\nInteraktywna mapa z filtrami, wyborem kolumn i wykresami.")
+def is_numeric_column(df, col):
+    """Czy kolumna ramki albo datasetu na dysku jest liczbowa"""
+    if isinstance(df, OnDiskDataset):
+        return col in df.numeric_columns
+    return pd.api.types.is_numeric_dtype(df[col])
 
-    with col2:
-        st.info("### 📊 Statystyki i Analiza\nHistogramy, korelacje, wykresy zależności i kluczowe metryki.")
+def filtered_frame(filter_index, dataset_key, active_filters, columns):
+    """Wybrane kolumny przefiltrowanego datasetu - bez filtrów widok bez kopii, z filtrami kopia w pamięci sesji"""
+    if isinstance(filter_index, OnDiskDataset):
+        # Z dysku najwyżej ON_DISK_MAX_POINTS pierwszych wierszy - zawsze kopia w pamięci sesji
+        key = ("filtered", dataset_key, FilterIndex.key(active_filters), tuple(columns))
+        return session_store().get_or_create(key, lambda: filter_index.select(active_filters, columns, limit=ON_DISK_MAX_POINTS))
+    if not active_filters:
+        return filter_index.apply(active_filters, columns)
+    key = ("filtered", dataset_key, FilterIndex.key(active_filters), tuple(columns))
+    return session_store().get_or_create(key, lambda: filter_index.apply(active_filters, columns))
 
+@st.fragment
+def paged_table(df, dataset_key, key):
+    """Tabela stronicowana po stronie serwera - sortowanie i filtr na wspólnym indeksie, do przeglądarki idzie tylko strona"""
+    # Dataset na dysku sam filtruje i stronicuje (te same metody co FilterIndex)
+    filter_index = df if isinstance(df, OnDiskDataset) else get_filter_index(dataset_key, df)
+    columns = list(df.columns)
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 3])
+    with col1:
+        sort_col = st.selectbox("Sortuj według", options=[None] + columns, format_func=lambda c: "(kolejność pliku)" if c is None else c, key=f"{key}_sort")
+    with col2:
+        descending = st.toggle("Malejąco", key=f"{key}_desc", disabled=sort_col is None)
     with col3:
-        st.info("### 🤖 Predykcja (w przyszłości)\nStrona na model ML do przewidywania cen mieszkań.")
+        filter_col = st.selectbox("Filtruj kolumnę", options=[None] + columns, format_func=lambda c: "(bez filtra)" if c is None else c, key=f"{key}_filter_col")
+    active_filters = {}
+    with col4:
+        if filter_col is not None and is_numeric_column(df, filter_col):
+            min_val, max_val = filter_index.value_range(filter_col)
+            if min_val < max_val:
+                value_range = st.slider(f"Zakres {filter_col}", min_value=min_val, max_value=max_val, value=(min_val, max_val), key=f"{key}_range_{filter_col}")
+                if value_range != (min_val, max_val):
+                    active_filters[filter_col] = value_range
+        elif filter_col is not None:
+            unique_vals = filter_index.categories(filter_col)
+            selected_vals = st.multiselect(f"Wartości {filter_col}", options=unique_vals, default=unique_vals, key=f"{key}_values_{filter_col}")
+            if len(selected_vals) != len(unique_vals):
+                active_filters[filter_col] = selected_vals
 
-    st.divider()
+    page_col, size_col = st.columns([3, 1])
+    with size_col:
+        page_size = st.selectbox("Wierszy na stronę", options=TABLE_PAGE_SIZES, key=f"{key}_page_size")
+    # Liczba stron zależy od filtra - numer strony poza zakresem wraca na ostatnią
+    n_rows = filter_index.count(active_filters)
+    sort_limited = isinstance(df, OnDiskDataset) and sort_col is not None and n_rows > ON_DISK_SORT_MAX_ROWS
+    n_pages = max(1, -(-min(n_rows, ON_DISK_SORT_MAX_ROWS if sort_limited else n_rows) // page_size))
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    with page_col:
+        page = st.number_input(f"Strona (z {n_pages:,})", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
 
-    # --- SEKCJA 3: Szybki preview datasetu (opcjonalny) ---
-    st.header("📌 Podgląd wbudowanego datasetu")
+    with span(f"table:{key}_page"):
+        start = (page - 1) * page_size
+        rows, n_rows = filter_index.page(active_filters, start, start + page_size, sort_col=sort_col, descending=descending)
+        # Dataset na dysku zwraca od razu ramkę ze stroną
+        st.dataframe(rows if isinstance(df, OnDiskDataset) else df.take(rows), use_container_width=True)
+    st.caption(
+        f"Wiersze {min(start + 1, n_rows):,}–{start + len(rows):,} z {n_rows:,}" + (f" (po filtrze, z {len(df):,})" if active_filters else "")
+        + (f" · posortowany podgląd datasetu na dysku obejmuje pierwsze {ON_DISK_SORT_MAX_ROWS:,} wierszy" if sort_limited else "")
+    )
 
-    df = load_data()
-    if df is not None:
-        st.write(f"Wczytano dane: **{df.shape[0]} rekordów, {df.shape[1]} kolumn**")
-        st.dataframe(df.head(), use_container_width=True)
-    else:
-        st.warning("Nie znaleziono pliku *housing.csv*. Upewnij się, że znajduje się w folderze projektu lub wgraj własny plik w zakładce 'Mapa Wizualizacji'.")
+def show_scatter(df, fingerprint, max_points, x, y, color=None, **kwargs):
+    """Wykres punktowy WebGL z próbki zachowującej gęstość i odstające punkty"""
+    columns = (x, y, color) if color else (x, y)
+    if isinstance(df, OnDiskDataset) and max_points == "wszystkie":
+        max_points = ON_DISK_MAX_POINTS
+
+    def build():
+        with span("stats:scatter_sample"):
+            if max_points != "wszystkie" and len(df) > max_points:
+                plot_df = scatter_sample(fingerprint, columns, max_points, df)
+            elif isinstance(df, OnDiskDataset):
+                plot_df = df.select(None, columns)  # mieści się w limicie - wszystkie wiersze z dysku
+            else:
+                plot_df = df[list(columns)]
+        return px.scatter(plot_df, x=x, y=y, color=color, render_mode="webgl", **kwargs), len(plot_df)
+
+    with span(f"chart:scatter_{x}"):
+        fig, n_points = cached_figure(("scatter", fingerprint, columns, max_points, kwargs), build)
+        st.plotly_chart(fig, use_container_width=True)
+    if n_points < len(df):
+        st.caption(f"Pokazano {n_points:,} z {len(df):,} punktów (próbka zachowująca rozkład i punkty odstające)")
+
+def price_histogram_figure(price_hist):
+    """Histogram cen z policzonych liczności przedziałów"""
+    fig_price = px.bar(
+        price_hist,
+        x='bin_center',
+        y='count',
+        title="Rozkład cen domów",
+        labels={'bin_center': 'Cena domu ($)', 'count': 'Liczba nieruchomości'}
+    )
+    fig_price.update_traces(width=price_hist['bin_right'] - price_hist['bin_left'])
+    fig_price.update_layout(bargap=0)
+    return fig_price
+
+def age_box_figure(age_box):
+    """Pudełka cen w grupach wieku z policzonych kwartyli"""
+    fig_age = go.Figure(go.Box(
+        x=age_box['group'],
+        q1=age_box['q1'],
+        median=age_box['median'],
+        q3=age_box['q3'],
+        lowerfence=age_box['lowerfence'],
+        upperfence=age_box['upperfence'],
+    ))
+    fig_age.update_layout(
+        title="Cena w Zależności od Wieku",
+        xaxis_title="Wiek domu",
+        yaxis_title="Cena domu ($)"
+    )
+    return fig_age
+
+def correlation_figure(corr_table):
+    """Mapa ciepła macierzy korelacji"""
+    return px.imshow(corr_table,
+                     title="Macierz Korelacji",
+                     labels=dict(color="Korelacja"),
+                     color_continuous_scale='RdBu',
+                     zmin=-1, zmax=1)
+
+def top_correlations_figure(corr_table):
+    """10 cech najmocniej skorelowanych z ceną"""
+    price_corr = corr_table['median_house_value'].sort_values(ascending=False)[1:11]
+    return px.bar(price_corr, title="Top 10 Cech Skorelowanych z Ceną",
+                  labels={'value': 'Korelacja', 'index': 'Cecha'})
+
+@st.fragment
+def manual_entry(predictor, model_path, reference_df=None, reference_key=None):
+    """Ręczne punkty i ich predykcje, obok porównywalne bloki z `reference_df` - zmiana pola przelicza tylko ten fragment"""
+    st.subheader("✍️ Ręczne wprowadzanie danych")
+    num_points = st.number_input("Ile punktów chcesz dodać?", min_value=1, max_value=20, value=1, key="num_points")
+
+    manual_data = []
+    for i in range(num_points):
+        st.markdown(f"**Punkt {i+1}**")
+        col1, col2 = st.columns(2)
+        with col1:
+            lon = st.slider(f"Longitude {i+1}", min_value=-180.0, max_value=180.0, value=-120.0, step=0.1, key=f"lon_{i}", help="Kalifornia: -124.5 do -114.0")
+            lat = st.slider(f"Latitude {i+1}", min_value=-90.0, max_value=90.0, value=37.0, step=0.1, key=f"lat_{i}", help="Kalifornia: 32.5 do 42.0")
+            housing_median_age = st.number_input(f"Housing Median Age {i+1}", value=20.0, key=f"age_{i}")
+            total_rooms = st.number_input(f"Total Rooms {i+1}", value=1000.0, key=f"rooms_{i}")
+        with col2:
+            total_bedrooms = st.number_input(f"Total Bedrooms {i+1}", value=200.0, key=f"bedrooms_{i}")
+            population = st.number_input(f"Population {i+1}", value=500.0, key=f"pop_{i}")
+            households = st.number_input(f"Households {i+1}", value=150.0, key=f"households_{i}")
+            median_income = st.number_input(f"Median Income {i+1}", value=3.0, key=f"income_{i}")
+
+        # Ocean proximity - wymagane przez model
+        ocean_proximity = st.selectbox(
+            f"Ocean Proximity {i+1}",
+            options=OCEAN_PROXIMITY_VALUES,
+            index=2,  # domyślnie INLAND
+            key=f"ocean_{i}"
+        )
+
+        # Cechy punktu - predykcja dopiero po zebraniu wszystkich punktów
+        prediction_data = {
+            "longitude": lon,
+            "latitude": lat,
+            "housing_median_age": housing_median_age,
+            "total_rooms": total_rooms,
+            "total_bedrooms": total_bedrooms,
+            "population": population,
+            "households": households,
+            "median_income": median_income,
+            "ocean_proximity": ocean_proximity
+        }
+        manual_data.append(prediction_data)
+
+    df_map = pd.DataFrame(manual_data)
 
+    # Predykcja cen z użyciem modelu AutoGluon - jedno wywołanie dla wszystkich punktów
+    predict_start = time.perf_counter()
+    with span("prediction"):
+        predicted_prices, prediction_errors = predict_prices(
+            predictor, df_map, cache=get_prediction_cache(), version=model_version(model_path)
+        )
+    predict_time = time.perf_counter() - predict_start
+    df_map["predicted_price"] = predicted_prices
+
+    # Pokazanie przewidywanej ceny
     st.divider()
+    st.subheader("📊 Predykcje modelu")
 
-    # --- FOOTER ---
-    st.markdown("""
-    ### 🧑‍💻 Autorzy projektu  
-    Anna Woźniak, Mikołaj Wróblewski, Daniil Ihnatiuhin
-    """)
+    # Porównywalne bloki: najbliżsi sąsiedzi każdego punktu z indeksu przestrzennego datasetu
+    comparables = [None] * len(df_map)
+    if reference_df is not None:
+        col1, col2 = st.columns(2)
+        with col1:
+            k = st.slider("Liczba porównywalnych bloków", min_value=1, max_value=20, value=COMPARABLES_K, key="comparables_k")
+        with col2:
+            radius_km = st.number_input("Promień szukania [km] (0 = bez limitu)", min_value=0.0, value=COMPARABLES_RADIUS_KM, step=1.0, key="comparables_radius")
+        with span("comparables"):
+            spatial_index = get_spatial_index(reference_key, reference_df)
+            rows, distances = spatial_index.nearest(df_map["longitude"], df_map["latitude"], k=k, max_km=radius_km or None)
+            columns = [c for c in COMPARABLE_COLUMNS if c in reference_df.columns]
+            for i in range(len(df_map)):
+                found = rows[i] >= 0
+                comparable = pd.DataFrame({c: reference_df[c].take(rows[i][found]).to_numpy() for c in columns})
+                comparable.insert(0, "distance_km", distances[i][found].round(2))
+                comparables[i] = comparable
+            in_radius = spatial_index.count_within(df_map["longitude"], df_map["latitude"], radius_km) if radius_km else None
 
-# ============================================================================
-# TAB 2: MAPA WIZUALIZACJI (map.py)
-# ============================================================================
-with tab2:
-    st.title("🗺️ Mapa Wizualizacji")
-    st.markdown("""
-    Upload your housing dataset (CSV format) and explore housing prices on an interactive map.
-    Select columns for location and price, enable filters, and customize what's shown on the map.
-    """)
-
-    # Sidebar for controls
-    st.sidebar.header("Controls")
-    
-    # Wybór źródła danych - radio buttons zamiast checkboxów
-    data_source = st.sidebar.radio(
-        "Wybierz źródło danych:",
-        options=["builtin", "upload", "manual"],
-        format_func=lambda x: {
-            "builtin": "🗂️ Użyj wbudowanego datasetu (housing.csv)",
-            "upload": "📤 Wgraj własny plik CSV",
-            "manual": "✍️ Wprowadź własne dane ręcznie"
-        }[x],
-        index=0
+    prediction_cache = get_prediction_cache()
+    st.caption(
+        f"⏱️ Czas predykcji: {predict_time * 1000:.1f} ms dla {len(df_map)} punktów · "
+        f"cache predykcji: {len(prediction_cache)} wpisów, {prediction_cache.hits} trafień / {prediction_cache.misses} chybień"
     )
-    
-    # File uploader (pokazuj tylko gdy wybrano upload)
-    uploaded_file = None
-    if data_source == "upload":
-        uploaded_file = st.sidebar.file_uploader(
-            "Upload CSV file",
-            type=["csv"],
-            help="Upload a CSV file containing housing data"
+    for i, row in df_map.iterrows():
+        if prediction_errors[i]:
+            st.warning(prediction_errors[i])
+        if predictor is not None:
+            st.success(f"🏠 Punkt {i+1}: Przewidywana cena domu: **${row['predicted_price']:,.0f}**")
+        else:
+            st.info(f"🏠 Punkt {i+1}: Szacowana cena (placeholder): **${row['predicted_price']:,.0f}**")
+        comparable = comparables[i]
+        if comparable is None:
+            continue
+        if comparable.empty:
+            st.caption(f"Brak bloków z datasetu w promieniu {radius_km:g} km")
+            continue
+        caption = (
+            f"Porównywalne bloki: {len(comparable)} najbliższych (do {comparable['distance_km'].max():.1f} km), "
+            f"mediana rzeczywistej ceny **${comparable['median_house_value'].median():,.0f}**"
         )
+        if in_radius is not None:
+            caption += f" · {int(in_radius[i]):,} bloków w promieniu {radius_km:g} km"
+        st.caption(caption)
+        with st.expander(f"Porównywalne bloki dla punktu {i+1}"):
+            st.dataframe(comparable, hide_index=True, use_container_width=True)
+
+    # Wizualizacja punktów na mapie
+    fig_pred = px.scatter_mapbox(
+        df_map,
+        lat="latitude",
+        lon="longitude",
+        color="predicted_price",
+        zoom=6,
+        mapbox_style="open-street-map",
+        title="Predykcja cen domów" + (" (AutoGluon)" if predictor else " (placeholder)"),
+        hover_data=df_map.columns
+    )
+    found = [c for c in comparables if c is not None and not c.empty]
+    if found:
+        nearby = pd.concat(found, ignore_index=True)
+        fig_pred.add_trace(go.Scattermapbox(
+            lat=nearby["latitude"],
+            lon=nearby["longitude"],
+            mode="markers",
+            marker=dict(size=7, color="grey", opacity=0.6),
+            name="Porównywalne bloki",
+            customdata=nearby[["median_house_value", "distance_km"]],
+            hovertemplate="Rzeczywista cena: $%{customdata[0]:,.0f}<br>Odległość: %{customdata[1]:.2f} km<extra></extra>",
+        ))
+    with span("chart:prediction_map"):
+        st.plotly_chart(fig_pred, use_container_width=True)
+
+@st.fragment
+def map_explorer(df_map, dataset_key):
+    """Wybór kolumn, filtry i mapa - interakcje przeliczają tylko ten fragment"""
+    try:
+        # Column selection
+        is_on_disk = isinstance(df_map, OnDiskDataset)
+        numeric_columns = df_map.numeric_columns if is_on_disk else df_map.select_dtypes(include=['number']).columns.tolist()
+        all_columns = list(df_map.columns)
+
+        if not numeric_columns:
+            st.error("No numeric columns found in the dataset.")
+        else:
+            st.subheader("Column Selection")
+            col1, col2, col3 = st.columns(3)
 
-    df_map = None
-    predictor = load_pretrained_model()
-    
-    if data_source == "builtin":
-        df_map = load_data()
-        if df_map is None:
-            st.error("Nie można wczytać pliku housing.csv")
-        elif predictor is not None:
-            st.success("✅ Użyto wbudowanego datasetu z przedtrenowanym modelem AutoGluon")
-            
-    elif data_source == "upload" and uploaded_file is not None:
-        try:
-            df_map = pd.read_csv(uploaded_file)
-            st.success(f"Wczytano plik z {df_map.shape[0]} rekordami")
-            
-            # Sprawdź czy można dokonać refit
-            if predictor is not None:
-                if 'median_house_value' in df_map.columns:
-                    st.info("🔄 Znaleziono kolumnę 'median_house_value' - możliwe doszkolenie modelu (refit)")
-                    if st.button("🚀 Doszkolij model na nowych danych"):
-                        progress_bar = st.progress(0, text="Inicjalizacja refit...")
-                        try:
-                            progress_bar.progress(20, text="Przygotowywanie danych...")
-                            progress_bar.progress(50, text="Doszkalanie modelu (może potrwać kilka minut)...")
-                            predictor.refit_full(df_map)
-                            progress_bar.progress(100, text="Zakończono!")
-                            st.success("✅ Model został doszkolony na nowych danych!")
-                        except Exception as e:
-                            st.error(f"Błąd podczas refit: {str(e)}")
-                        finally:
-                            progress_bar.empty()
-                else:
-                    st.warning("⚠️ Brak kolumny 'median_house_value' w danych. Model będzie używany tylko do predykcji bez doszkolenia.")
-        except Exception as e:
-            st.error(f"Error loading file: {str(e)}")
-            
-    elif data_source == "manual":
-        st.subheader("✍️ Ręczne wprowadzanie danych")
-        num_points = st.number_input("Ile punktów chcesz dodać?", min_value=1, max_value=20, value=1)
-
-        manual_data = []
-        for i in range(num_points):
-            st.markdown(f"**Punkt {i+1}**")
-            col1, col2 = st.columns(2)
             with col1:
-                lon = st.slider(f"Longitude {i+1}", min_value=-180, max_value=180, value=-120.0, step=0.1, key=f"lon_{i}", help="Kalifornia: -124.5 do -114.0")
-                lat = st.slider(f"Latitude {i+1}", min_value=-90, max_value=90, value=37.0, step=0.1, key=f"lat_{i}", help="Kalifornia: 32.5 do 42.0")
-                housing_median_age = st.number_input(f"Housing Median Age {i+1}", value=20.0, key=f"age_{i}")
-                total_rooms = st.number_input(f"Total Rooms {i+1}", value=1000.0, key=f"rooms_{i}")
+                longitude_col = st.selectbox(
+                    "Select Longitude Column",
+                    options=numeric_columns,
+                    index=min(0, len(numeric_columns)-1),
+                    help="Column containing longitude values"
+                )
+
             with col2:
-                total_bedrooms = st.number_input(f"Total Bedrooms {i+1}", value=200.0, key=f"bedrooms_{i}")
-                population = st.number_input(f"Population {i+1}", value=500.0, key=f"pop_{i}")
-                households = st.number_input(f"Households {i+1}", value=150.0, key=f"households_{i}")
-                median_income = st.number_input(f"Median Income {i+1}", value=3.0, key=f"income_{i}")
-            
-            # Ocean proximity - wymagane przez model
-            ocean_proximity = st.selectbox(
-                f"Ocean Proximity {i+1}",
-                options=["NEAR BAY", "<1H OCEAN", "INLAND", "NEAR OCEAN", "ISLAND"],
-                index=2,  # domyślnie INLAND
-                key=f"ocean_{i}"
-            )
-            
-            # Predykcja ceny z użyciem modelu AutoGluon
-            prediction_data = {
-                "longitude": lon,
-                "latitude": lat,
-                "housing_median_age": housing_median_age,
-                "total_rooms": total_rooms,
-                "total_bedrooms": total_bedrooms,
-                "population": population,
-                "households": households,
-                "median_income": median_income,
-                "ocean_proximity": ocean_proximity
-            }
-            
-            if predictor is not None:
-                try:
-                    prediction_df = pd.DataFrame([prediction_data])
-                    predicted_price = predictor.predict(prediction_df).iloc[0]
-                except Exception as e:
-                    st.warning(f"Błąd predykcji: {e}. Używam wartości domyślnej.")
-                    predicted_price = 200000.0
-            else:
-                predicted_price = 200000.0  # fallback
-                st.warning("Model nie jest dostępny. Używam wartości domyślnej.")
-            
-            prediction_data["predicted_price"] = predicted_price
-            manual_data.append(prediction_data)
+                latitude_col = st.selectbox(
+                    "Select Latitude Column",
+                    options=numeric_columns,
+                    index=min(1, len(numeric_columns)-1) if len(numeric_columns) > 1 else min(0, len(numeric_columns)-1),
+                    help="Column containing latitude values"
+                )
 
-        df_map = pd.DataFrame(manual_data)
+            with col3:
+                price_col = st.selectbox(
+                    "Select Price Column",
+                    options=numeric_columns,
+                    index=min(2, len(numeric_columns)-1) if len(numeric_columns) > 2 else -1,
+                    help="Column containing housing price values"
+                )
 
-        # Pokazanie przewidywanej ceny
-        st.divider()
-        st.subheader("📊 Predykcje modelu")
-        for i, row in df_map.iterrows():
-            if predictor is not None:
-                st.success(f"🏠 Punkt {i+1}: Przewidywana cena domu: **${row['predicted_price']:,.0f}**")
-            else:
-                st.info(f"🏠 Punkt {i+1}: Szacowana cena (placeholder): **${row['predicted_price']:,.0f}**")
-
-        # Wizualizacja punktów na mapie
-        fig_pred = px.scatter_mapbox(
-            df_map,
-            lat="latitude",
-            lon="longitude",
-            color="predicted_price",
-            zoom=6,
-            mapbox_style="open-street-map",
-            title="Predykcja cen domów" + (" (AutoGluon)" if predictor else " (placeholder)"),
-            hover_data=df_map.columns
-        )
-        st.plotly_chart(fig_pred, use_container_width=True)
+            # Filter controls
+            st.subheader("Filters")
+            available_filters = [col for col in df_map.columns if col not in [longitude_col, latitude_col, price_col]]
 
-    # --- Jeśli dane pochodzą z pliku lub wbudowanego datasetu ---
-    if df_map is not None and data_source != "manual":
-        try:
-            st.success(f"Successfully loaded dataset with {df_map.shape[0]} rows and {df_map.shape[1]} columns.")
-            
-            # Display basic info about the dataset
-            st.subheader("Dataset Overview")
-            st.write(f"**Shape:** {df_map.shape}")
-            st.write("**First few rows:**")
-            st.dataframe(df_map.head())
-            
-            # Column selection
-            numeric_columns = df_map.select_dtypes(include=['number']).columns.tolist()
-            all_columns = df_map.columns.tolist()
-            
-            if not numeric_columns:
-                st.error("No numeric columns found in the dataset.")
-            else:
-                st.subheader("Column Selection")
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    longitude_col = st.selectbox(
-                        "Select Longitude Column",
-                        options=numeric_columns,
-                        index=min(0, len(numeric_columns)-1),
-                        help="Column containing longitude values"
-                    )
-                    
-                with col2:
-                    latitude_col = st.selectbox(
-                        "Select Latitude Column",
-                        options=numeric_columns,
-                        index=min(1, len(numeric_columns)-1) if len(numeric_columns) > 1 else min(0, len(numeric_columns)-1),
-                        help="Column containing latitude values"
+            selected_filters = st.multiselect(
+                "Select columns to use for filtering:",
+                options=available_filters,
+                default=None,
+                key="filter_columns"
+            )
+
+            # On-disk datasets push the same filters down to the Parquet scan
+            filter_index = df_map if is_on_disk else get_filter_index(dataset_key, df_map)
+            active_filters = {}
+            for col in selected_filters:
+                if is_numeric_column(df_map, col):
+                    min_val, max_val = filter_index.value_range(col)
+                    default_range = (min_val, max_val)
+                    filter_range = st.slider(
+                        f"Filter by {col}",
+                        min_value=min_val,
+                        max_value=max_val,
+                        value=default_range,
+                        key=f"filter_{col}"
                     )
-                    
-                with col3:
-                    price_col = st.selectbox(
-                        "Select Price Column",
-                        options=numeric_columns,
-                        index=min(2, len(numeric_columns)-1) if len(numeric_columns) > 2 else -1,
-                        help="Column containing housing price values"
+                    if filter_range != (min_val, max_val):
+                        active_filters[col] = filter_range
+                else:
+                    unique_vals = filter_index.categories(col)
+                    selected_vals = st.multiselect(
+                        f"Filter by {col}",
+                        options=unique_vals,
+                        default=unique_vals,
+                        key=f"filter_{col}_multi"
                     )
-                
-                # Filter controls
-                st.subheader("Filters")
-                available_filters = [col for col in df_map.columns if col not in [longitude_col, latitude_col, price_col]]
-                
-                selected_filters = st.multiselect(
-                    "Select columns to use for filtering:",
-                    options=available_filters,
-                    default=None
+                    if len(selected_vals) != len(unique_vals):
+                        active_filters[col] = selected_vals
+
+            # Matching rows counted from cached per-filter bitmaps (or a Parquet scan); rows are copied later, only for the columns the map uses
+            with span("filters"):
+                n_filtered = filter_index.count(active_filters)
+
+            st.write(f"Filtered dataset: {n_filtered} rows (out of {df_map.shape[0]} total)")
+
+            # Map visualization
+            if longitude_col in df_map.columns and latitude_col in df_map.columns:
+                st.subheader("Map Visualization")
+
+                # Allow user to select which columns to show on the map
+                map_columns = st.multiselect(
+                    "Select columns to display on map hover:",
+                    options=all_columns,
+                    default=[longitude_col, latitude_col, price_col] if price_col else [longitude_col, latitude_col]
                 )
-                
-                active_filters = {}
-                for col in selected_filters:
-                    col_type = df_map[col].dtype
-                    if pd.api.types.is_numeric_dtype(col_type):
-                        min_val = float(df_map[col].min())
-                        max_val = float(df_map[col].max())
-                        default_range = (min_val, max_val)
-                        filter_range = st.slider(
-                            f"Filter by {col}",
-                            min_value=min_val,
-                            max_value=max_val,
-                            value=default_range,
-                            key=f"filter_{col}"
-                        )
-                        if filter_range != (min_val, max_val):
-                            active_filters[col] = filter_range
-                    else:
-                        unique_vals = df_map[col].dropna().unique()
-                        selected_vals = st.multiselect(
-                            f"Filter by {col}",
-                            options=unique_vals,
-                            default=unique_vals,
-                            key=f"filter_{col}_multi"
-                        )
-                        if len(selected_vals) != len(unique_vals):
-                            active_filters[col] = selected_vals
-                            
-                filtered_df = df_map.copy()    
-                for col, filter_val in active_filters.items():
-                    if isinstance(filter_val, tuple):  # Numeric range
-                        filtered_df = filtered_df[
-                            (filtered_df[col] >= filter_val[0]) & 
-                            (filtered_df[col] <= filter_val[1])
-                        ]
-                    else:  # Categorical values
-                        filtered_df = filtered_df[filtered_df[col].isin(filter_val)]
-                
-                st.write(f"Filtered dataset: {filtered_df.shape[0]} rows (out of {df_map.shape[0]} total)")
-                
-                # Map visualization
-                if longitude_col in filtered_df.columns and latitude_col in filtered_df.columns:
-                    st.subheader("Map Visualization")
-                    
-                    # Allow user to select which columns to show on the map
-                    map_columns = st.multiselect(
-                        "Select columns to display on map hover:",
-                        options=all_columns,
-                        default=[longitude_col, latitude_col, price_col] if price_col else [longitude_col, latitude_col]
+
+                # Level of detail: raw points for small selections, server-side grid for large ones
+                map_mode = st.radio(
+                    "Map mode:",
+                    options=["auto", "points", "aggregated"],
+                    format_func=lambda x: {
+                        "auto": f"Auto (aggregate above {MAP_MAX_POINTS:,} points)",
+                        "points": "Raw points",
+                        "aggregated": "Aggregated grid"
+                    }[x],
+                    horizontal=True,
+                    key="map_mode"
+                )
+                use_aggregation = map_mode == "aggregated" or (map_mode == "auto" and n_filtered > MAP_MAX_POINTS)
+                has_price = price_col in df_map.columns
+                location_cols = [longitude_col, latitude_col] + ([price_col] if has_price else [])
+
+                cell_metric = "count"
+                if use_aggregation and has_price:
+                    cell_metric = st.radio(
+                        "Color grid cells by:",
+                        options=["mean", "count"],
+                        format_func=lambda x: f"Mean {price_col}" if x == "mean" else "Number of points",
+                        horizontal=True
                     )
-                    
-                    # Create a dataframe with only the selected columns for the map
-                    map_df = filtered_df[map_columns].copy()
-                    # Add the lat/lon columns to the map dataframe if not already included
-                    if longitude_col not in map_df.columns:
-                        map_df[longitude_col] = filtered_df[longitude_col]
-                    if latitude_col not in map_df.columns:
-                        map_df[latitude_col] = filtered_df[latitude_col]
-                    
-                    # Check if required columns exist
-                    if price_col in filtered_df.columns:
-                        # Create map with price as color
+
+                def build_map():
+                    map_start = time.perf_counter()
+                    if use_aggregation:
+                        mean_col = f"mean_{price_col}"
+
+                        def build_grid():
+                            if is_on_disk:
+                                # Two streaming passes over the filtered Parquet columns; only the grid is kept
+                                return df_map.grid(active_filters, longitude_col, latitude_col, price_col if has_price else None,
+                                                   grid_size=MAP_GRID_SIZE, value_name=mean_col)
+                            with span("filters:materialize"):
+                                filtered_df = filtered_frame(filter_index, dataset_key, active_filters, location_cols)
+                            return grid_aggregate(
+                                filtered_df[longitude_col],
+                                filtered_df[latitude_col],
+                                values=filtered_df[price_col] if has_price else None,
+                                grid_size=MAP_GRID_SIZE,
+                                value_name=mean_col
+                            )
+
+                        # The grid is kept per session, so switching the cell color does not re-aggregate
+                        grid_key = ("grid", dataset_key, FilterIndex.key(active_filters), tuple(location_cols), MAP_GRID_SIZE)
+                        grid_df = session_store().get_or_create(grid_key, build_grid)
                         fig = px.scatter_mapbox(
-                            map_df,
-                            lat=latitude_col,
-                            lon=longitude_col,
-                            color=price_col,
+                            grid_df,
+                            lat="latitude",
+                            lon="longitude",
+                            color=mean_col if cell_metric == "mean" else "count",
+                            size="count",
                             color_continuous_scale=px.colors.sequential.Viridis,
                             size_max=15,
                             zoom=10,
                             mapbox_style="open-street-map",
-                            title="Housing Prices Map",
-                            hover_data=[c for c in map_columns if c not in [longitude_col, latitude_col, price_col]]
-                        )
-                        
-                        fig.update_layout(
-                            margin={"r":0,"t":30,"l":0,"b":0},
-                            height=600
+                            title="Housing Prices Map (aggregated)" if has_price else "Housing Locations Map (aggregated)",
+                            hover_data=[c for c in grid_df.columns if c not in ["latitude", "longitude"]]
                         )
-                        
-                        st.plotly_chart(fig, use_container_width=True)
+                        markers = len(grid_df)
                     else:
-                        # Create map without price color if price column not selected
-                        fig = px.scatter_mapbox(
-                            map_df,
-                            lat=latitude_col,
-                            lon=longitude_col,
-                            size_max=15,
-                            zoom=10,
-                            mapbox_style="open-street-map",
-                            title="Housing Locations Map",
-                            hover_data=[c for c in map_columns if c not in [longitude_col, latitude_col]]
-                        )
-                        
-                        fig.update_layout(
-                            margin={"r":0,"t":30,"l":0,"b":0},
-                            height=600
+                        # Only the location, price and hover columns, for the filtered rows (no copy without filters)
+                        with span("filters:materialize"):
+                            map_df = filtered_frame(filter_index, dataset_key, active_filters, location_cols + map_columns)
+
+                        # Check if required columns exist
+                        if has_price:
+                            # Create map with price as color
+                            fig = px.scatter_mapbox(
+                                map_df,
+                                lat=latitude_col,
+                                lon=longitude_col,
+                                color=price_col,
+                                color_continuous_scale=px.colors.sequential.Viridis,
+                                size_max=15,
+                                zoom=10,
+                                mapbox_style="open-street-map",
+                                title="Housing Prices Map",
+                                hover_data=[c for c in map_columns if c not in [longitude_col, latitude_col, price_col]]
+                            )
+                        else:
+                            # Create map without price color if price column not selected
+                            fig = px.scatter_mapbox(
+                                map_df,
+                                lat=latitude_col,
+                                lon=longitude_col,
+                                size_max=15,
+                                zoom=10,
+                                mapbox_style="open-street-map",
+                                title="Housing Locations Map",
+                                hover_data=[c for c in map_columns if c not in [longitude_col, latitude_col]]
+                            )
+                        markers = len(map_df)
+
+                    fig.update_layout(
+                        margin={"r":0,"t":30,"l":0,"b":0},
+                        height=600
+                    )
+                    return fig, markers, time.perf_counter() - map_start
+
+                with span("chart:map_build"):
+                    fetch_start = time.perf_counter()
+                    if use_aggregation or n_filtered <= MAP_MAX_POINTS:
+                        # Shared by all sessions showing the same dataset, columns, filters and mode
+                        figure_key = (
+                            "map", dataset_key, FilterIndex.key(active_filters), longitude_col, latitude_col,
+                            price_col, tuple(map_columns), use_aggregation, cell_metric, MAP_GRID_SIZE
                         )
-                        
-                        st.plotly_chart(fig, use_container_width=True)
-            
+                        fig, markers, build_time = cached_figure(figure_key, build_map)
+                    else:
+                        # Raw points above the limit are too large to keep in the shared cache
+                        fig, markers, build_time = build_map()
+                    fetch_time = time.perf_counter() - fetch_start
+
+                payload = ""
+                if show_debug:
+                    # Serializing costs about as much as building the figure - measured only with the debug panel on
+                    with span("chart:map_serialize"):
+                        serialize_start = time.perf_counter()
+                        payload_kib = len(fig.to_json()) / 1024
+                        payload = f"payload {payload_kib:,.0f} KiB, serialized in {(time.perf_counter() - serialize_start) * 1000:.0f} ms · "
+
+                with span("chart:map_render"):
+                    st.plotly_chart(fig, use_container_width=True)
+                if not use_aggregation and markers < n_filtered:
+                    st.warning(f"The dataset is queried from disk - the map shows the first {markers:,} of {n_filtered:,} matching rows. Use the aggregated grid to see all of them.")
+                st.caption(
+                    f"{'Aggregated grid' if use_aggregation else 'Raw points'}: {markers:,} markers for {n_filtered:,} rows · "
+                    f"{payload}figure built in {build_time * 1000:.0f} ms (this run: {fetch_time * 1000:.0f} ms)"
+                )
+    except Exception as e:
+        st.error(f"Error processing the data: {str(e)}")
+        st.info("Please ensure the uploaded file is a valid CSV with numeric columns for longitude, latitude, and price.")
+
+# Model wczytywany w tle od pierwszego uruchomienia - strona renderuje się bez czekania na niego
+model_warmup = get_model_warmup(active_model_path())
+metrics_server = get_metrics_server()
+
+# --- ŹRÓDŁO DANYCH (wspólne dla zakładek) ---
+# Sidebar for controls
+st.sidebar.header("Controls")
+
+# Wybór źródła danych - radio buttons zamiast checkboxów
+data_source = st.sidebar.radio(
+    "Wybierz źródło danych:",
+    options=["builtin", "upload", "manual"],
+    format_func=lambda x: {
+        "builtin": "🗂️ Użyj wbudowanego datasetu (housing.csv)",
+        "upload": "📤 Wgraj własny plik CSV",
+        "manual": "✍️ Wprowadź własne dane ręcznie"
+    }[x],
+    index=0,
+    key="data_source"
+)
+
+show_debug = st.sidebar.toggle("🐞 Panel diagnostyczny", help="Czasy sekcji tego uruchomienia i statystyki cache")
+
+# File uploader (pokazuj tylko gdy wybrano upload)
+uploaded_file = None
+if data_source == "upload":
+    uploaded_file = st.sidebar.file_uploader(
+        "Upload CSV file",
+        type=["csv"],
+        help="Upload a CSV file containing housing data"
+    )
+
+df_map = None
+dataset_key = None  # fingerprint datasetu - klucz cache indeksów i statystyk
+truncated = False
+load_error = None
+with span("data_load"):
+    if data_source == "builtin":
+        df_map = load_data()
+        if df_map is not None:
+            dataset_key = f"builtin-{file_fingerprint(DATA_PATH)}"
+    elif data_source == "upload" and uploaded_file is not None:
+        try:
+            file_hash = upload_hash(uploaded_file)
+            dataset_key = f"upload-{file_hash}"
+            if on_disk(uploaded_file.size):
+                # Duży plik: kopia na dysku, zapytania do niej zamiast ramki w pamięci - bez obcinania
+                df_map = open_on_disk(file_hash, spool_upload(file_hash, uploaded_file), UPLOAD_SPOOL_DIR)
+            else:
+                df_map, truncated = load_upload(file_hash, uploaded_file)
         except Exception as e:
-            st.error(f"Error processing the data: {str(e)}")
-            st.info("Please ensure the uploaded file is a valid CSV with numeric columns for longitude, latitude, and price.")
-    else:
-        if data_source == "upload" and uploaded_file is None:
-            st.info("📤 Wgraj plik CSV, aby rozpocząć eksplorację danych.")
+            load_error = e
+
+# --- TABS ---
+tab1, tab2, tab3 = st.tabs(["🏠 Strona Główna", "🗺️ Mapa Wizualizacji", "📊 Statystyki i Analiza"], key="active_tab", on_change="rerun")
 
 # ============================================================================
-# TAB 3: STATYSTYKI (statistics.py)
+# TAB 1: STRONA GŁÓWNA (main.py)
 # ============================================================================
-with tab3:
-    st.header("📊 Dane i Statystyki")
+with tab1:
+    # Treść zakładki liczona tylko, gdy jest wybrana
+    if tab1.open:
+        st.title("🏠 California Housing Price Prediction Project")
+        st.markdown("""
+        Witamy w aplikacji do eksploracji i analizy **cen nieruchomości w Kalifornii**.
 
-    df_stats = load_data()
-    
-    if df_stats is None:
-        st.error("Nie można wczytać pliku housing.csv. Upewnij się, że plik znajduje się w folderze projektu.")
-    else:
-        stats = calculate_stats(df_stats)
+        Ta aplikacja pozwala na:
+        - 🔎 interaktywną **wizualizację danych na mapie**,  
+        - 📊 szczegółową **analizę statystyczną**,  
+        - 🤖 trenowanie i testowanie **modelu predykcyjnego cen nieruchomości**,  
+        - 📁 wgrywanie własnych zbiorów danych do analizy.
+
+        Przejdź do wybranej sekcji używając zakładek powyżej.
+        """)
+
+        st.divider()
+
+        # --- SEKCJA 1: Szybki opis datasetu z Kaggle ---
+        st.header("📁 O projekcie i danych")
+        st.write("""
+        Projekt wykorzystuje popularny zbiór danych 
+        **California Housing Prices** pochodzący z serwisu Kaggle.
+
+        Zawiera on informacje o:
+        - 🌆 lokalizacji (geograficznej)  
+        - 👨‍👩‍👧‍👦 populacji  
+        - 🏡 liczbie pokoi i gospodarstw  
+        - 💰 medianowych dochodach  
+        - 🏠 medianowych cenach nieruchomości  
 
-        # KLUCZOWE METRYKI
-        st.subheader("Kluczowe Metryki")
+        Celem projektu jest **eksploracja danych** oraz **budowa modelu predykcji cen domów**.
+        """)
 
-        col1, col2, col3, col4 = st.columns(4)
+        st.divider()
+
+        # --- SEKCJA 2: Trzy duże boxy z opisami ---
+        st.subheader("🔍 Główne sekcje aplikacji")
+        col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.metric("Liczba nieruchomości", len(df_stats))
+            st.info("### 🗺️ Mapa wizualizacji\nInteraktywna mapa z filtrami, wyborem kolumn i wykresami.")
 
         with col2:
-            avg_price = df_stats['median_house_value'].mean()
-            st.metric("Średnia cena domu", f"${avg_price:,.0f}")
+            st.info("### 📊 Statystyki i Analiza\nHistogramy, korelacje, wykresy zależności i kluczowe metryki.")
 
         with col3:
-            median_price = df_stats['median_house_value'].median()
-            st.metric("Mediana ceny", f"${median_price:,.0f}")
+            st.info("### 🤖 Predykcja (w przyszłości)\nStrona na model ML do przewidywania cen mieszkań.")
+
+        st.divider()
 
-        with col4:
-            avg_rooms_per_house = (df_stats['total_rooms'] / df_stats['households']).mean()
-            st.metric("Średnia liczba pokoi na dom", f"{avg_rooms_per_house:.2f}")
+        # --- SEKCJA 3: Szybki preview datasetu (opcjonalny) ---
+        st.header("📌 Podgląd wbudowanego datasetu")
+
+        df = load_data()
+        if df is not None:
+            st.write(f"Wczytano dane: **{df.shape[0]} rekordów, {df.shape[1]} kolumn**")
+            with span("table:home_preview"):
+                st.dataframe(df.head(), use_container_width=True)
+        else:
+            st.warning("Nie znaleziono pliku *housing.csv*. Upewnij się, że znajduje się w folderze projektu lub wgraj własny plik w zakładce 'Mapa Wizualizacji'.")
 
         st.divider()
 
-        # WIZUALIZACJE
-        st.subheader("Wizualizacje")
+        # --- FOOTER ---
+        st.markdown("""
+        ### 🧑‍💻 Autorzy projektu  
+        Anna Woźniak, Mikołaj Wróblewski, Daniil Ihnatiuhin
+        """)
 
-        col1, col2 = st.columns(2)
+# ============================================================================
+# TAB 2: MAPA WIZUALIZACJI (map.py)
+# ============================================================================
+with tab2:
+    # Treść zakładki liczona tylko, gdy jest wybrana
+    if tab2.open:
+        st.title("🗺️ Mapa Wizualizacji")
+        st.markdown("""
+        Upload your housing dataset (CSV format) and explore housing prices on an interactive map.
+        Select columns for location and price, enable filters, and customize what's shown on the map.
+        """)
 
-        with col1:
-            # Rozkład cen
-            fig_price = px.histogram(
-                df_stats,
-                x='median_house_value',
-                nbins=30,
-                title="Rozkład cen domów",
-                labels={'median_house_value': 'Cena domu ($)', 'count': 'Liczba nieruchomości'}
-            )
-            st.plotly_chart(fig_price, use_container_width=True)
+        model_path = model_warmup.model_path  # ta sama wersja, której stan rozgrzewania pokazujemy
+        predictor = None
+        if model_warmup.warming:
+            show_model_warmup()
+        elif model_warmup.state == "failed":
+            st.error(f"Nie można wczytać modelu: {model_warmup.error}")
+        else:
+            predictor = load_pretrained_model(model_path)
+            if model_warmup.state == "degraded":
+                st.warning(f"⚠️ Model wczytano, ale próbna predykcja się nie udała: {model_warmup.warning}. Predykcje mogą zwracać cenę zastępczą.")
 
-        with col2:
-            # Zależność: dochód vs cena
-            fig_scatter = px.scatter(
-                df_stats,
-                x='median_income',
-                y='median_house_value',
-                color='housing_median_age',
-                title="Dochód vs Cena Domu",
-                labels={
-                    'median_income': 'Dochód medianowy',
-                    'median_house_value': 'Cena domu ($)',
-                    'housing_median_age': 'Wiek domu (lata)'
-                }
-            )
-            st.plotly_chart(fig_scatter, use_container_width=True)
+        if data_source == "builtin":
+            if df_map is None:
+                st.error("Nie można wczytać pliku housing.csv")
+            elif predictor is not None:
+                st.success("✅ Użyto wbudowanego datasetu z przedtrenowanym modelem AutoGluon")
 
-        col3, col4 = st.columns(2)
+        elif data_source == "upload" and uploaded_file is not None:
+            try:
+                if load_error is not None:
+                    raise load_error
+                st.success(f"Wczytano plik z {df_map.shape[0]} rekordami")
+                if isinstance(df_map, OnDiskDataset):
+                    st.info(f"💽 Plik jest większy niż {ON_DISK_MIN_BYTES / 1024**2:.0f} MB - dane zostają na dysku (Parquet), a filtry, mapa i statystyki są liczone zapytaniami bez wczytywania całego pliku.")
+                if truncated:
+                    st.warning(f"⚠️ Plik przekracza limit ({UPLOAD_MAX_ROWS:,} wierszy / {UPLOAD_MAX_BYTES / 1024**3:.0f} GB w pamięci) - wczytano tylko pierwsze {df_map.shape[0]} wierszy.")
 
-        with col3:
-            # Cena vs liczba pokoi
-            fig_rooms = px.scatter(
-                df_stats,
-                x='total_rooms',
-                y='median_house_value',
-                title="Cena vs Liczba Pokoi",
-                labels={
-                    'total_rooms': 'Całkowita liczba pokoi',
-                    'median_house_value': 'Cena domu ($)'
-                }
-            )
-            st.plotly_chart(fig_rooms, use_container_width=True)
-
-        with col4:
-            # Wiek domu vs cena
-            df_age = df_stats.copy()
-            df_age['age_group'] = pd.cut(df_stats['housing_median_age'], bins=5).astype(str)
-            fig_age = px.box(
-                df_age,
-                x='age_group',
-                y='median_house_value',
-                title="Cena w Zależności od Wieku",
-                labels={
-                    'age_group': 'Wiek domu',
-                    'median_house_value': 'Cena domu ($)'
-                }
-            )
-            st.plotly_chart(fig_age, use_container_width=True)
-
-        col5, col6 = st.columns(2)
-
-        with col5:
-            # Populacja vs cena
-            fig_pop = px.scatter(
-                df_stats,
-                x='population',
-                y='median_house_value',
-                title="Populacja vs Cena Domu",
-                labels={
-                    'population': 'Populacja',
-                    'median_house_value': 'Cena domu ($)'
-                }
+                # Sprawdź czy można dokonać refit (doszkalanie potrzebuje całej ramki w pamięci)
+                if predictor is not None and not isinstance(df_map, OnDiskDataset):
+                    if 'median_house_value' in df_map.columns:
+                        st.info("🔄 Znaleziono kolumnę 'median_house_value' - możliwe doszkolenie modelu (refit)")
+                        if st.button("🚀 Doszkolij model na nowych danych"):
+                            # Doszkalanie w osobnym procesie - model podmieniany dopiero po zakończeniu
+                            with span("refit:submit"):
+                                st.session_state["refit_job"] = get_refit_manager().submit(df_map)
+                        if "refit_job" in st.session_state:
+                            show_refit_progress(st.session_state["refit_job"])
+                    else:
+                        st.warning("⚠️ Brak kolumny 'median_house_value' w danych. Model będzie używany tylko do predykcji bez doszkolenia.")
+            except Exception as e:
+                st.error(f"Error loading file: {str(e)}")
+
+        elif data_source == "manual":
+            # Bez modelu formularz pokazałby tylko ceny zastępcze - czekamy na koniec rozgrzewania
+            if not model_warmup.warming:
+                reference_df = load_data()
+                if isinstance(reference_df, OnDiskDataset):
+                    reference_df = None  # indeks przestrzenny potrzebuje współrzędnych w pamięci
+                reference_key = f"builtin-{file_fingerprint(DATA_PATH)}" if reference_df is not None else None
+                manual_entry(predictor, model_path, reference_df, reference_key)
+
+        # --- Jeśli dane pochodzą z pliku lub wbudowanego datasetu ---
+        if df_map is not None and data_source != "manual":
+            try:
+                st.success(f"Successfully loaded dataset with {df_map.shape[0]} rows and {df_map.shape[1]} columns.")
+
+                # Display basic info about the dataset
+                st.subheader("Dataset Overview")
+                st.write(f"**Shape:** {df_map.shape}")
+                st.write("**Rows:**")
+                paged_table(df_map, dataset_key, "map_preview")
+
+                # Predykcje modelu dla całego datasetu - na żądanie, liczone w tle; mapa może ich użyć jako koloru
+                map_df, map_key = df_map, dataset_key
+                if predictor is not None and can_score(df_map) and not isinstance(df_map, OnDiskDataset):
+                    scoring = get_scoring_manager()
+                    version = model_version(model_path)
+                    job_key = scoring.find(dataset_key, version)
+                    job = scoring.job(job_key) if job_key is not None else None
+                    if job is not None and job["state"] == "failed":
+                        st.warning(f"⚠️ Nie udało się obliczyć predykcji dla datasetu: {job['message']}")
+                    if job is None or job["state"] == "failed":
+                        if st.button("🧮 Policz predykcje modelu dla całego datasetu", key="score_dataset"):
+                            job_key = scoring.submit(dataset_key, version, df_map, model_path)
+                            job = scoring.job(job_key)
+                    if job is not None and job["state"] == "finished":
+                        map_df, map_key = load_scored_dataset(job_key, df_map, job["path"]), job_key
+                        added = [c for c in (PREDICTION_COL, RESIDUAL_COL) if c in map_df.columns]
+                        st.info(f"🧮 Dodano kolumny predykcji modelu: {', '.join(added)} - wybierz je jako 'Price Column', aby pokolorować mapę predykcją lub błędem modelu.")
+                    elif job is not None and job["state"] in ("queued", "running"):
+                        show_scoring_progress(job_key)
+
+                map_explorer(map_df, map_key)
+
+            except Exception as e:
+                st.error(f"Error processing the data: {str(e)}")
+                st.info("Please ensure the uploaded file is a valid CSV with numeric columns for longitude, latitude, and price.")
+        else:
+            if data_source == "upload" and uploaded_file is None:
+                st.info("📤 Wgraj plik CSV, aby rozpocząć eksplorację danych.")
+
+# ============================================================================
+# TAB 3: STATYSTYKI (statistics.py)
+# ============================================================================
+with tab3:
+    # Treść zakładki liczona tylko, gdy jest wybrana
+    if tab3.open:
+        st.header("📊 Dane i Statystyki")
+
+        # Wgrany plik z kolumnami California Housing analizujemy tym samym silnikiem co wbudowany dataset
+        if data_source == "upload" and df_map is not None and all(c in df_map.columns for c in STATS_COLUMNS):
+            df_stats = df_map
+            stats_key = dataset_key
+            # Plik obcięty przy wczytywaniu albo duży - agregaty liczone strumieniowo z całego pliku, nie z ramki w pamięci
+            # (dataset na dysku liczy agregaty zapytaniami do kopii Parquet)
+            streaming = truncated or (
+                not isinstance(df_map, OnDiskDataset)
+                and STATS_STREAMING_MIN_BYTES is not None
+                and uploaded_file.size > STATS_STREAMING_MIN_BYTES
             )
-            st.plotly_chart(fig_pop, use_container_width=True)
-
-        with col6:
-            # Liczba gospodarstw vs cena
-            fig_households = px.scatter(
-                df_stats,
-                x='households',
-                y='median_house_value',
-                title="Liczba Gospodarstw vs Cena",
-                labels={
-                    'households': 'Liczba gospodarstw',
-                    'median_house_value': 'Cena domu ($)'
-                }
+            st.caption(f"Statystyki dla wgranego pliku *{uploaded_file.name}*")
+        else:
+            df_stats = load_data()
+            stats_key = f"builtin-{file_fingerprint(DATA_PATH)}" if df_stats is not None else None
+            streaming = False
+        aggregates_key = f"stream-{stats_key}" if streaming else stats_key
+
+        if df_stats is None:
+            st.error("Nie można wczytać pliku housing.csv. Upewnij się, że plik znajduje się w folderze projektu.")
+        else:
+            with span("stats:aggregates"):
+                if streaming:
+                    stats = calculate_streaming_stats(upload_hash(uploaded_file), uploaded_file)
+                else:
+                    stats = calculate_stats(stats_key, df_stats)
+            if streaming:
+                st.info(
+                    f"ℹ️ Metryki, histogram, wykres pudełkowy, statystyki opisowe i korelacje policzono w jednym przebiegu "
+                    f"dla całego pliku ({stats['total_records']:,} wierszy; kwantyle przybliżone). Wykresy punktowe i tabela "
+                    f"pokazują wczytane {len(df_stats):,} wierszy."
+                )
+
+            # KLUCZOWE METRYKI
+            st.subheader("Kluczowe Metryki")
+
+            col1, col2, col3, col4 = st.columns(4)
+
+            with col1:
+                st.metric("Liczba nieruchomości", stats['total_records'])
+
+            with col2:
+                st.metric("Średnia cena domu", f"${stats['avg_price']:,.0f}")
+
+            with col3:
+                st.metric("Mediana ceny", f"${stats['median_price']:,.0f}")
+
+            with col4:
+                st.metric("Średnia liczba pokoi na dom", f"{stats['avg_rooms_per_house']:.2f}")
+
+            st.divider()
+
+            # WIZUALIZACJE
+            st.subheader("Wizualizacje")
+            scatter_limit = st.select_slider(
+                "Maks. liczba punktów na wykresach punktowych",
+                options=SCATTER_POINT_OPTIONS,
+                value=5000,
+                key="scatter_limit"
             )
-            st.plotly_chart(fig_households, use_container_width=True)
 
-        st.divider()
+            col1, col2 = st.columns(2)
 
-        # STATYSTYKI OPISOWE
-        st.subheader("Statystyki Opisowe")
-        stats_table = df_stats.describe().round(2)
-        st.dataframe(stats_table, use_container_width=True)
+            with col1, span("chart:price_histogram"):
+                # Rozkład cen - z policzonych wcześniej liczności przedziałów
+                fig_price = cached_figure(("price_histogram", aggregates_key), lambda: price_histogram_figure(stats['price_hist']))
+                st.plotly_chart(fig_price, use_container_width=True)
 
-        st.divider()
+            with col2:
+                # Zależność: dochód vs cena
+                show_scatter(
+                    df_stats,
+                    stats_key,
+                    scatter_limit,
+                    x='median_income',
+                    y='median_house_value',
+                    color='housing_median_age',
+                    title="Dochód vs Cena Domu",
+                    labels={
+                        'median_income': 'Dochód medianowy',
+                        'median_house_value': 'Cena domu ($)',
+                        'housing_median_age': 'Wiek domu (lata)'
+                    }
+                )
 
-        # MACIERZ KORELACJI I TOP KORELACJE
-        st.subheader("Analiza Korelacji")
+            col3, col4 = st.columns(2)
 
-        col1, col2 = st.columns(2)
+            with col3:
+                # Cena vs liczba pokoi
+                show_scatter(
+                    df_stats,
+                    stats_key,
+                    scatter_limit,
+                    x='total_rooms',
+                    y='median_house_value',
+                    title="Cena vs Liczba Pokoi",
+                    labels={
+                        'total_rooms': 'Całkowita liczba pokoi',
+                        'median_house_value': 'Cena domu ($)'
+                    }
+                )
 
-        with col1:
-            st.write("**Macierz Korelacji**")
-            num_df = df_stats.select_dtypes(include=['int64', 'float64'])
-            corr_table = num_df.corr().round(3)
+            with col4, span("chart:age_box"):
+                # Wiek domu vs cena - pudełka z policzonych wcześniej kwartyli
+                fig_age = cached_figure(("age_box", aggregates_key), lambda: age_box_figure(stats['age_box']))
+                st.plotly_chart(fig_age, use_container_width=True)
 
-            fig_corr = px.imshow(corr_table,
-                                title="Macierz Korelacji",
-                                labels=dict(color="Korelacja"),
-                                color_continuous_scale='RdBu',
-                                zmin=-1, zmax=1)
-            st.plotly_chart(fig_corr, use_container_width=True)
+            col5, col6 = st.columns(2)
 
-        with col2:
-            st.write("**Top 10 Korelacji z Ceną Domu**")
-            price_corr = corr_table['median_house_value'].sort_values(ascending=False)[1:11]
-            fig_top = px.bar(price_corr, title="Top 10 Cech Skorelowanych z Ceną",
-                            labels={'value': 'Korelacja', 'index': 'Cecha'})
-            st.plotly_chart(fig_top, use_container_width=True)
+            with col5:
+                # Populacja vs cena
+                show_scatter(
+                    df_stats,
+                    stats_key,
+                    scatter_limit,
+                    x='population',
+                    y='median_house_value',
+                    title="Populacja vs Cena Domu",
+                    labels={
+                        'population': 'Populacja',
+                        'median_house_value': 'Cena domu ($)'
+                    }
+                )
 
-        st.divider()
+            with col6:
+                # Liczba gospodarstw vs cena
+                show_scatter(
+                    df_stats,
+                    stats_key,
+                    scatter_limit,
+                    x='households',
+                    y='median_house_value',
+                    title="Liczba Gospodarstw vs Cena",
+                    labels={
+                        'households': 'Liczba gospodarstw',
+                        'median_house_value': 'Cena domu ($)'
+                    }
+                )
+
+            st.divider()
+
+            # STATYSTYKI OPISOWE
+            st.subheader("Statystyki Opisowe")
+            with span("table:describe"):
+                st.dataframe(stats['describe'], use_container_width=True)
+
+            st.divider()
+
+            # MACIERZ KORELACJI I TOP KORELACJE
+            st.subheader("Analiza Korelacji")
+
+            col1, col2 = st.columns(2)
+
+            with col1, span("chart:correlation_matrix"):
+                st.write("**Macierz Korelacji**")
+                fig_corr = cached_figure(("correlation_matrix", aggregates_key), lambda: correlation_figure(stats['corr']))
+                st.plotly_chart(fig_corr, use_container_width=True)
+
+            with col2, span("chart:top_correlations"):
+                st.write("**Top 10 Korelacji z Ceną Domu**")
+                fig_top = cached_figure(("top_correlations", aggregates_key), lambda: top_correlations_figure(stats['corr']))
+                st.plotly_chart(fig_top, use_container_width=True)
+
+            st.divider()
+
+            # SUROWE DANE
+            st.subheader("Surowe Dane")
+            paged_table(df_stats, stats_key, "raw_data")
 
-        # SUROWE DANE
-        st.subheader("Surowe Dane")
-        st.dataframe(df_stats, use_container_width=True)
+# --- PANEL DIAGNOSTYCZNY ---
+if show_debug:
+    show_debug_panel()
@@ -0,0 +1,124 @@
+"""Wybór modelu pod budżet opóźnienia predykcji i eksport odchudzonego modelu.
+
+Mierzy opóźnienie predykcji pojedynczego wiersza (p50/p99) dla każdego
+modelu z `model/`, wybiera najszybszy model mieszczący się w budżecie,
+którego błąd walidacyjny jest najwyżej `--score-tolerance` gorszy od
+najlepszego kandydata, i zapisuje kopię predyktora zawierającą tylko ten
+model (bez danych treningowych i zbędnych foldów).
+
+Użycie:
+    python model_selection.py --budget-ms 20 --output model_slim
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from prediction import FEATURE_COLUMNS
+
+
+def benchmark_models(predictor, data, repeats=50, batch_size=1000):
+    """Opóźnienie predykcji i błąd walidacyjny dla każdego modelu zdolnego do predykcji."""
+    leaderboard = predictor.leaderboard(silent=True).set_index("model")
+    # Modele _FULL nie mają wyniku walidacyjnego - bierzemy wynik modelu, z którego powstały
+    refit_parents = predictor.model_refit_map(inverse=True)
+
+    single_rows = [data.iloc[[i % len(data)]] for i in range(repeats)]
+    batch = data.sample(min(batch_size, len(data)), random_state=0)
+
+    results = []
+    for model in predictor.model_names(can_infer=True):
+        score_val = leaderboard.loc[model, "score_val"]
+        if pd.isna(score_val) and model in refit_parents:
+            score_val = leaderboard.loc[refit_parents[model], "score_val"]
+
+        # Bez persist AutoGluon wczytuje modele z dysku przy każdym predict - mierzymy stan docelowy
+        predictor.persist(models=[model])
+        predictor.predict(single_rows[0], model=model)
+        timings = []
+        for row in single_rows:
+            start = time.perf_counter()
+            predictor.predict(row, model=model)
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        predictor.predict(batch, model=model)
+        batch_time = time.perf_counter() - start
+        predictor.unpersist()
+
+        results.append({
+            "model": model,
+            "score_val": float(score_val),
+            "p50_ms": float(np.percentile(timings, 50) * 1000),
+            "p99_ms": float(np.percentile(timings, 99) * 1000),
+            "batch_ms_per_row": batch_time * 1000 / len(batch),
+        })
+    return pd.DataFrame(results).sort_values("p99_ms").reset_index(drop=True)
+
+
+def select_model(results, budget_ms, score_tolerance=0.005):
+    """Najszybszy model w budżecie p99, z wynikiem nie gorszym niż `score_tolerance` od najlepszego w budżecie.
+
+    Zwraca None, gdy żaden model nie mieści się w budżecie.
+    """
+    candidates = results[(results["p99_ms"] <= budget_ms) & results["score_val"].notna()]
+    if candidates.empty:
+        return None
+    best_score = candidates["score_val"].max()
+    good_enough = candidates[candidates["score_val"] >= best_score - abs(best_score) * score_tolerance]
+    return good_enough.sort_values("p99_ms").iloc[0]["model"]
+
+
+def export_slim(predictor, model, output_path):
+    """Kopia predyktora tylko z modelem `model` (i jego zależnościami), ustawionym jako domyślny.
+
+    To samo co `clone_for_deployment`, ale model jest ustawiany jako domyślny
+    przed usunięciem pozostałych - inaczej AutoGluon próbuje wybrać nowy
+    najlepszy model spośród modeli _FULL bez wyniku walidacyjnego i się wywraca.
+    """
+    slim = predictor.clone(path=output_path, return_clone=True)
+    slim.set_model_best(model=model, save_trainer=True)
+    slim.delete_models(models_to_keep=model, dry_run=False)
+    slim.save_space()
+    return slim.path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="model", help="katalog pełnego predyktora AutoGluon")
+    parser.add_argument("--data", default="housing.csv", help="CSV z wierszami do pomiaru opóźnienia")
+    parser.add_argument("--budget-ms", type=float, required=True, help="budżet p99 opóźnienia predykcji jednego wiersza [ms]")
+    parser.add_argument("--score-tolerance", type=float, default=0.005, help="dopuszczalna względna strata wyniku walidacyjnego")
+    parser.add_argument("--repeats", type=int, default=50, help="liczba pomiarów pojedynczego wiersza na model")
+    parser.add_argument("--output", default="model_slim", help="katalog odchudzonego predyktora")
+    args = parser.parse_args()
+
+    from autogluon.tabular import TabularPredictor
+
+    predictor = TabularPredictor.load(args.model)
+    data = pd.read_csv(args.data)[FEATURE_COLUMNS]
+    results = benchmark_models(predictor, data, repeats=args.repeats)
+    print(results.to_string(index=False))
+
+    model = select_model(results, args.budget_ms, args.score_tolerance)
+    if model is None:
+        raise SystemExit(f"Żaden model nie mieści się w budżecie p99 {args.budget_ms} ms")
+    print(f"\nWybrany model: {model}")
+
+    export_slim(predictor, model, args.output)
+    report = {
+        "model": model,
+        "budget_ms": args.budget_ms,
+        "score_tolerance": args.score_tolerance,
+        "source": args.model,
+        "benchmark": results.to_dict("records"),
+    }
+    with open(os.path.join(args.output, "selection.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Zapisano odchudzony model w {args.output}")
+
+
+if __name__ == "__main__":
+    main()
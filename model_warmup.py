@@ -0,0 +1,64 @@
+"""Wczytywanie i rozgrzewanie modelu w tle - pierwsza sesja nie czeka na import AutoGluon."""
+import threading
+import time
+
+
+class ModelWarmup:
+    """Wątek w tle: wczytanie predyktora przez `loader` i jedna próbna predykcja.
+
+    Próbna predykcja wczytuje modele, które AutoGluon ładuje leniwie przy
+    pierwszym `predict`. Stan: "warming" -> "ready" / "degraded" (model
+    wczytany, ale próbna predykcja się nie udała - komunikat w `warning`)
+    / "missing" (brak modelu) / "failed" (błąd wczytania).
+    """
+
+    def __init__(self, loader, model_path, sample=None):
+        self.loader = loader
+        self.model_path = model_path
+        self.sample = sample
+        self.state = "warming"
+        self.error = None
+        self.warning = None
+        self.predictor = None
+        self.load_seconds = None
+        self.ready_seconds = None
+        self._started = time.perf_counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            predictor = self.predictor = self.loader(self.model_path)
+            self.load_seconds = time.perf_counter() - self._started
+            if predictor is None:
+                self.state = "missing"
+                return
+            if self.sample is not None:
+                try:
+                    predictor.predict(self.sample)
+                except Exception as e:
+                    self.warning = str(e)
+                    self.state = "degraded"
+                    return
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.ready_seconds = time.perf_counter() - self._started
+            self._done.set()
+
+    @property
+    def warming(self):
+        return self.state == "warming"
+
+    def elapsed(self):
+        """Sekundy od startu rozgrzewania (albo czas do jego zakończenia)."""
+        if self.ready_seconds is not None:
+            return self.ready_seconds
+        return time.perf_counter() - self._started
+
+    def wait(self, timeout=None):
+        """Czeka na koniec rozgrzewania; zwraca False po przekroczeniu `timeout`."""
+        return self._done.wait(timeout)
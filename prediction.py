@@ -0,0 +1,228 @@
+"""Predykcja cen modelem AutoGluon z cache wyników współdzielonym między sesjami."""
+import math
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_PRICE = 200000.0  # cena zastępcza, gdy predykcja się nie powiedzie
+
+# Cechy, na których uczony był model (kolejność jak w housing.csv)
+FEATURE_COLUMNS = [
+    "longitude",
+    "latitude",
+    "housing_median_age",
+    "total_rooms",
+    "total_bedrooms",
+    "population",
+    "households",
+    "median_income",
+    "ocean_proximity",
+]
+OCEAN_PROXIMITY_VALUES = ["NEAR BAY", "<1H OCEAN", "INLAND", "NEAR OCEAN", "ISLAND"]
+
+# Przykładowy punkt (domyślne wartości trybu ręcznego) - np. do rozgrzania modelu
+EXAMPLE_FEATURES = {
+    "longitude": -120.0,
+    "latitude": 37.0,
+    "housing_median_age": 20.0,
+    "total_rooms": 1000.0,
+    "total_bedrooms": 200.0,
+    "population": 500.0,
+    "households": 150.0,
+    "median_income": 3.0,
+    "ocean_proximity": "INLAND",
+}
+
+
+def load_predictor(model_path):
+    """Wczytuje predyktor AutoGluon i trzyma jego modele w pamięci."""
+    # Import dopiero tutaj - moduły bez predykcji nie płacą za import AutoGluon
+    from autogluon.tabular import TabularPredictor
+    predictor = TabularPredictor.load(model_path)
+    # Bez persist AutoGluon wczytuje modele z dysku przy każdym predict
+    try:
+        predictor.persist()
+    except Exception:
+        pass  # niekompletny model - błędy predykcji obsługuje predict_prices
+    return predictor
+
+
+def model_version(model_path):
+    """Wersja modelu: version.txt + czas ostatniego zapisu predyktora.
+
+    Sam version.txt to wersja AutoGluon, więc nie zmienia się po refit_full -
+    czas modyfikacji plików predyktora tak.
+    """
+    try:
+        with open(os.path.join(model_path, "version.txt")) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+
+    mtimes = []
+    for name in ("predictor.pkl", "learner.pkl", os.path.join("models", "trainer.pkl")):
+        try:
+            mtimes.append(os.stat(os.path.join(model_path, name)).st_mtime_ns)
+        except OSError:
+            pass
+    return f"{version}:{max(mtimes, default=0)}"
+
+
+def _canonical_value(value):
+    if isinstance(value, str):
+        return value.strip().upper()
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return round(value, 6)
+
+
+def feature_key(row):
+    """Kanoniczna krotka 9 cech - klucz cache predykcji."""
+    return tuple(_canonical_value(row[col]) for col in FEATURE_COLUMNS)
+
+
+class PredictionCache:
+    """Ograniczony cache LRU: krotka cech -> przewidywana cena.
+
+    Wpisy są ważne tylko dla jednej wersji modelu - zmiana wersji (np. po
+    refit_full) czyści cache. Opcjonalnie zapisywany na dysk, żeby przetrwał
+    restart serwera: w wątku w tle, najwyżej raz na `save_interval` s, bez
+    trzymania blokady w czasie zapisu.
+    """
+
+    def __init__(self, max_size=10000, path=None, save_interval=5.0):
+        self.max_size = max_size
+        self.path = path
+        self.save_interval = save_interval
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # kolejne zapisy na dysk po kolei
+        self._save_timer = None
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            return
+        self.version = version
+        self._entries = OrderedDict(list(entries.items())[-self.max_size:])
+
+    def _schedule_save(self):
+        """Planuje zapis na dysk za `save_interval` s, jeśli żaden nie czeka (wywoływane pod blokadą)."""
+        if not self.path or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_interval, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def flush(self):
+        """Zapisuje cache na dysk od razu; pod blokadą tylko kopia wpisów."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                self._save_timer = None
+                snapshot = (self.version, dict(self._entries))
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            # Unikalny plik tymczasowy - kilka replik może dzielić katalog cache
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(snapshot, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get_many(self, version, keys):
+        """Zwraca listę cen (None dla braków) i przesuwa trafienia na koniec LRU."""
+        with self._lock:
+            self._check_version(version)
+            results = []
+            for key in keys:
+                price = self._entries.get(key)
+                if price is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                results.append(price)
+            return results
+
+    def put_many(self, version, keys, prices):
+        with self._lock:
+            self._check_version(version)
+            for key, price in zip(keys, prices):
+                self._entries[key] = price
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+            self._schedule_save()
+
+
+def predict_prices(predictor, features, cache=None, version=None):
+    """Predykcja cen dla wszystkich wierszy jednym wywołaniem modelu.
+
+    Zwraca listę cen i listę komunikatów błędów (None, gdy punkt się udał).
+    Z cache brane są wiersze już policzone dla tej wersji modelu - model
+    dostaje tylko brakujące. Jeśli predykcja całej paczki się nie powiedzie,
+    wiersze są liczone pojedynczo, żeby błąd jednego punktu nie psuł pozostałych.
+    """
+    if predictor is None:
+        return [DEFAULT_PRICE] * len(features), ["Model nie jest dostępny. Używam wartości domyślnej."] * len(features)
+
+    prices = [None] * len(features)
+    errors = [None] * len(features)
+    keys = None
+    if cache is not None:
+        keys = [feature_key(row) for row in features[FEATURE_COLUMNS].to_dict("records")]
+        prices = cache.get_many(version, keys)
+
+    missing = [i for i, price in enumerate(prices) if price is None]
+    if not missing:
+        return prices, errors
+
+    to_predict = features.iloc[missing]
+    try:
+        for i, price in zip(missing, predictor.predict(to_predict).astype(float).tolist()):
+            prices[i] = price
+    except Exception:
+        for i in missing:
+            try:
+                prices[i] = float(predictor.predict(features.iloc[[i]]).iloc[0])
+            except Exception as e:
+                prices[i] = DEFAULT_PRICE
+                errors[i] = f"Punkt {i+1}: błąd predykcji: {e}. Używam wartości domyślnej."
+
+    if cache is not None:
+        succeeded = [i for i in missing if errors[i] is None]
+        if succeeded:
+            cache.put_many(version, [keys[i] for i in succeeded], [prices[i] for i in succeeded])
+    return prices, errors
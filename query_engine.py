@@ -0,0 +1,266 @@
+"""Zapytania do datasetu na dysku (Parquet) bez wczytywania go do pamięci.
+
+Filtry mapy (zakresy i listy wartości) trafiają do skanera pyarrow.dataset
+jako wyrażenia: skaner pomija grupy wierszy po statystykach min/max, czyta
+tylko potrzebne kolumny i dekoduje je w wielu wątkach. Do pamięci trafiają
+tylko małe wyniki - liczności, siatka mapy, agregaty statystyk, próbki
+punktów i strony tabeli.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from aggregates import downsample_scatter, grid_cell_size, grid_cells, grid_frame
+from filters import FilterIndex
+from streaming_stats import StreamingStats
+
+SORTED_PREFIX_ROWS = 1000  # najmniejszy zapamiętywany początek posortowanych wyników (kilkadziesiąt stron tabeli)
+SAMPLE_OVERSAMPLING = 4  # próbka wstępna przy wykresach punktowych: tyle razy więcej punktów niż limit
+POSITION_COLUMN = "__position__"  # pomocnicza kolumna z numerem wiersza przy sortowaniu
+# Kolumny grupy wierszy czytane na żądanie - wczytywanie z wyprzedzeniem zwiększa pamięć, a nie skraca czasu
+SCAN_OPTIONS = ds.ParquetFragmentScanOptions(pre_buffer=False)
+
+
+class OnDiskDataset:
+    """Dataset w pliku Parquet, odpytywany strumieniowo; wspólny dla wszystkich sesji.
+
+    Ma te same metody filtrów co `FilterIndex` (`value_range`, `categories`,
+    `count`, `page`) oraz `shape`, `columns` i `head` jak ramka. Wyniki są
+    nowymi ramkami pandas - można je modyfikować.
+    """
+
+    def __init__(self, path, max_cached_counts=64, max_cached_sorted=4):
+        self.path = path
+        self._dataset = ds.dataset(path, format="parquet")
+        schema = self._dataset.schema
+        self.columns = schema.names
+        self.numeric_columns = [
+            field.name for field in schema if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        ]
+        self.n_rows = self._dataset.count_rows()
+        self.shape = (self.n_rows, len(self.columns))
+        self._ranges = {}
+        self._categories = {}
+        self._counts = OrderedDict()
+        self._sorted = OrderedDict()
+        self._max_cached_counts = max_cached_counts
+        self._max_cached_sorted = max_cached_sorted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.n_rows
+
+    @staticmethod
+    def expression(active_filters):
+        """Filtry w formacie mapy jako wyrażenie skanera (None = brak filtrów); zakresy domknięte jak w `FilterIndex`."""
+        expression = None
+        for col, val in (active_filters or {}).items():
+            field = ds.field(col)
+            if isinstance(val, tuple):
+                condition = (field >= val[0]) & (field <= val[1])
+            elif len(val):
+                condition = field.isin(list(val))
+            else:
+                condition = ds.scalar(False)  # nic nie zaznaczono - pusta lista nie ma typu dla isin
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _schema(self, columns):
+        return pa.schema([self._dataset.schema.field(col) for col in columns])
+
+    def batches(self, active_filters=None, columns=None):
+        """Kolejne paczki wierszy spełniających filtry, tylko z kolumnami `columns` (None = wszystkie).
+
+        Grupy wierszy czytane są po jednej, dopiero gdy wywołujący skończy
+        poprzednią - skaner czytający naprzód nie zwalnia przy wolnym odbiorcy
+        i zapełniałby pamięć. Grupy wykluczone przez statystyki min/max są pomijane.
+        """
+        columns = None if columns is None else list(dict.fromkeys(columns))
+        expression = self.expression(active_filters)
+        for fragment in self._dataset.get_fragments(filter=expression):
+            for row_group in fragment.split_by_row_group(expression):
+                table = row_group.to_table(columns=columns, filter=expression, use_threads=True, fragment_scan_options=SCAN_OPTIONS)
+                for batch in table.to_batches():
+                    if batch.num_rows:
+                        yield batch
+
+    # --- metody jak w FilterIndex ---
+    def value_range(self, col):
+        """(min, max) kolumny liczbowej ze statystyk grup wierszy - bez czytania danych."""
+        with self._lock:
+            value_range = self._ranges.get(col)
+        if value_range is None:
+            low, high = np.inf, -np.inf
+            for fragment in self._dataset.get_fragments():
+                for row_group in fragment.row_groups:
+                    stats = row_group.statistics.get(col)
+                    if stats is None:
+                        # Grupa bez statystyk (np. same braki) - min/max z danych tej kolumny
+                        column = fragment.subset(row_group_ids=[row_group.id]).to_table(columns=[col])[col]
+                        stats = pc.min_max(column).as_py()
+                    if stats.get("min") is not None:
+                        low, high = min(low, stats["min"]), max(high, stats["max"])
+            value_range = (float(low), float(high)) if low <= high else (float("nan"), float("nan"))
+            with self._lock:
+                self._ranges[col] = value_range
+        return value_range
+
+    def categories(self, col):
+        """Unikalne wartości kolumny (bez braków) w kolejności wystąpienia."""
+        with self._lock:
+            values = self._categories.get(col)
+        if values is None:
+            seen = {}
+            for batch in self.batches(columns=[col]):
+                seen.update(dict.fromkeys(pc.unique(batch.column(0).drop_null()).to_pylist()))
+            values = list(seen)
+            with self._lock:
+                self._categories[col] = values
+        return values
+
+    def count(self, active_filters):
+        """Liczba wierszy spełniających filtry; bez filtrów z metadanych pliku."""
+        if not active_filters:
+            return self.n_rows
+        key = FilterIndex.key(active_filters)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        # Bez kolumn wyniku - czytane są tylko kolumny filtrów
+        count = sum(batch.num_rows for batch in self.batches(active_filters, columns=[]))
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self._max_cached_counts:
+                self._counts.popitem(last=False)
+        return count
+
+    def _sorted_prefix(self, active_filters, sort_col, descending, limit):
+        """`limit` pierwszych wierszy po sortowaniu - w pamięci tylko one, uzupełniane kolejnymi paczkami."""
+        # Remisy jak w FilterIndex: rosnąco w kolejności pliku, malejąco w odwrotnej; braki na końcu w kolejności pliku
+        order = [(sort_col, "descending" if descending else "ascending"), (POSITION_COLUMN, "ascending")]
+        table = self._dataset.schema.empty_table().append_column(POSITION_COLUMN, pa.array([], pa.int64()))
+        seen = 0
+        for batch in self.batches(active_filters):
+            position = pa.array(np.arange(seen, seen + batch.num_rows))
+            seen += batch.num_rows
+            if descending:
+                position = pc.if_else(pc.is_null(batch.column(sort_col)), position, pc.negate(position))
+            batch = pa.Table.from_batches([batch]).append_column(POSITION_COLUMN, position)
+            table = pa.concat_tables([table, batch])
+            table = table.take(pc.sort_indices(table, sort_keys=order, null_placement="at_end")[:limit])
+        return table.drop_columns([POSITION_COLUMN])
+
+    def page(self, active_filters, start, stop, sort_col=None, descending=False):
+        """Wiersze od `start` do `stop` po filtrach i sortowaniu (ramka) oraz liczba wszystkich pasujących.
+
+        Bez sortowania czytanie kończy się na `stop`. Z sortowaniem zapamiętywany
+        jest początek wyników (co najmniej `stop` wierszy, rosnący dwukrotnie),
+        więc kolejne strony to zwykle tylko wycinek; pamięć rośnie z numerem strony.
+        """
+        total = self.count(active_filters)
+        if sort_col is None:
+            parts, seen = [], 0
+            for batch in self.batches(active_filters):
+                if seen + batch.num_rows > start:
+                    offset = max(start - seen, 0)
+                    parts.append(batch.slice(offset, stop - seen - offset))
+                seen += batch.num_rows
+                if seen >= stop:
+                    break
+            return pa.Table.from_batches(parts, schema=self._dataset.schema).to_pandas(), total
+
+        key = (FilterIndex.key(active_filters or {}), sort_col, descending)
+        with self._lock:
+            cached = self._sorted.get(key)
+            if cached is not None:
+                self._sorted.move_to_end(key)
+        if cached is None or (cached[1] < stop and cached[0].num_rows == cached[1]):
+            limit = max(stop, SORTED_PREFIX_ROWS, 2 * cached[1] if cached is not None else 0)
+            cached = (self._sorted_prefix(active_filters, sort_col, descending, limit), limit)
+            with self._lock:
+                self._sorted[key] = cached
+                while len(self._sorted) > self._max_cached_sorted:
+                    self._sorted.popitem(last=False)
+        return cached[0].slice(start, stop - start).to_pandas(), total
+
+    # --- wyniki dla mapy i statystyk ---
+    def select(self, active_filters, columns, limit=None):
+        """Kolumny `columns` wierszy spełniających filtry, najwyżej `limit` pierwszych (None = wszystkie)."""
+        columns = list(dict.fromkeys(columns))
+        schema = self._schema(columns)
+        parts, rows = [], 0
+        for batch in self.batches(active_filters, columns):
+            if limit is not None and rows + batch.num_rows >= limit:
+                parts.append(batch.slice(0, limit - rows))
+                break
+            parts.append(batch)
+            rows += batch.num_rows
+        return pa.Table.from_batches(parts, schema=schema).to_pandas()
+
+    def head(self, n=5):
+        return self.select(None, self.columns, limit=n)
+
+    def grid(self, active_filters, lon_col, lat_col, value_col=None, grid_size=100, value_name="mean_value"):
+        """Jak `aggregates.grid_aggregate` dla wierszy spełniających filtry - dwa przebiegi, w pamięci tylko siatka.
+
+        Pierwszy przebieg wyznacza obszar danych, drugi liczy komórki.
+        """
+        def coordinates(batch):
+            lon = batch.column(0).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            lat = batch.column(1).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            valid = np.isfinite(lon) & np.isfinite(lat)
+            return lon[valid], lat[valid], valid
+
+        lon_min = lat_min = np.inf
+        lon_max = lat_max = -np.inf
+        for batch in self.batches(active_filters, [lon_col, lat_col]):
+            lon, lat, _ = coordinates(batch)
+            if len(lon):
+                lon_min, lon_max = min(lon_min, lon.min()), max(lon_max, lon.max())
+                lat_min, lat_max = min(lat_min, lat.min()), max(lat_max, lat.max())
+        if lon_min > lon_max:
+            return pd.DataFrame({"longitude": [], "latitude": [], "count": []})
+
+        cell = grid_cell_size(lon_min, lon_max, lat_min, lat_max, grid_size)
+        counts = np.zeros(grid_size * grid_size, dtype=np.int64)
+        sums = value_counts = None
+        if value_col is not None:
+            sums = np.zeros(grid_size * grid_size)
+            value_counts = np.zeros(grid_size * grid_size, dtype=np.int64)
+        columns = [lon_col, lat_col] + ([value_col] if value_col is not None else [])
+        for batch in self.batches(active_filters, columns):
+            lon, lat, valid = coordinates(batch)
+            codes = grid_cells(lon, lat, lon_min, lat_min, cell, grid_size)
+            counts += np.bincount(codes, minlength=grid_size * grid_size)
+            if value_col is not None:
+                values = batch.column(2).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)[valid]
+                has_value = np.isfinite(values)
+                sums += np.bincount(codes[has_value], weights=values[has_value], minlength=grid_size * grid_size)
+                value_counts += np.bincount(codes[has_value], minlength=grid_size * grid_size)
+        return grid_frame(counts, lon_min, lat_min, cell, grid_size, sums, value_counts, value_name)
+
+    def sample(self, columns, max_points, seed=0):
+        """Próbka wierszy do wykresu punktowego: losowa próbka wstępna, potem `downsample_scatter` na niej."""
+        rate = min(1.0, SAMPLE_OVERSAMPLING * max_points / max(self.n_rows, 1))
+        rng = np.random.default_rng(seed)
+        columns = list(dict.fromkeys(columns))
+        schema = self._schema(columns)
+        parts = [batch.filter(pa.array(rng.random(batch.num_rows) < rate)) for batch in self.batches(columns=columns)]
+        frame = pa.Table.from_batches(parts, schema=schema).to_pandas()
+        x, y = columns[:2]
+        rows = downsample_scatter(frame[x], frame[y], max_points=max_points)
+        return frame.iloc[rows].reset_index(drop=True)
+
+    def aggregates(self, hist_bins=30, age_bins=5):
+        """Agregaty zakładki statystyk (układ `aggregates.compute_aggregates`) w jednym przebiegu po kolumnach liczbowych."""
+        stats = StreamingStats(self.numeric_columns)
+        for batch in self.batches(columns=self.numeric_columns):
+            stats.update(batch.to_pandas())
+        return stats.result(hist_bins=hist_bins, age_bins=age_bins)
@@ -0,0 +1,225 @@
+"""Doszkalanie modelu w tle: osobny proces, kolejka zadań i atomowa podmiana wersji modelu."""
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import span
+
+CURRENT_FILE = "CURRENT"  # plik z nazwą aktywnej wersji modelu
+
+
+def current_model_path(base_path, versions_dir):
+    """Ścieżka aktywnej wersji modelu (bazowy model, jeśli nie było doszkalania)."""
+    try:
+        with open(os.path.join(versions_dir, CURRENT_FILE)) as f:
+            name = f.read().strip()
+    except OSError:
+        return base_path
+    path = os.path.join(versions_dir, name)
+    return path if os.path.isdir(path) else base_path
+
+
+def resolve_model_path(base_path, versions_dir, slim_path=None):
+    """Model do predykcji: doszkolona wersja, a bez niej odchudzony model (jeśli istnieje) lub bazowy.
+
+    Doszkolona wersja zachowuje wybór z odchudzonego modelu (`RefitManager`
+    z `selection_path`), więc nie wraca do pełnego zestawu modeli.
+    """
+    path = current_model_path(base_path, versions_dir)
+    if path == base_path and slim_path and os.path.exists(slim_path):
+        return slim_path
+    return path
+
+
+def _publish_version(versions_dir, name):
+    """Atomowo ustawia aktywną wersję - czytelnicy widzą starą albo nową, nigdy pół-zapisaną."""
+    tmp_path = os.path.join(versions_dir, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(name)
+    os.replace(tmp_path, os.path.join(versions_dir, CURRENT_FILE))
+
+
+class _ProgressHandler(logging.Handler):
+    """Zamienia logi AutoGluon 'Fitting model: X' na postęp dla UI."""
+
+    def __init__(self, status_queue, model_names):
+        super().__init__(level=logging.INFO)
+        self.status_queue = status_queue
+        self.model_names = model_names
+        self.fitted = 0
+
+    def emit(self, record):
+        message = record.getMessage()
+        if not message.startswith("Fitting model: "):
+            return
+        name = message[len("Fitting model: "):].split(" ")[0]
+        self.fitted += 1
+        total = max(len(self.model_names), self.fitted)
+        progress = 20 + int(70 * (self.fitted - 1) / total)
+        self.status_queue.put(("running", progress, f"Doszkalanie modelu {name} ({self.fitted}/{total})..."))
+
+
+def selected_model(selection_path):
+    """Model wybrany przez model_selection.py (pole "model" z selection.json) albo None."""
+    if not selection_path:
+        return None
+    try:
+        with open(selection_path) as f:
+            return json.load(f)["model"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _run_refit(source_path, target_path, data_path, status_queue, selected=None):
+    """Proces potomny: klonuje model, uczy modele _FULL na nowo z dodatkowymi danymi.
+
+    Z `selected` (model z selection.json) doszkalany jest tylko jego model
+    bazowy (bez `_FULL`), nowy `<bazowy>_FULL` staje się domyślny, a reszta
+    jest usuwana - zostaje bazowy do kolejnych doszkoleń.
+    """
+    try:
+        from autogluon.tabular import TabularPredictor
+
+        status_queue.put(("running", 5, "Wczytywanie modelu..."))
+        train_data_extra = pd.read_pickle(data_path)
+
+        status_queue.put(("running", 10, "Kopiowanie modelu do nowej wersji..."))
+        predictor = TabularPredictor.load(source_path).clone(path=target_path, return_clone=True)
+
+        # Istniejące modele _FULL są pomijane przez refit_full - trzeba je usunąć, żeby nauczyć je od nowa
+        full_models = [m for m in predictor.model_names() if m.endswith("_FULL")]
+        if full_models:
+            predictor.delete_models(models_to_delete=full_models, dry_run=False)
+        status_queue.put(("running", 20, "Przygotowywanie danych..."))
+
+        parent = selected[:-len("_FULL")] if selected and selected.endswith("_FULL") else selected
+        if parent is not None and parent not in predictor.model_names():
+            raise ValueError(f"Brak modelu {parent} z selection.json w {source_path}")
+
+        ag_logger = logging.getLogger("autogluon")
+        ag_logger.setLevel(logging.INFO)
+        ag_logger.addHandler(_ProgressHandler(status_queue, predictor.model_names()))
+
+        if parent is None:
+            predictor.refit_full(train_data_extra=train_data_extra)
+        else:
+            refit = predictor.refit_full(model=parent, set_best_to_refit_full=False, train_data_extra=train_data_extra)
+            predictor.set_model_best(model=refit[parent], save_trainer=True)
+            predictor.delete_models(models_to_keep=[parent, refit[parent]], dry_run=False)
+        predictor.save()
+        status_queue.put(("finished", 95, "Zapisano nową wersję modelu"))
+    except Exception as e:
+        status_queue.put(("failed", 0, str(e)))
+
+
+class RefitManager:
+    """Kolejka doszkalania współdzielona przez wszystkie sesje.
+
+    Zadania wykonuje jeden wątek roboczy, po jednym procesie naraz. Nowy model
+    trafia do osobnego katalogu wersji, jest wczytywany przez `loader`, i dopiero
+    wtedy staje się aktywny - sesje przez cały czas korzystają ze starego modelu.
+    Gdy istnieje `selection_path` (selection.json odchudzonego modelu), nowa
+    wersja zawiera tylko wybrany model - budżet opóźnienia obowiązuje dalej.
+    """
+
+    def __init__(self, base_path, versions_dir, loader=None, keep_versions=3, selection_path=None):
+        self.base_path = base_path
+        self.versions_dir = versions_dir
+        self.selection_path = selection_path
+        self.loader = loader
+        self.keep_versions = keep_versions
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._worker = threading.Thread(target=self._work, name="refit-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, df):
+        """Dodaje zadanie do kolejki i zwraca jego id."""
+        job_id = next(self._ids)
+        with self._lock:
+            position = self._queue.qsize() + sum(job["state"] == "running" for job in self._jobs.values())
+            self._jobs[job_id] = {
+                "state": "queued",
+                "progress": 0,
+                "message": f"W kolejce (zadań przed tym: {position})",
+                "version": None,
+            }
+        self._queue.put((job_id, df.copy()))
+        return job_id
+
+    def job(self, job_id):
+        with self._lock:
+            return dict(self._jobs.get(job_id, {"state": "unknown", "progress": 0, "message": "", "version": None}))
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _work(self):
+        while True:
+            job_id, df = self._queue.get()
+            try:
+                with span("refit"):
+                    self._run(job_id, df)
+            except Exception as e:
+                self._update(job_id, state="failed", message=str(e))
+
+    def _run(self, job_id, df):
+        os.makedirs(self.versions_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{job_id}"
+        target_path = os.path.join(self.versions_dir, name)
+        data_path = f"{target_path}.data.pkl"
+        df.to_pickle(data_path)
+        self._update(job_id, state="running", progress=1, message="Uruchamianie procesu doszkalania...")
+
+        ctx = multiprocessing.get_context("spawn")
+        status_queue = ctx.Queue()
+        source_path = current_model_path(self.base_path, self.versions_dir)
+        selected = selected_model(self.selection_path)
+        process = ctx.Process(target=_run_refit, args=(source_path, target_path, data_path, status_queue, selected), daemon=True)
+        process.start()
+
+        state = "running"
+        while state == "running":
+            try:
+                state, progress, message = status_queue.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    state, message = "failed", f"Proces doszkalania zakończył się nieoczekiwanie (kod {process.exitcode})"
+                continue
+            if state == "failed":
+                break
+            self._update(job_id, progress=progress, message=message)
+        process.join()
+        os.remove(data_path)
+
+        if state == "failed":
+            shutil.rmtree(target_path, ignore_errors=True)
+            self._update(job_id, state="failed", progress=0, message=message)
+            return
+
+        # Wczytanie nowego modelu przed podmianą, żeby pierwsza sesja po podmianie nie czekała
+        if self.loader is not None:
+            self._update(job_id, progress=97, message="Wczytywanie nowej wersji modelu...")
+            self.loader(target_path)
+        _publish_version(self.versions_dir, name)
+        self._remove_old_versions()
+        self._update(job_id, state="finished", progress=100, message="Zakończono!", version=name)
+
+    def _remove_old_versions(self):
+        versions = sorted(
+            entry for entry in os.listdir(self.versions_dir)
+            if os.path.isdir(os.path.join(self.versions_dir, entry))
+        )
+        for name in versions[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self.versions_dir, name), ignore_errors=True)
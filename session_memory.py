@@ -0,0 +1,83 @@
+"""Dane pochodne jednej sesji (przefiltrowane ramki, siatki mapy) z limitem pamięci.
+
+Datasety są wspólne dla wszystkich sesji i tylko do odczytu; sesja trzyma
+wyłącznie to, co sama z nich wyliczyła. Każdy wpis ma policzony rozmiar,
+a po przekroczeniu budżetu usuwane są najdawniej używane wpisy.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def nbytes(value):
+    """Przybliżony rozmiar wartości w pamięci (ramki i serie razem z tekstem)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    return 0
+
+
+class SessionStore:
+    """Cache LRU danych jednej sesji z budżetem `budget_bytes`.
+
+    Wpis większy niż cały budżet nie jest zapamiętywany - zostaje tylko
+    zwrócony. Wartości są współdzielone z wywołującym, nie modyfikować.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # klucz -> (wartość, rozmiar)
+        self._lock = threading.Lock()  # fragmenty tej samej sesji mogą działać równolegle
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+            if size > self.budget_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self.size_bytes += size
+            while self.size_bytes > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, create):
+        """Wartość spod `key`; przy braku wylicza ją przez `create()` i zapamiętuje."""
+        marker = object()
+        value = self.get(key, marker)
+        if value is marker:
+            value = self.put(key, create())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
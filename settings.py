@@ -0,0 +1,7 @@
+"""Ustawienia wspólne dla aplikacji i narzędzi (benchmark.py, inference_server.py) - jedno źródło, bez kopii."""
+
+MODEL_PATH = "model"  # путь к предобученной модели
+SLIM_MODEL_PATH = "model_slim"  # odchudzony model z model_selection.py - używany zamiast MODEL_PATH, jeśli istnieje
+MODEL_VERSIONS_DIR = "model_versions"  # katalogi kolejnych wersji modelu po doszkoleniu
+MAP_MAX_POINTS = 5000  # powyżej tej liczby punktów mapa w trybie auto pokazuje agregację
+MAP_GRID_SIZE = 150  # liczba komórek siatki agregacji na dłuższym boku obszaru
@@ -0,0 +1,78 @@
+"""Indeks przestrzenny punktów datasetu: k najbliższych sąsiadów i zapytania o promień w kilometrach.
+
+Punkty (długość, szerokość) są zamieniane na wektory na sferze jednostkowej
+i trzymane w KD-drzewie. Odległość w linii prostej między wektorami rośnie
+razem z odległością po powierzchni Ziemi, więc sąsiedzi są dokładni także
+daleko od równika i w pobliżu południka 180°.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lon, lat):
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord(km):
+    """Odległość po powierzchni [km] -> cięciwa na sferze jednostkowej."""
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _km(chord):
+    """Cięciwa na sferze jednostkowej -> odległość po powierzchni [km]."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+class SpatialIndex:
+    """KD-drzewo punktów jednego datasetu, budowane raz i współdzielone przez sesje.
+
+    Wiersze bez współrzędnych są pomijane; wyniki zapytań to numery wierszy
+    (pozycje w ramce) i odległości w km.
+    """
+
+    def __init__(self, lon, lat):
+        # scipy importowane dopiero tutaj - indeks potrzebny jest tylko w trybie ręcznym
+        from scipy.spatial import cKDTree
+
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        self.rows = np.flatnonzero(valid)
+        self._tree = cKDTree(_unit_vectors(lon[valid], lat[valid]), balanced_tree=False)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def nearest(self, lon, lat, k=5, max_km=None):
+        """k najbliższych wierszy dla każdego punktu: (wiersze, odległości), oba o kształcie (punkty, k).
+
+        Z `max_km` sąsiedzi dalsi niż promień są pomijani - ich miejsca mają
+        wiersz -1 i odległość inf.
+        """
+        points = _unit_vectors(np.atleast_1d(lon), np.atleast_1d(lat))
+        if len(self.rows) == 0:
+            return np.full((len(points), k), -1), np.full((len(points), k), np.inf)
+        k = min(k, len(self.rows))
+        bound = np.inf if max_km is None else float(_chord(max_km)) * (1 + 1e-9)
+        chords, positions = self._tree.query(points, k=k, distance_upper_bound=bound)
+        chords, positions = chords.reshape(len(points), k), positions.reshape(len(points), k)
+        found = positions < len(self.rows)
+        rows = np.where(found, self.rows[np.minimum(positions, len(self.rows) - 1)], -1)
+        return rows, np.where(found, _km(chords), np.inf)
+
+    def within(self, lon, lat, radius_km):
+        """Wiersze w promieniu `radius_km` od jednego punktu, od najbliższego: (wiersze, odległości)."""
+        point = _unit_vectors([lon], [lat])[0]
+        positions = np.asarray(self._tree.query_ball_point(point, float(_chord(radius_km)) * (1 + 1e-9)), dtype=np.int64)
+        distances = _km(np.linalg.norm(self._tree.data[positions] - point, axis=1))
+        order = np.argsort(distances, kind="stable")
+        return self.rows[positions[order]], distances[order]
+
+    def count_within(self, lon, lat, radius_km):
+        """Liczba wierszy w promieniu `radius_km` od każdego punktu - bez zwracania samych wierszy."""
+        points = _unit_vectors(np.atleast_1d(lon), np.atleast_1d(lat))
+        return np.asarray(self._tree.query_ball_point(points, float(_chord(radius_km)) * (1 + 1e-9), return_length=True))
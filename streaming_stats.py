@@ -0,0 +1,436 @@
+"""Statystyki zakładki statystyk w jednym przebiegu po pliku CSV - dla plików większych niż pamięć.
+
+Plik jest dzielony na zakresy bajtów kończące się na końcach wierszy; każdy
+zakres czyta i podsumowuje osobny proces, a podsumowania są łączone.
+Akumulatory mają rozmiar niezależny od liczby wierszy i łączą się
+w dowolnej kolejności:
+- `PairwiseMoments` - liczności, średnie, odchylenia i kowariancje par kolumn,
+- `HistogramSketch` - liczności na siatce przedziałów (kwantyle, histogram, min/max),
+- `GroupedSketch` - szkice wartości w grupach drugiej kolumny (ceny według wieku).
+Wynik `StreamingStats.result()` ma układ `aggregates.compute_aggregates`.
+
+Zakresy bajtów zakładają, że w polach CSV nie ma znaków nowej linii.
+"""
+import io
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AGE_COL, PRICE_COL
+
+DESCRIBE_INDEX = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+class PairwiseMoments:
+    """Liczności, średnie, sumy kwadratów odchyleń i iloczynów odchyleń dla każdej pary kolumn.
+
+    Element [i, j] dotyczy wierszy, w których obie kolumny mają wartość
+    (jak `DataFrame.corr`); przekątna to statystyki pojedynczych kolumn.
+    Łączenie według wzorów Chana - bez odejmowania dużych sum.
+    """
+
+    def __init__(self, k):
+        self.n = np.zeros((k, k))
+        self.mean = np.zeros((k, k))  # średnia kolumny i w wierszach pary (i, j)
+        self.m2 = np.zeros((k, k))  # suma kwadratów odchyleń kolumny i w wierszach pary (i, j)
+        self.co = np.zeros((k, k))  # suma iloczynów odchyleń kolumn i, j
+
+    def update(self, values):
+        """Dodaje wiersze macierzy `values` (wiersze x kolumny, NaN = brak)."""
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return
+        # Przesunięcie o średnią kawałka - sumy liczone na małych liczbach (0 dla kolumn bez wartości)
+        filled = np.where(valid, values, 0.0)
+        shift = filled.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+        x = np.where(valid, filled - shift, 0.0)
+        v = valid.astype(np.float64)
+        chunk = PairwiseMoments(values.shape[1])
+        chunk.n = v.T @ v
+        sums = x.T @ v  # [i, j] - suma kolumny i w wierszach pary (i, j)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(chunk.n > 0, sums / chunk.n, 0.0)
+        chunk.mean = means + shift[:, None]
+        chunk.m2 = (x * x).T @ v - sums * means
+        chunk.co = x.T @ x - sums * means.T
+        self.merge(chunk)
+
+    def merge(self, other):
+        n = self.n + other.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(n > 0, other.n / n, 0.0)
+        delta = other.mean - self.mean
+        factor = self.n * weight  # n_a * n_b / n
+        self.co = self.co + other.co + delta * delta.T * factor
+        self.m2 = self.m2 + other.m2 + delta * delta * factor
+        self.mean = self.mean + delta * weight
+        self.n = n
+
+    def counts(self):
+        return np.diag(self.n).copy()
+
+    def means(self):
+        return np.where(np.diag(self.n) > 0, np.diag(self.mean), np.nan)
+
+    def stds(self):
+        n = np.diag(self.n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 1, np.sqrt(np.maximum(np.diag(self.m2), 0.0) / (n - 1)), np.nan)
+
+    def corr(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.co / np.sqrt(self.m2 * self.m2.T)
+        corr[self.n < 2] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+class HistogramSketch:
+    """Liczności na siatce przedziałów szerokości 2^k wyrównanej do zera - do kwantyli i histogramów.
+
+    Gdy wartości nie mieszczą się w `max_bins` przedziałach, szerokość
+    rośnie dwukrotnie (sąsiednie przedziały są sumowane), więc pamięć jest
+    stała, a błąd kwantyla nie przekracza szerokości przedziału
+    (najwyżej ~2 * zakres / `max_bins`). Min i max są dokładne.
+    """
+
+    def __init__(self, max_bins=4096):
+        self.max_bins = max_bins
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.exponent = None  # szerokość przedziału = 2 ** exponent
+        self.start = 0  # numer przedziału counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _fit_exponent(self, low, high):
+        """Najmniejszy wykładnik, przy którym [low, high] mieści się w `max_bins` przedziałach."""
+        magnitude = max(abs(low), abs(high))
+        # Dolna granica - numery przedziałów muszą się zmieścić w int64
+        exponent = (math.frexp(magnitude)[1] if magnitude > 0 else 0) - 40
+        if high > low:
+            exponent = max(exponent, math.ceil(math.log2((high - low) / (self.max_bins - 1))))
+        while math.floor(high / 2.0**exponent) - math.floor(low / 2.0**exponent) + 1 > self.max_bins:
+            exponent += 1
+        return exponent
+
+    def _counts_at(self, exponent):
+        """(start, counts) przeliczone na przedziały 2^exponent (nie mniejsze niż obecne)."""
+        shift = exponent - self.exponent
+        if shift == 0 or len(self.counts) == 0:
+            return self.start >> shift, self.counts
+        index = (self.start + np.arange(len(self.counts), dtype=np.int64)) >> shift
+        start = int(index[0])
+        return start, np.bincount(index - start, weights=self.counts).astype(np.int64)
+
+    def _rebuild(self, low, high, exponent, parts):
+        start = math.floor(low / 2.0**exponent)
+        counts = np.zeros(math.floor(high / 2.0**exponent) - start + 1, dtype=np.int64)
+        for part_start, part_counts in parts:
+            offset = part_start - start
+            counts[offset:offset + len(part_counts)] += part_counts
+        self.exponent, self.start, self.counts = exponent, start, counts
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        low, high = min(self.min, float(values.min())), max(self.max, float(values.max()))
+        exponent = self._fit_exponent(low, high)
+        parts = []
+        if self.exponent is not None:
+            exponent = max(exponent, self.exponent)
+            parts.append(self._counts_at(exponent))
+        index = np.floor(values / 2.0**exponent).astype(np.int64)
+        index_start = int(index.min())
+        parts.append((index_start, np.bincount(index - index_start)))
+        self._rebuild(low, high, exponent, parts)
+        self.count += len(values)
+        self.min, self.max = low, high
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.exponent, self.start, self.counts = other.exponent, other.start, other.counts.copy()
+            self.count, self.min, self.max = other.count, other.min, other.max
+            return
+        low, high = min(self.min, other.min), max(self.max, other.max)
+        exponent = max(self.exponent, other.exponent, self._fit_exponent(low, high))
+        self._rebuild(low, high, exponent, [self._counts_at(exponent), other._counts_at(exponent)])
+        self.count += other.count
+        self.min, self.max = low, high
+
+    def _left_edges(self):
+        return (self.start + np.arange(len(self.counts))) * 2.0**self.exponent
+
+    def quantile(self, q):
+        """Przybliżony kwantyl (interpolacja liniowa w przedziale)."""
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        cumulative = np.cumsum(self.counts)
+        b = min(int(np.searchsorted(cumulative, rank, side="left")), len(cumulative) - 1)
+        before = cumulative[b] - self.counts[b]
+        fraction = (rank - before) / self.counts[b] if self.counts[b] else 0.0
+        value = (self.start + b + fraction) * 2.0**self.exponent
+        return float(min(max(value, self.min), self.max))
+
+    def histogram(self, bins=30):
+        """(liczności, krawędzie) w `bins` równych przedziałach od min do max - jak np.histogram."""
+        centers = np.clip(self._left_edges() + 2.0**self.exponent / 2, self.min, self.max)
+        return np.histogram(centers, bins=bins, range=(self.min, self.max), weights=self.counts)
+
+    def extremes_within(self, low, high):
+        """Najmniejsza i największa wartość w [low, high] (z dokładnością do przedziału)."""
+        edges = self._left_edges()
+        width = 2.0**self.exponent
+        inside = np.flatnonzero((self.counts > 0) & (edges + width > low) & (edges <= high))
+        if len(inside) == 0:
+            return math.nan, math.nan
+        lowest = min(max(edges[inside[0]], low, self.min), self.max)
+        highest = max(min(edges[inside[-1]] + width, high, self.max), self.min)
+        return float(lowest), float(highest)
+
+
+class GroupedSketch:
+    """Szkice wartości w grupach według drugiej kolumny (np. ceny według wieku).
+
+    Kolumna grupująca jest trzymana na siatce `HistogramSketch` (do `max_groups`
+    przedziałów), każdy jej przedział ma własny szkic wartości. Podział na
+    grupy o równej szerokości (jak `pd.cut`) jest robiony dopiero w `box()`,
+    gdy znany jest pełny zakres.
+    """
+
+    def __init__(self, max_groups=256, max_bins=1024):
+        self.keys = HistogramSketch(max_groups)
+        self.max_bins = max_bins
+        self.sketches = {}  # numer przedziału klucza -> HistogramSketch wartości
+
+    def _regroup(self, shift):
+        if shift == 0:
+            return
+        regrouped = {}
+        for index, sketch in self.sketches.items():
+            target = regrouped.get(index >> shift)
+            if target is None:
+                regrouped[index >> shift] = sketch
+            else:
+                target.merge(sketch)
+        self.sketches = regrouped
+
+    def update(self, keys, values):
+        keys = np.asarray(keys, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.isfinite(keys) & np.isfinite(values)
+        keys, values = keys[valid], values[valid]
+        if len(keys) == 0:
+            return
+        chunk = GroupedSketch(self.keys.max_bins, self.max_bins)
+        chunk.keys.update(keys)
+        index = np.floor(keys / 2.0**chunk.keys.exponent).astype(np.int64)
+        order = np.argsort(index, kind="stable")
+        groups, starts = np.unique(index[order], return_index=True)
+        for group, group_values in zip(groups, np.split(values[order], starts[1:])):
+            sketch = chunk.sketches[int(group)] = HistogramSketch(self.max_bins)
+            sketch.update(group_values)
+        self.merge(chunk)
+
+    def merge(self, other):
+        if other.keys.count == 0:
+            return
+        if self.keys.count == 0:
+            self.keys.merge(other.keys)
+            self.sketches = {index: _copy_sketch(sketch) for index, sketch in other.sketches.items()}
+            return
+        exponent = self.keys.exponent
+        self.keys.merge(other.keys)
+        self._regroup(self.keys.exponent - exponent)
+        shift = self.keys.exponent - other.keys.exponent
+        for index, sketch in other.sketches.items():
+            target = self.sketches.get(index >> shift)
+            if target is None:
+                self.sketches[index >> shift] = _copy_sketch(sketch)
+            else:
+                target.merge(sketch)
+
+    def box(self, bins=5):
+        """Kwartyle, wąsy (1.5 IQR) i liczności w `bins` grupach równej szerokości - jak `aggregates.box_quantiles`."""
+        if self.keys.count == 0:
+            return pd.DataFrame(columns=["group", "q1", "median", "q3", "lowerfence", "upperfence", "count"])
+        labels, edges = pd.cut(np.array([self.keys.min, self.keys.max]), bins=bins, retbins=True)
+        merged = {}
+        width = 2.0**self.keys.exponent
+        for index, sketch in self.sketches.items():
+            # Lewa krawędź przedziału klucza - wartość całkowita na krawędzi grupy trafia do właściwej grupy (a, b]
+            key = min(max(index * width, self.keys.min), self.keys.max)
+            group = min(max(int(np.searchsorted(edges, key, side="left")) - 1, 0), bins - 1)
+            if group in merged:
+                merged[group].merge(sketch)
+            else:
+                merged[group] = _copy_sketch(sketch)
+
+        rows = []
+        for group in sorted(merged):
+            sketch = merged[group]
+            q1, median, q3 = (sketch.quantile(q) for q in (0.25, 0.5, 0.75))
+            iqr = q3 - q1
+            lowerfence, upperfence = sketch.extremes_within(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+            rows.append({
+                "group": str(labels.categories[group]),
+                "q1": q1,
+                "median": median,
+                "q3": q3,
+                "lowerfence": lowerfence,
+                "upperfence": upperfence,
+                "count": sketch.count,
+            })
+        return pd.DataFrame(rows)
+
+
+def _copy_sketch(sketch):
+    copy = HistogramSketch(sketch.max_bins)
+    copy.merge(sketch)
+    return copy
+
+
+class StreamingStats:
+    """Wszystkie akumulatory zakładki statystyk dla kolumn liczbowych `columns`."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+        self.moments = PairwiseMoments(len(self.columns))
+        self.sketches = {col: HistogramSketch() for col in self.columns}
+        self.age_price = GroupedSketch() if PRICE_COL in self.columns and AGE_COL in self.columns else None
+        self.rooms_per_house = [0.0, 0]  # suma i liczność total_rooms / households
+
+    def update(self, chunk):
+        """Dodaje kawałek ramki; kolumny spoza liczb (np. błędne wartości) stają się brakami."""
+        self.rows += len(chunk)
+        numeric = {col: pd.to_numeric(chunk[col], errors="coerce") for col in self.columns}
+        values = np.column_stack([numeric[col].to_numpy(np.float64, na_value=np.nan) for col in self.columns])
+        self.moments.update(values)
+        for i, col in enumerate(self.columns):
+            self.sketches[col].update(values[:, i])
+        if self.age_price is not None:
+            self.age_price.update(numeric[AGE_COL], numeric[PRICE_COL])
+        if "total_rooms" in numeric and "households" in numeric:
+            ratio = (numeric["total_rooms"] / numeric["households"]).to_numpy(np.float64, na_value=np.nan)
+            ratio = ratio[~np.isnan(ratio)]
+            self.rooms_per_house[0] += float(ratio.sum())
+            self.rooms_per_house[1] += len(ratio)
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.moments.merge(other.moments)
+        for col in self.columns:
+            self.sketches[col].merge(other.sketches[col])
+        if self.age_price is not None:
+            self.age_price.merge(other.age_price)
+        self.rooms_per_house[0] += other.rooms_per_house[0]
+        self.rooms_per_house[1] += other.rooms_per_house[1]
+
+    def result(self, hist_bins=30, age_bins=5):
+        """Agregaty w układzie `aggregates.compute_aggregates`."""
+        means = dict(zip(self.columns, self.moments.means()))
+        describe = pd.DataFrame(
+            [
+                self.moments.counts(),
+                self.moments.means(),
+                self.moments.stds(),
+                [self.sketches[col].min if self.sketches[col].count else np.nan for col in self.columns],
+                *([self.sketches[col].quantile(q) for col in self.columns] for q in (0.25, 0.5, 0.75)),
+                [self.sketches[col].max if self.sketches[col].count else np.nan for col in self.columns],
+            ],
+            index=DESCRIBE_INDEX,
+            columns=self.columns,
+        )
+        result = {
+            "total_records": self.rows,
+            "describe": describe.round(2),
+            "corr": pd.DataFrame(self.moments.corr(), index=self.columns, columns=self.columns).round(3),
+        }
+
+        if PRICE_COL in self.columns:
+            price = self.sketches[PRICE_COL]
+            result["avg_price"] = means[PRICE_COL]
+            result["median_price"] = price.quantile(0.5)
+            counts, edges = price.histogram(bins=hist_bins)
+            result["price_hist"] = pd.DataFrame({
+                "bin_left": edges[:-1],
+                "bin_right": edges[1:],
+                "bin_center": (edges[:-1] + edges[1:]) / 2,
+                "count": counts.astype(np.int64),
+            })
+            if self.age_price is not None:
+                result["age_box"] = self.age_price.box(bins=age_bins)
+        if "total_rooms" in self.columns:
+            result["avg_rooms"] = means["total_rooms"]
+            if "households" in self.columns:
+                total, count = self.rooms_per_house
+                result["avg_rooms_per_house"] = total / count if count else np.nan
+        if "median_income" in self.columns:
+            result["avg_income"] = means["median_income"]
+        return result
+
+
+def byte_ranges(path, chunk_bytes):
+    """Nagłówek pliku i zakresy bajtów (start, koniec) po ok. `chunk_bytes`, kończące się na końcach wierszy."""
+    with open(path, "rb") as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        start = f.tell()
+        ranges = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # do końca bieżącego wiersza
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def _range_stats(path, start, end, names, columns):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # Tylko kolumny liczbowe - tekst (np. ocean_proximity) zajmowałby najwięcej pamięci
+    chunk = pd.read_csv(io.BytesIO(data), header=None, names=names, usecols=columns)
+    stats = StreamingStats(columns)
+    stats.update(chunk)
+    return stats
+
+
+def stream_csv_stats(path, workers=None, chunk_bytes=16 * 1024**2, hist_bins=30, age_bins=5, progress=None):
+    """Agregaty zakładki statystyk dla całego pliku CSV w jednym przebiegu.
+
+    Pamięć jest ograniczona do ok. `workers` kawałków po `chunk_bytes`
+    (plus ramka z kawałka). Kolumny liczbowe są rozpoznawane na początku
+    pliku. `progress(done, total)` jest wołane po każdym kawałku.
+    """
+    sample = pd.read_csv(path, nrows=10_000)
+    names = sample.columns.tolist()
+    columns = sample.select_dtypes(include=["number"]).columns.tolist()
+    _, ranges = byte_ranges(path, chunk_bytes)
+    total = StreamingStats(columns)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(ranges)))
+
+    if workers == 1:
+        for done, (start, end) in enumerate(ranges, start=1):
+            total.merge(_range_stats(path, start, end, names, columns))
+            if progress is not None:
+                progress(done, len(ranges))
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_range_stats, path, start, end, names, columns) for start, end in ranges]
+            for done, future in enumerate(as_completed(futures), start=1):
+                total.merge(future.result())
+                if progress is not None:
+                    progress(done, len(ranges))
+    return total.result(hist_bins=hist_bins, age_bins=age_bins)
@@ -0,0 +1,69 @@
+"""Generator większych datasetów o rozkładzie podobnym do housing.csv - do pomiarów skalowania.
+
+Wiersze są losowane ze zwracaniem z oryginału (zachowuje korelacje między
+kolumnami i proporcje ocean_proximity), a potem lekko zaburzane, żeby nie
+były dokładnymi kopiami. Zakresy i zaokrąglenia jak w housing.csv.
+
+Użycie:
+    python synthetic_data.py --rows 1000000 --output housing_1m.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Kolumny liczności - zaburzenie multiplikatywne, wartości całkowite >= 1
+COUNT_COLUMNS = ["total_rooms", "total_bedrooms", "population", "households"]
+CHUNK_ROWS = 500_000
+
+
+def scale_dataset(base, rows, seed=0, noise=0.05):
+    """`rows` wierszy podobnych do `base` (ramka w układzie housing.csv)."""
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), size=rows)].reset_index(drop=True)
+
+    def jitter(values):
+        return values * rng.lognormal(0.0, noise, size=len(values))
+
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = np.maximum(np.round(jitter(df[col].to_numpy(np.float64))), 1.0)
+    if "longitude" in df.columns and "latitude" in df.columns:
+        df["longitude"] = np.round(df["longitude"] + rng.normal(0.0, 0.01, size=rows), 2)
+        df["latitude"] = np.round(df["latitude"] + rng.normal(0.0, 0.01, size=rows), 2)
+    if "housing_median_age" in df.columns:
+        age = df["housing_median_age"] + rng.integers(-1, 2, size=rows)
+        df["housing_median_age"] = age.clip(base["housing_median_age"].min(), base["housing_median_age"].max())
+    if "median_income" in df.columns:
+        income = np.round(jitter(df["median_income"].to_numpy(np.float64)), 4)
+        df["median_income"] = income.clip(base["median_income"].min(), base["median_income"].max())
+    if "median_house_value" in df.columns:
+        price = np.round(jitter(df["median_house_value"].to_numpy(np.float64)), -2)
+        df["median_house_value"] = price.clip(base["median_house_value"].min(), base["median_house_value"].max())
+    return df
+
+
+def write_scaled_csv(base, rows, path, seed=0):
+    """Zapisuje `rows` wierszy do CSV kawałkami - pamięć nie rośnie z rozmiarem wyniku."""
+    written = 0
+    for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        chunk = scale_dataset(base, min(CHUNK_ROWS, rows - start), seed=seed + i)
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="housing.csv", help="dataset wzorcowy")
+    parser.add_argument("--rows", type=int, required=True, help="liczba wierszy wyniku")
+    parser.add_argument("--output", required=True, help="ścieżka wynikowego CSV")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    written = write_scaled_csv(pd.read_csv(args.data), args.rows, args.output, seed=args.seed)
+    print(f"Zapisano {written:,} wierszy do {args.output}")
+
+
+if __name__ == "__main__":
+    main()
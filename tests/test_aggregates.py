@@ -0,0 +1,40 @@
+"""Próbka wykresu punktowego: limit punktów i proporcje gęstości."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import downsample_scatter
+
+HOUSING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "housing.csv")
+
+
+@pytest.fixture(scope="module")
+def housing():
+    return pd.read_csv(HOUSING_PATH)
+
+
+@pytest.mark.parametrize("columns", [("median_income", "median_house_value"), ("longitude", "latitude"), ("total_rooms", "households")])
+@pytest.mark.parametrize("max_points", [1000, 2000, 5000, 10000, 20000])
+def test_sample_never_exceeds_limit(housing, columns, max_points):
+    rows = downsample_scatter(housing[columns[0]], housing[columns[1]], max_points=max_points)
+    assert len(rows) == max_points
+    assert len(np.unique(rows)) == len(rows)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sample_limit_with_skewed_data(seed):
+    rng = np.random.default_rng(seed)
+    x, y = rng.lognormal(size=30_000), rng.normal(size=30_000)
+    max_points = int(rng.integers(100, 29_000))
+    assert len(downsample_scatter(x, y, max_points=max_points, seed=seed)) <= max_points
+
+
+def test_sample_keeps_density_proportions():
+    # Dwa skupiska 9:1 - próbka zachowuje proporcję (z dokładnością do punktów odstających, branych zawsze)
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.normal(0, 1, 90_000), rng.normal(10, 1, 10_000)])
+    y = rng.normal(size=len(x))
+    rows = downsample_scatter(x, y, max_points=5000)
+    assert np.mean(x[rows] > 5) == pytest.approx(0.1, abs=0.025)
@@ -0,0 +1,53 @@
+"""Wczytywanie uploadu kawałkami: limity wierszy i pamięci."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_store import compact_dtypes, ingest_csv
+
+N_ROWS = 1000
+CHUNK_ROWS = 300
+
+
+@pytest.fixture(scope="module")
+def csv_bytes():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=N_ROWS), "cat": rng.choice(["x", "y"], N_ROWS)})
+    return df.to_csv(index=False).encode()
+
+
+def full_size(csv_bytes):
+    # Suma rozmiarów kawałków, tak jak liczy ją ingest_csv
+    chunks = pd.read_csv(io.BytesIO(csv_bytes), chunksize=CHUNK_ROWS)
+    return sum(compact_dtypes(chunk).memory_usage(deep=True).sum() for chunk in chunks)
+
+
+def test_no_limits(csv_bytes):
+    df, truncated = ingest_csv(io.BytesIO(csv_bytes), chunk_rows=CHUNK_ROWS)
+    assert len(df) == N_ROWS and not truncated
+
+
+@pytest.mark.parametrize("max_rows, expected_rows, expected_truncated", [
+    (N_ROWS, N_ROWS, False),
+    (N_ROWS + 1, N_ROWS, False),
+    (CHUNK_ROWS, CHUNK_ROWS, True),
+    (450, 450, True),
+])
+def test_max_rows(csv_bytes, max_rows, expected_rows, expected_truncated):
+    df, truncated = ingest_csv(io.BytesIO(csv_bytes), chunk_rows=CHUNK_ROWS, max_rows=max_rows)
+    assert len(df) == expected_rows
+    assert truncated == expected_truncated
+
+
+def test_max_bytes_reached_on_last_chunk_is_not_truncation(csv_bytes):
+    df, truncated = ingest_csv(io.BytesIO(csv_bytes), chunk_rows=CHUNK_ROWS, max_bytes=full_size(csv_bytes))
+    assert len(df) == N_ROWS and not truncated
+
+
+def test_max_bytes_truncates_when_rows_remain(csv_bytes):
+    file_obj = io.BytesIO(csv_bytes)
+    df, truncated = ingest_csv(file_obj, chunk_rows=CHUNK_ROWS, max_bytes=1)
+    assert len(df) == CHUNK_ROWS and truncated
+    assert file_obj.tell() == 0  # plik wraca na początek dla kolejnych odczytów
@@ -0,0 +1,158 @@
+"""FilterIndex i OnDiskDataset kontra zwykłe maski i sortowanie pandas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+from data_store import convert_to_parquet
+from filters import FilterIndex
+from query_engine import OnDiskDataset
+
+N_ROWS = 5000
+
+FILTER_CASES = [
+    {},
+    {"a": (3.0, 10.0)},
+    {"cat": ["x", "z"]},
+    {"a": (0.0, 12.0), "b": (-0.5, 0.5), "cat": ["y"]},
+    {"a": (100.0, 200.0)},  # pusty wynik
+    {"cat": []},  # pusty wynik
+]
+
+
+@pytest.fixture(scope="module")
+def csv_path(tmp_path_factory):
+    # Dużo remisów (a), braki w kolumnie liczbowej i tekstowej
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "a": rng.integers(0, 20, N_ROWS).astype(float),
+        "b": rng.normal(size=N_ROWS).round(3),
+        "cat": rng.choice(["x", "y", "z", "w"], N_ROWS),
+        "n": rng.integers(0, 1000, N_ROWS),
+    })
+    df.loc[rng.choice(N_ROWS, 300, replace=False), "a"] = np.nan
+    df.loc[rng.choice(N_ROWS, 200, replace=False), "cat"] = np.nan
+    path = tmp_path_factory.mktemp("data") / "frame.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(scope="module")
+def frame(csv_path):
+    return pd.read_csv(csv_path)
+
+
+@pytest.fixture(scope="module")
+def on_disk(csv_path, tmp_path_factory):
+    # Małe grupy wierszy i kawałki CSV - zapytania przechodzą przez wiele paczek
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(data_store, "PARQUET_ROW_GROUP_ROWS", 700)
+        mp.setattr(data_store, "PARQUET_BLOCK_BYTES", 16 * 1024)
+        path = convert_to_parquet(str(csv_path), str(tmp_path_factory.mktemp("cache")))
+    return OnDiskDataset(path)
+
+
+def assert_same_rows(result, expected):
+    # Braki w kolumnach tekstowych: None z Arrow, NaN z pandas.read_csv
+    pd.testing.assert_frame_equal(result.where(result.notna(), np.nan), expected, check_dtype=False)
+
+
+def reference_mask(df, active_filters):
+    mask = np.ones(len(df), dtype=bool)
+    for col, val in active_filters.items():
+        if isinstance(val, tuple):
+            mask &= df[col].between(*val, inclusive="both").to_numpy()
+        else:
+            mask &= df[col].isin(val).to_numpy()
+    return mask
+
+
+def reference_order(df, active_filters, sort_col, descending):
+    """Numery wierszy po sortowaniu stabilnym, braki na końcu w kolejności pliku; malejąco remisy w odwrotnej."""
+    rows = np.flatnonzero(reference_mask(df, active_filters))
+    ascending = df.iloc[rows].sort_values(sort_col, kind="stable", na_position="last")
+    missing = ascending[sort_col].isna().to_numpy()
+    valid, nans = ascending.index[~missing], ascending.index[missing]
+    return np.concatenate([valid[::-1] if descending else valid, nans]).astype(np.int64)
+
+
+@pytest.mark.parametrize("active_filters", FILTER_CASES)
+def test_row_ids_and_count_match_pandas(frame, active_filters):
+    index = FilterIndex(frame)
+    expected = np.flatnonzero(reference_mask(frame, active_filters))
+    rows = index.row_ids(active_filters)
+    if not active_filters:
+        assert rows is None
+    else:
+        np.testing.assert_array_equal(rows, expected)
+    assert index.count(active_filters) == len(expected)
+
+
+@pytest.mark.parametrize("active_filters", FILTER_CASES)
+def test_apply_matches_pandas(frame, active_filters):
+    result = FilterIndex(frame).apply(active_filters, ["b", "a"])
+    expected = frame.loc[reference_mask(frame, active_filters), ["b", "a"]]
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_bitmap_cache_is_bounded_and_stays_correct(frame):
+    index = FilterIndex(frame, max_cached_masks=2, max_cached_results=2)
+    cases = [{"a": (1.0, 5.0)}, {"a": (2.0, 8.0)}, {"cat": ["w"]}, {"a": (1.0, 5.0), "cat": ["w"]}]
+    for active_filters in cases + cases:
+        expected = np.flatnonzero(reference_mask(frame, active_filters))
+        np.testing.assert_array_equal(index.row_ids(active_filters), expected)
+        assert len(index._masks) <= 2 and len(index._results) <= 2
+
+
+@pytest.mark.parametrize("active_filters", FILTER_CASES)
+@pytest.mark.parametrize("sort_col", [None, "a", "cat"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_page_matches_pandas_sort(frame, active_filters, sort_col, descending):
+    index = FilterIndex(frame)
+    if sort_col is None:
+        expected = np.flatnonzero(reference_mask(frame, active_filters))
+    else:
+        expected = reference_order(frame, active_filters, sort_col, descending)
+    for start, stop in [(0, 25), (1200, 1300), (len(expected) - 10, len(expected) + 40)]:
+        rows, total = index.page(active_filters, max(start, 0), stop, sort_col, descending)
+        assert total == len(expected)
+        np.testing.assert_array_equal(rows, expected[max(start, 0):stop])
+
+
+def test_on_disk_layout(on_disk, frame):
+    assert on_disk.shape == frame.shape
+    assert on_disk.columns == list(frame.columns)
+    assert on_disk._dataset.get_fragments().__next__().metadata.num_row_groups > 1
+
+
+@pytest.mark.parametrize("col", ["a", "b", "n"])
+def test_on_disk_value_range_matches_index(on_disk, frame, col):
+    assert on_disk.value_range(col) == FilterIndex(frame).value_range(col)
+
+
+def test_on_disk_categories_match_index(on_disk, frame):
+    assert on_disk.categories("cat") == FilterIndex(frame).categories("cat")
+
+
+@pytest.mark.parametrize("active_filters", FILTER_CASES)
+def test_on_disk_count_and_select_match_pandas(on_disk, frame, active_filters):
+    mask = reference_mask(frame, active_filters)
+    assert on_disk.count(active_filters) == mask.sum()
+    expected = frame.loc[mask, ["b", "cat", "n"]].reset_index(drop=True)
+    assert_same_rows(on_disk.select(active_filters, ["b", "cat", "n"]), expected)
+    assert_same_rows(on_disk.select(active_filters, ["b", "cat", "n"], limit=100), expected.head(100))
+
+
+@pytest.mark.parametrize("active_filters", FILTER_CASES)
+@pytest.mark.parametrize("sort_col", [None, "a", "cat"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_on_disk_page_matches_filter_index(on_disk, frame, active_filters, sort_col, descending):
+    index = FilterIndex(frame)
+    total_expected = index.count(active_filters)
+    # Strony głębiej niż zapamiętany początek posortowanych wyników - jego powiększanie też jest sprawdzane
+    for start, stop in [(0, 25), (990, 1010), (2500, 2600), (max(total_expected - 10, 0), total_expected + 40)]:
+        page, total = on_disk.page(active_filters, start, stop, sort_col, descending)
+        rows, _ = index.page(active_filters, start, stop, sort_col, descending)
+        assert total == total_expected
+        expected = frame.iloc[rows].reset_index(drop=True)
+        assert_same_rows(page, expected)
@@ -0,0 +1,161 @@
+"""Statystyki strumieniowe (łączone z kawałków i z jednego przebiegu) kontra pandas na housing.csv."""
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import PRICE_COL, compute_aggregates
+from streaming_stats import GroupedSketch, HistogramSketch, PairwiseMoments, StreamingStats, stream_csv_stats
+
+HOUSING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "housing.csv")
+EXACT = ["count", "mean", "std", "min", "max"]
+QUANTILES = ["25%", "50%", "75%"]
+DESCRIBE_ROWS = ["mean", "std", "min", *QUANTILES, "max"]
+
+
+@pytest.fixture(scope="module")
+def housing():
+    return pd.read_csv(HOUSING_PATH)
+
+
+@pytest.fixture(scope="module")
+def reference(housing):
+    return compute_aggregates(housing)
+
+
+def quantile_tolerance(values, max_bins):
+    # Błąd kwantyla szkicu: najwyżej ~2 * zakres / max_bins
+    values = values.dropna()
+    return 2 * (values.max() - values.min()) / max_bins + 0.01
+
+
+@pytest.fixture(scope="module", params=[
+    pytest.param({"workers": 1, "chunk_bytes": 1024**3}, id="single-pass"),
+    pytest.param({"workers": 1, "chunk_bytes": 64 * 1024}, id="merged"),
+    pytest.param({"workers": 2, "chunk_bytes": 256 * 1024}, id="processes"),
+])
+def streamed(request):
+    return stream_csv_stats(HOUSING_PATH, **request.param)
+
+
+def test_describe_matches_pandas(streamed, reference, housing):
+    describe, expected = streamed["describe"], reference["describe"]
+    assert list(describe.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(describe.loc[EXACT], expected.loc[EXACT], atol=0.011, rtol=1e-9)
+    for col in expected.columns:
+        tolerance = quantile_tolerance(housing[col], HistogramSketch().max_bins)
+        np.testing.assert_allclose(describe.loc[QUANTILES, col], expected.loc[QUANTILES, col], atol=tolerance)
+
+
+def test_corr_matches_pandas(streamed, reference):
+    pd.testing.assert_frame_equal(streamed["corr"], reference["corr"], atol=0.0011, rtol=0)
+
+
+def test_scalar_aggregates_match_pandas(streamed, reference, housing):
+    assert streamed["total_records"] == reference["total_records"]
+    for key in ["avg_price", "avg_rooms", "avg_rooms_per_house", "avg_income"]:
+        assert streamed[key] == pytest.approx(reference[key], rel=1e-9)
+    assert streamed["median_price"] == pytest.approx(
+        reference["median_price"], abs=quantile_tolerance(housing[PRICE_COL], HistogramSketch().max_bins)
+    )
+
+
+def test_price_histogram_matches_numpy(streamed, reference):
+    hist, expected = streamed["price_hist"], reference["price_hist"]
+    np.testing.assert_allclose(hist["bin_left"], expected["bin_left"])
+    np.testing.assert_allclose(hist["bin_right"], expected["bin_right"])
+    assert hist["count"].sum() == expected["count"].sum()
+    # Przesunięcia tylko przy krawędziach przedziałów (szerokość przedziału szkicu)
+    assert (hist["count"] - expected["count"]).abs().sum() <= 0.005 * expected["count"].sum()
+
+
+def test_age_box_matches_pandas(streamed, reference, housing):
+    box, expected = streamed["age_box"], reference["age_box"]
+    assert box["group"].tolist() == expected["group"].tolist()
+    assert box["count"].tolist() == expected["count"].tolist()
+    tolerance = quantile_tolerance(housing[PRICE_COL], GroupedSketch().max_bins)
+    for col in ["q1", "median", "q3", "lowerfence", "upperfence"]:
+        np.testing.assert_allclose(box[col], expected[col], atol=tolerance)
+
+
+def test_nan_only_column():
+    df = pd.DataFrame({"a": np.arange(10.0), "empty": np.full(10, np.nan)})
+    stats = StreamingStats(df.columns)
+    stats.update(df.iloc[:4])
+    stats.update(df.iloc[4:])
+    result = stats.result()
+    expected = df.describe()
+    assert result["describe"].loc["count", "empty"] == 0
+    assert result["describe"].loc[DESCRIBE_ROWS, "empty"].isna().all()
+    pd.testing.assert_series_equal(result["describe"].loc[EXACT, "a"], expected.loc[EXACT, "a"].round(2))
+    pd.testing.assert_frame_equal(result["corr"], df.corr().round(3))
+
+
+def test_constant_column():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=1000), "const": np.full(1000, 7.5)})
+    stats = StreamingStats(df.columns)
+    for start in range(0, len(df), 150):
+        stats.update(df.iloc[start:start + 150])
+    result = stats.result()
+    pd.testing.assert_series_equal(result["describe"]["const"], df.describe()["const"].round(2))
+    assert result["corr"].loc["const"].isna().all()
+    sketch = stats.sketches["const"]
+    assert sketch.histogram(bins=5)[0].sum() == 1000
+
+
+def chunk_accumulators(values, keys, chunks):
+    parts = []
+    for part_values, part_keys in zip(np.array_split(values, chunks), np.array_split(keys, chunks)):
+        moments = PairwiseMoments(values.shape[1])
+        moments.update(part_values)
+        sketch = HistogramSketch(max_bins=256)
+        sketch.update(part_values[:, 0])
+        grouped = GroupedSketch(max_groups=16, max_bins=128)
+        grouped.update(part_keys, part_values[:, 0])
+        parts.append((moments, sketch, grouped))
+    return parts
+
+
+def merge_all(parts, order):
+    moments, sketch, grouped = PairwiseMoments(parts[0][0].n.shape[0]), HistogramSketch(max_bins=256), GroupedSketch(16, 128)
+    for i in order:
+        moments.merge(parts[i][0])
+        sketch.merge(parts[i][1])
+        grouped.merge(parts[i][2])
+    return moments, sketch, grouped
+
+
+def test_merge_order_does_not_matter():
+    # Różne zakresy w kawałkach - szkice muszą przeliczać siatkę przy łączeniu
+    rng = np.random.default_rng(1)
+    values = np.column_stack([
+        np.concatenate([rng.normal(0, 1, 3000), rng.normal(500, 50, 3000), rng.uniform(-1e4, 1e4, 2000)]),
+        rng.normal(size=8000),
+    ])
+    values[rng.choice(len(values), 400, replace=False), 1] = np.nan
+    keys = rng.integers(1, 53, len(values)).astype(float)
+    parts = chunk_accumulators(values, keys, chunks=8)
+    orders = [list(range(8)), list(reversed(range(8)))] + [random.Random(seed).sample(range(8), 8) for seed in range(3)]
+    results = [merge_all(parts, order) for order in orders]
+
+    moments, sketch, grouped = results[0]
+    valid = ~np.isnan(values[:, 1])
+    np.testing.assert_allclose(moments.means(), np.nanmean(values, axis=0))
+    np.testing.assert_allclose(moments.corr()[0, 1], np.corrcoef(values[valid, 0], values[valid, 1])[0, 1])
+    for other_moments, other_sketch, other_grouped in results[1:]:
+        np.testing.assert_allclose(other_moments.corr(), moments.corr())
+        np.testing.assert_allclose(other_moments.stds(), moments.stds())
+        assert (other_sketch.exponent, other_sketch.start) == (sketch.exponent, sketch.start)
+        np.testing.assert_array_equal(other_sketch.counts, sketch.counts)
+        pd.testing.assert_frame_equal(other_grouped.box(), grouped.box())
+
+    # Łączenie po kawałkach daje to samo co jeden szkic całości
+    whole = HistogramSketch(max_bins=256)
+    whole.update(values[:, 0])
+    assert whole.count == sketch.count and (whole.min, whole.max) == (sketch.min, sketch.max)
+    for q in [0.1, 0.5, 0.9]:
+        assert sketch.quantile(q) == pytest.approx(whole.quantile(q), abs=2.0**sketch.exponent)
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values[:, 0], q), abs=2.0**sketch.exponent)